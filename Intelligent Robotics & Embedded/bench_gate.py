@@ -0,0 +1,135 @@
+import argparse
+import sys
+import time
+from collections import Counter
+import db_operations
+from gate_engine import GateEngine, GATE_OPEN, MODEL_PATH
+from model_manager import RUNTIME, RUNTIMES
+from pipeline import WorkerPool
+from sources import open_source, REPLAY_FPS
+from roi_detector import Box, Detections, parse_roi
+
+
+class WholeFrameDetector:
+    """Stand-in for YOLO that reports the whole frame as one plate box.
+
+    For folders of plate crops (plates/), so the rest of the lane can be
+    benchmarked without model weights or ultralytics.
+    """
+
+    def __call__(self, frame, **kwargs):
+        h, w = frame.shape[:2]
+        return [Detections(frame, [Box(0, 0, w, h)])]
+
+
+class RecordingPolicy:
+    """Gate policy that remembers every committed plate; with check_db it also asks Postgres, read-only."""
+
+    def __init__(self, check_db=False):
+        self.check_db = check_db
+        self.plates = []
+
+    def __call__(self, plate):
+        self.plates.append(plate)
+        if self.check_db:
+            db_operations.is_payment_complete(plate)
+        return GATE_OPEN
+
+
+def accuracy(visits, plates):
+    """(vehicles read correctly, misreads, repeats) of committed plates against expected visits.
+
+    Repeats are extra commits of a labelled plate beyond its visits, e.g. one
+    car committed twice; plates that match no visit are misreads.
+    """
+    expected = Counter(visits)
+    read = Counter(plates)
+    correct = sum((expected & read).values())
+    misreads = sum(count for plate, count in read.items() if plate not in expected)
+    repeats = sum(count for plate, count in (read - expected).items() if plate in expected)
+    return correct, misreads, repeats
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Replay a recording through a headless gate lane and report "
+                                                 "throughput, per-stage latency and plate accuracy.")
+    parser.add_argument('source', help="video file, image directory (e.g. plates/ or dataset/train/images) or rtsp:// URL")
+    parser.add_argument('--model', default=MODEL_PATH, help="YOLO weights for plate detection")
+    parser.add_argument('--runtime', choices=RUNTIMES, default=RUNTIME,
+                        help=f"YOLO inference runtime (default: {RUNTIME}); compare against --runtime torch")
+    parser.add_argument('--int8', action='store_true', help="use the INT8 OpenVINO export")
+    parser.add_argument('--whole-frame', action='store_true',
+                        help="treat every frame as one plate crop instead of running YOLO")
+    parser.add_argument('--roi', type=parse_roi, metavar='X1,Y1,X2,Y2',
+                        help="only detect plates in this part of the frame (fractions or pixels)")
+    parser.add_argument('--adaptive', action='store_true',
+                        help="low-resolution search plus full-resolution tracking windows")
+    parser.add_argument('--ocr', default=None, help="ocr_engine backend (default: the fastest installed)")
+    parser.add_argument('--db', action='store_true', help="query Postgres for every committed plate (read-only)")
+    parser.add_argument('--evidence', metavar='DIR', help="keep the best crop per vehicle in an evidence store here")
+    parser.add_argument('--pace', action='store_true', help="replay at the source frame rate, dropping frames like a live camera")
+    parser.add_argument('--fps', type=float, default=REPLAY_FPS, help="frame rate of image folders")
+    parser.add_argument('--min-accuracy', type=float,
+                        help="exit with status 1 if fewer than this fraction of labelled vehicles are read")
+    args = parser.parse_args()
+
+    source = open_source(args.source, pace=args.pace, fps=args.fps)
+    if not source.isOpened():
+        print(f"[BENCH] Cannot open {args.source}")
+        return 2
+    visits = source.visits()
+    policy = RecordingPolicy(check_db=args.db)
+    model = WholeFrameDetector() if args.whole_frame else None
+    if model is None:
+        from gate_engine import load_model
+        model = load_model(args.model, args.runtime, args.int8)
+    # Unbounded OCR inbox: a replay should read every crop, not shed load like a live lane
+    ocr_pool = WorkerPool("bench-ocr", maxsize=0)
+
+    engine = GateEngine('entry', source=source, serial_port=False, policy=policy, model=model,
+                        ocr_pool=ocr_pool, should_infer=lambda frame: True, name='bench', save_dir=args.evidence,
+                        ocr_backend=args.ocr, headless=True, runtime=args.runtime,
+                        # Without --roi the whole frame is the ROI: the baseline, measured the same way
+                        roi=args.roi or (0, 0, 1, 1), adaptive=args.adaptive)
+    began = time.perf_counter()
+    engine.start()
+    try:
+        while engine.running():
+            time.sleep(0.05)
+    except KeyboardInterrupt:
+        print("[BENCH] Interrupted")
+    elapsed = time.perf_counter() - began
+    drops = engine.pipeline.stats()
+    engine.close()
+    ocr_pool.stop()
+    if engine.evidence is not None:
+        engine.evidence.stop()
+        print(f"[BENCH] evidence: {engine.evidence.stats()}")
+    if args.db:
+        db_operations.close_pool()
+
+    frames = source.frames_read
+    print(f"[BENCH] {args.source}: {frames} frames in {elapsed:.2f}s -> {frames / max(elapsed, 1e-9):.1f} fps "
+          f"({'whole-frame' if args.whole_frame else f'{args.model} on {args.runtime}'}, {'paced' if args.pace else 'unpaced'})")
+    print(f"{'stage':<18} {'count':>7} {'avg ms':>9} {'p95 ms':>9}")
+    for stage, stats in engine.timings.summary().items():
+        print(f"{stage:<18} {stats['count']:>7} {stats['avg_ms']:>9.2f} {stats['p95_ms']:>9.2f}")
+    engine.detector.print_stats('bench')
+    print(f"[BENCH] dropped: {drops['frames_dropped']} frames, {drops['crops_dropped']} crops, "
+          f"{drops['plates_dropped']} plates")
+
+    correct, misreads, repeats = accuracy(visits, policy.plates)
+    if not visits:
+        print(f"[BENCH] {len(policy.plates)} plates committed; no labelled vehicles in the source to score")
+        return 0
+    rate = correct / len(visits)
+    print(f"[BENCH] accuracy: {correct}/{len(visits)} labelled vehicles read ({rate:.1%}), "
+          f"{misreads} misread, {repeats} repeated commits of a labelled plate")
+    if args.min_accuracy is not None and rate < args.min_accuracy:
+        print(f"[BENCH] FAILED: accuracy below {args.min_accuracy:.1%}")
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,83 @@
+import argparse
+import time
+import cv2
+import numpy as np
+from ocr_engine import BACKENDS, get_backend
+from char_recognizer import PLATES_DIR, labelled_crops, preprocess_crop
+from plate_grammar import decode
+
+
+def char_accuracy(label, text):
+    """Fraction of plate positions read correctly, aligned on the first 'RA'."""
+    start = text.find("RA")
+    if start < 0:
+        return 0.0
+    read = text[start:start + len(label)]
+    return sum(a == b for a, b in zip(label, read)) / len(label)
+
+
+def bench_backend(name, samples, batch_size):
+    try:
+        backend = get_backend(name)
+    except Exception as e:
+        print(f"[BENCH] {name}: unavailable ({e})")
+        return None
+
+    # Warm up so engine start-up is not billed to the first crop
+    backend.read(samples[0][1])
+
+    latencies, plates_ok, decoded_ok, chars = [], 0, 0, []
+    for start in range(0, len(samples), batch_size):
+        batch = samples[start:start + batch_size]
+        began = time.perf_counter()
+        results = backend.read_batch([image for _, image in batch])
+        latencies.extend([(time.perf_counter() - began) / len(batch)] * len(batch))
+        for (label, _), result in zip(batch, results):
+            text = result.text.replace(" ", "")
+            plates_ok += label in text
+            decoded = decode(result)
+            decoded_ok += decoded is not None and decoded.text == label
+            chars.append(char_accuracy(label, text))
+
+    latencies = np.array(latencies) * 1000
+    return {
+        'crops': len(samples),
+        'plate_accuracy': plates_ok / len(samples),
+        'decoded_accuracy': decoded_ok / len(samples),
+        'char_accuracy': float(np.mean(chars)),
+        'ms_avg': float(latencies.mean()),
+        'ms_p95': float(np.percentile(latencies, 95)),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare OCR backends on the labelled crops in plates/.")
+    parser.add_argument('--plates-dir', default=PLATES_DIR)
+    parser.add_argument('--backends', nargs='+', default=list(BACKENDS))
+    parser.add_argument('--all', action='store_true',
+                        help="use every labelled crop, not just the plates held out of char model training")
+    parser.add_argument('--batch', type=int, default=1, help="crops per read_batch() call")
+    args = parser.parse_args()
+
+    splits = [False, True] if args.all else [True]
+    samples = []
+    for holdout in splits:
+        for label, path in labelled_crops(args.plates_dir, holdout=holdout):
+            image = cv2.imread(path)
+            if image is not None:
+                samples.append((label, preprocess_crop(image)))
+    if not samples:
+        print(f"[BENCH] No labelled crops found in {args.plates_dir}")
+        return
+    print(f"[BENCH] {len(samples)} labelled crops, batch size {args.batch}")
+
+    print(f"{'backend':<12} {'crops':>6} {'plate acc':>10} {'decoded':>8} {'char acc':>9} {'ms avg':>8} {'ms p95':>8}")
+    for name in args.backends:
+        stats = bench_backend(name, samples, args.batch)
+        if stats:
+            print(f"{name:<12} {stats['crops']:>6} {stats['plate_accuracy']:>10.1%} {stats['decoded_accuracy']:>8.1%} "
+                  f"{stats['char_accuracy']:>9.1%} {stats['ms_avg']:>8.2f} {stats['ms_p95']:>8.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,337 @@
+import os
+import re
+import sys
+import time
+import zlib
+import cv2
+import numpy as np
+from ocr_engine import OcrResult, PLATE_CHARSET
+from preprocess import OCR_HEIGHT, preprocess_plate
+
+CHAR_MODEL_PATH = 'char_model.npz'
+PLATES_DIR = 'plates'
+PLATE_LENGTH = 7            # RABxxxC
+PLATE_HEIGHT = OCR_HEIGHT   # crops are normalised to this height before segmentation
+CHAR_SIZE = (20, 32)        # (width, height) each segmented glyph is scaled into
+HOG_CELLS = 4
+HOG_BINS = 9
+PREFIX_SAMPLES = 120        # unlabelled crops used for the fixed 'RA' prefix
+ALTERNATIVES = 5            # choices per glyph handed to the plate grammar
+PLATE_FILENAME = re.compile(r'^(RA[A-Z][0-9]{3}[A-Z])_')
+SYNTHETIC_FONTS = (cv2.FONT_HERSHEY_SIMPLEX, cv2.FONT_HERSHEY_DUPLEX,
+                   cv2.FONT_HERSHEY_COMPLEX, cv2.FONT_HERSHEY_TRIPLEX)
+
+
+# ===== Segmentation =====
+def segment_characters(thresh):
+    """Split a thresholded plate (dark text on light background) into glyph boxes.
+
+    Returns (binary plate with white glyphs at PLATE_HEIGHT, array of x, y, w, h
+    boxes sorted left to right).
+    """
+    scale = PLATE_HEIGHT / thresh.shape[0]
+    plate = cv2.resize(thresh, (max(1, int(thresh.shape[1] * scale)), PLATE_HEIGHT),
+                       interpolation=cv2.INTER_NEAREST)
+    if plate.ndim == 3:
+        plate = cv2.cvtColor(plate, cv2.COLOR_BGR2GRAY)
+    glyphs = cv2.threshold(plate, 127, 255, cv2.THRESH_BINARY_INV)[1]
+
+    contours = cv2.findContours(glyphs, cv2.RETR_LIST, cv2.CHAIN_APPROX_SIMPLE)[-2]
+    if not contours:
+        return glyphs, np.empty((0, 4), dtype=np.int32)
+    boxes = np.array([cv2.boundingRect(c) for c in contours], dtype=np.int32)
+    x, y, w, h = boxes.T
+    keep = ((h >= 0.35 * PLATE_HEIGHT) & (h <= 0.95 * PLATE_HEIGHT) &
+            (w >= 0.08 * h) & (w <= 4.0 * h))
+    boxes = boxes[keep]
+    if len(boxes) == 0:
+        return glyphs, boxes
+
+    # Drop boxes nested inside another glyph-sized candidate (holes of A, B, 0, 8, ...)
+    x, y, w, h = boxes.T
+    inside = ((x[:, None] >= x[None, :]) & (y[:, None] >= y[None, :]) &
+              (x[:, None] + w[:, None] <= x[None, :] + w[None, :]) &
+              (y[:, None] + h[:, None] <= y[None, :] + h[None, :]) &
+              (w[None, :] <= 2.5 * h[None, :]))
+    np.fill_diagonal(inside, False)
+    boxes = boxes[~inside.any(axis=1)]
+
+    # Plate characters share one height; drop stray marks (bolts, emblems, frame bits)
+    h = boxes[:, 3]
+    boxes = boxes[np.abs(h - np.median(h)) <= 0.2 * np.median(h)]
+    return glyphs, _split_touching(boxes[np.argsort(boxes[:, 0])])
+
+
+def _split_touching(boxes, expected=PLATE_LENGTH):
+    """Cut boxes much wider than a typical glyph (touching characters) into equal slices.
+
+    When the plate length is known, the slices are shared out between the
+    merged boxes (by width) so the total comes to `expected` glyphs.
+    """
+    narrow = boxes[boxes[:, 2] <= boxes[:, 3]]
+    if len(narrow) == 0:
+        return boxes[:0]
+    char_width = np.median(narrow[:, 2])
+    pieces = np.clip(np.rint(boxes[:, 2] / char_width), 1, None).astype(np.int32)
+    merged = pieces > 1
+    if not merged.any():
+        return boxes
+    budget = expected - pieces[~merged].sum()
+    if merged.sum() <= budget != pieces[merged].sum():
+        share = boxes[merged, 2] * budget / boxes[merged, 2].sum()
+        fixed = np.maximum(np.floor(share).astype(np.int32), 1)
+        remainder = np.argsort(fixed - share)[:max(0, budget - fixed.sum())]
+        fixed[remainder] += 1
+        pieces[merged] = fixed
+    split = []
+    for (x, y, w, h), n in zip(boxes, pieces):
+        if n > 4:
+            continue    # a frame edge or a blob, not a run of characters
+        edges = np.linspace(x, x + w, n + 1).astype(np.int32)
+        split.extend((left, y, right - left, h) for left, right in zip(edges[:-1], edges[1:]))
+    return np.array(split, dtype=np.int32).reshape(-1, 4)
+
+
+def glyph_images(glyphs, boxes):
+    """Scale each glyph into CHAR_SIZE, keeping its aspect ratio; returns float32 (N, h, w) in 0..1."""
+    width, height = CHAR_SIZE
+    images = np.zeros((len(boxes), height, width), dtype=np.float32)
+    for i, (x, y, w, h) in enumerate(boxes):
+        scale = min(width / w, height / h)
+        gw, gh = max(1, int(w * scale)), max(1, int(h * scale))
+        glyph = cv2.resize(glyphs[y:y + h, x:x + w], (gw, gh), interpolation=cv2.INTER_AREA)
+        ox, oy = (width - gw) // 2, (height - gh) // 2
+        images[i, oy:oy + gh, ox:ox + gw] = glyph / 255.0
+    return images
+
+
+def describe(images):
+    """Feature rows for a stack of glyph images: gradient-orientation histograms + coarse pixels.
+
+    Histograms use 4x4 cells of 9 unsigned orientation bins, computed for the
+    whole stack at once, which tolerates stroke-width and font differences
+    far better than raw pixels.
+    """
+    n, height, width = images.shape
+    gx = np.zeros_like(images)
+    gy = np.zeros_like(images)
+    gx[:, :, 1:-1] = images[:, :, 2:] - images[:, :, :-2]
+    gy[:, 1:-1, :] = images[:, 2:, :] - images[:, :-2, :]
+    magnitude = np.hypot(gx, gy)
+    bins = np.minimum((np.arctan2(gy, gx) % np.pi / np.pi * HOG_BINS).astype(np.int32), HOG_BINS - 1)
+    votes = (bins[..., None] == np.arange(HOG_BINS)) * magnitude[..., None]
+    cells = votes.reshape(n, HOG_CELLS, height // HOG_CELLS, HOG_CELLS, width // HOG_CELLS, HOG_BINS)
+    hog = cells.sum(axis=(2, 4)).reshape(n, -1)
+    hog /= np.linalg.norm(hog, axis=1, keepdims=True) + 1e-6
+    coarse = images.reshape(n, height // 2, 2, width // 2, 2).mean(axis=(2, 4)).reshape(n, -1)
+    return np.hstack([hog, coarse]).astype(np.float32)
+
+
+def augment(images, labels):
+    """Add thinner and bolder copies of every glyph (plates differ mostly in stroke weight)."""
+    kernel = np.ones((2, 2), np.uint8)
+    as_bytes = (images * 255).astype(np.uint8)
+    eroded = np.array([cv2.erode(image, kernel) for image in as_bytes], dtype=np.float32) / 255
+    dilated = np.array([cv2.dilate(image, kernel) for image in as_bytes], dtype=np.float32) / 255
+    return np.concatenate([images, eroded, dilated]), list(labels) * 3
+
+
+# ===== Classifier =====
+class CharClassifier:
+    """Softmax regression over describe() features; small enough to run per crop in microseconds."""
+
+    def __init__(self, weights, bias, classes, mean):
+        self.weights = weights
+        self.bias = bias
+        self.classes = classes
+        self.mean = mean
+
+    def predict_proba(self, features):
+        logits = (features - self.mean) @ self.weights + self.bias
+        logits -= logits.max(axis=1, keepdims=True)
+        probs = np.exp(logits)
+        return probs / probs.sum(axis=1, keepdims=True)
+
+    @classmethod
+    def train(cls, features, labels, epochs=60, lr=0.5, l2=1e-4, batch=256, seed=0):
+        classes = np.array(sorted(set(labels)))
+        targets = np.searchsorted(classes, labels)
+        mean = features.mean(axis=0)
+        x = features - mean
+        rng = np.random.default_rng(seed)
+        weights = np.zeros((x.shape[1], len(classes)), dtype=np.float32)
+        bias = np.zeros(len(classes), dtype=np.float32)
+        model = cls(weights, bias, classes, mean)
+        for _ in range(epochs):
+            order = rng.permutation(len(x))
+            for start in range(0, len(x), batch):
+                idx = order[start:start + batch]
+                probs = model.predict_proba(features[idx])
+                probs[np.arange(len(idx)), targets[idx]] -= 1
+                model.weights -= lr * (x[idx].T @ probs / len(idx) + l2 * model.weights)
+                model.bias -= lr * probs.mean(axis=0)
+        return model
+
+    def save(self, path):
+        np.savez_compressed(path, weights=self.weights, bias=self.bias, classes=self.classes, mean=self.mean)
+
+    @classmethod
+    def load(cls, path):
+        data = np.load(path)
+        return cls(data['weights'], data['bias'], data['classes'], data['mean'])
+
+
+# ===== Training data =====
+def plate_label(filename):
+    """Plate text encoded in an evidence filename (RAB123C_YYYYmmdd_HHMMSS.jpg), or None."""
+    match = PLATE_FILENAME.match(os.path.basename(filename))
+    return match.group(1) if match else None
+
+
+def is_holdout(plate):
+    """Every fifth plate (by hash) is kept out of training for the benchmark."""
+    return zlib.crc32(plate.encode()) % 5 == 0
+
+
+def labelled_crops(plates_dir=PLATES_DIR, holdout=False):
+    """Yield (plate, image path) for crops whose filename carries the plate text.
+
+    Subdirectories are searched too, so an evidence_store tree works as well as a flat plates/.
+    """
+    for folder, subfolders, filenames in os.walk(plates_dir):
+        subfolders.sort()
+        for filename in sorted(filenames):
+            plate = plate_label(filename)
+            if plate and is_holdout(plate) == holdout:
+                yield plate, os.path.join(folder, filename)
+
+
+def preprocess_crop(plate_img):
+    """The gate lanes' preprocessing, so the model trains on what it will be shown."""
+    return preprocess_plate(plate_img)
+
+
+def _stack(images):
+    if not images:
+        return np.empty((0, CHAR_SIZE[1], CHAR_SIZE[0]), dtype=np.float32)
+    return np.concatenate(images)
+
+
+def crop_samples(plates_dir=PLATES_DIR):
+    """Glyphs from labelled crops whose segmentation finds exactly seven characters."""
+    images, labels = [], []
+    for plate, path in labelled_crops(plates_dir):
+        image = cv2.imread(path)
+        if image is None:
+            continue
+        glyphs, boxes = segment_characters(preprocess_crop(image))
+        if len(boxes) == len(plate):
+            images.append(glyph_images(glyphs, boxes))
+            labels.extend(plate)
+    return _stack(images), labels
+
+
+def prefix_samples(plates_dir=PLATES_DIR, limit=PREFIX_SAMPLES):
+    """'R' and 'A' glyphs from unlabelled crops: every Rwandan plate starts with RA."""
+    images, labels = [], []
+    for filename in sorted(os.listdir(plates_dir)):
+        if len(images) >= limit:
+            break
+        if plate_label(filename) or not filename.lower().endswith('.jpg'):
+            continue
+        image = cv2.imread(os.path.join(plates_dir, filename))
+        if image is None:
+            continue
+        glyphs, boxes = segment_characters(preprocess_crop(image))
+        if len(boxes) == PLATE_LENGTH:
+            images.append(glyph_images(glyphs, boxes[:2]))
+            labels.extend("RA")
+    return _stack(images), labels
+
+
+def synthetic_samples(per_font=12, seed=0):
+    """Rendered glyphs so every plate character is covered, not just those in plates/."""
+    rng = np.random.default_rng(seed)
+    images, labels = [], []
+    for char in PLATE_CHARSET:
+        for font in SYNTHETIC_FONTS:
+            for _ in range(per_font):
+                canvas = np.full((PLATE_HEIGHT, PLATE_HEIGHT), 255, dtype=np.uint8)
+                thickness = int(rng.integers(3, 7))
+                cv2.putText(canvas, char, (10, 54), font, 1.9, 0, thickness, cv2.LINE_AA)
+                angle = rng.uniform(-6, 6)
+                matrix = cv2.getRotationMatrix2D((PLATE_HEIGHT / 2, PLATE_HEIGHT / 2), angle, 1.0)
+                canvas = cv2.warpAffine(canvas, matrix, canvas.shape[::-1], borderValue=255)
+                canvas = cv2.threshold(cv2.GaussianBlur(canvas, (3, 3), 0), 127, 255, cv2.THRESH_BINARY)[1]
+                glyphs = cv2.bitwise_not(canvas)
+                points = cv2.findNonZero(glyphs)
+                if points is None:
+                    continue
+                box = np.array([cv2.boundingRect(points)], dtype=np.int32)
+                images.append(glyph_images(glyphs, box))
+                labels.append(char)
+    return _stack(images), labels
+
+
+def train(plates_dir=PLATES_DIR, model_path=CHAR_MODEL_PATH):
+    real_x, real_y = crop_samples(plates_dir)
+    prefix_x, prefix_y = prefix_samples(plates_dir)
+    synth_x, synth_y = synthetic_samples()
+    print(f"[TRAIN] {len(real_y)} glyphs from labelled crops, {len(prefix_y)} RA-prefix glyphs, "
+          f"{len(synth_y)} synthetic glyphs")
+    images, labels = augment(np.concatenate([real_x, prefix_x, synth_x]), real_y + prefix_y + synth_y)
+    model = CharClassifier.train(describe(images), labels)
+    model.save(model_path)
+    print(f"[TRAIN] Saved character model to {model_path}")
+    return model
+
+
+# ===== OCR backend =====
+class CharRecognizerBackend:
+    """Segment-and-classify OCR for single-row RABxxxC plates; no Tesseract involved."""
+
+    name = 'chars'
+
+    def __init__(self, model_path=CHAR_MODEL_PATH, plates_dir=PLATES_DIR):
+        if os.path.exists(model_path):
+            self.model = CharClassifier.load(model_path)
+        elif os.path.isdir(plates_dir):
+            # The model is a build artifact: train it from the labelled crops on first use
+            print(f"[OCR] Character model {model_path} not found; training it from {plates_dir}/")
+            self.model = train(plates_dir, model_path)
+        else:
+            raise RuntimeError(f"Character model {model_path} not found and no {plates_dir}/ to train it from; "
+                               f"run: python char_recognizer.py train <labelled crops dir>")
+
+    def read(self, image):
+        return self.read_batch([image])[0]
+
+    def read_batch(self, images):
+        segmented = [segment_characters(image) for image in images]
+        counts = [len(boxes) for _, boxes in segmented]
+        if not sum(counts):
+            return [OcrResult('', [], []) for _ in images]
+
+        # One matrix product for every glyph of every crop in the batch
+        features = describe(np.concatenate([glyph_images(glyphs, boxes) for glyphs, boxes in segmented]))
+        probs = self.model.predict_proba(features)
+        order = np.argsort(-probs, axis=1)[:, :ALTERNATIVES]
+
+        results, start = [], 0
+        for count in counts:
+            rows = range(start, start + count)
+            text = ''.join(self.model.classes[order[i, 0]] for i in rows)
+            confidences = [float(probs[i, order[i, 0]]) for i in rows]
+            alternatives = [[(str(self.model.classes[j]), float(probs[i, j])) for j in order[i]] for i in rows]
+            results.append(OcrResult(text, confidences, alternatives))
+            start += count
+        return results
+
+
+if __name__ == "__main__":
+    if len(sys.argv) > 1 and sys.argv[1] == "train":
+        started = time.time()
+        train(sys.argv[2] if len(sys.argv) > 2 else PLATES_DIR)
+        print(f"[TRAIN] Done in {time.time() - started:.1f}s")
+    else:
+        print("Usage: python char_recognizer.py train [plates_dir]")
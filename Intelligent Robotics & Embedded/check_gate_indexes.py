@@ -0,0 +1,166 @@
+import argparse
+import sys
+import time
+from datetime import datetime, timedelta
+from psycopg2 import sql
+import db_operations
+
+SCRATCH_SCHEMA = 'gate_index_check'
+SEED_STEP = '13 seconds'    # one seeded entry every SEED_STEP, ending now
+ROWS = 10_000_000
+
+
+def seed(cursor, rows, start):
+    """Fill the scratch plates_log with `rows` sessions spread over ~676k plates, mostly closed and paid."""
+    cursor.execute("""
+        INSERT INTO plates_log (id, plate_number, payment_status, entry_timestamp,
+                                payment_timestamp, exit_timestamp, exit_status, amount_charged)
+        SELECT md5(i::text)::uuid,
+               'RA' || chr(65 + i %% 26) || lpad((i / 26 %% 1000)::text, 3, '0') || chr(65 + i / 26000 %% 26),
+               CASE WHEN i %% 50 = 0 THEN 0 ELSE 1 END,
+               ts,
+               CASE WHEN i %% 50 = 0 THEN NULL ELSE ts + interval '2 hours' END,
+               CASE WHEN i %% 100 = 0 THEN NULL ELSE ts + interval '3 hours' END,
+               CASE WHEN i %% 100 = 0 THEN NULL ELSE 'NORMAL' END,
+               CASE WHEN i %% 50 = 0 THEN NULL ELSE 1000 END
+        FROM generate_series(1, %s) AS i,
+             LATERAL (SELECT %s::timestamp + i * %s::interval AS ts) t
+    """, (rows, start, SEED_STEP))
+
+
+def create_partitions(cursor, rows, start):
+    """Monthly partitions of the scratch plates_log covering the seeded range; returns how many.
+
+    Names are schema-qualified: plates_log_ensure_partitions() checks names
+    with to_regclass, which would find the public partitions instead.
+    """
+    cursor.execute("""
+        SELECT generate_series(date_trunc('month', %(start)s::timestamp),
+                               %(start)s::timestamp + %(rows)s * %(step)s::interval, interval '1 month')::date
+    """, {'start': start, 'rows': rows, 'step': SEED_STEP})
+    months = [month for (month,) in cursor.fetchall()]
+    parent = sql.Identifier(SCRATCH_SCHEMA, 'plates_log')
+    for month in months:
+        cursor.execute(sql.SQL("CREATE TABLE {} PARTITION OF {} "
+                               "FOR VALUES FROM (%s) TO (%s::date + interval '1 month')")
+                       .format(sql.Identifier(SCRATCH_SCHEMA, f"plates_log_{month:%Y_%m}"), parent),
+                       (month, month))
+    return len(months)
+
+
+def relations(plan, node_type=None):
+    """Tables read anywhere in an EXPLAIN (FORMAT JSON) plan, optionally only by one node type."""
+    found = [plan['Relation Name']] if 'Relation Name' in plan and node_type in (None, plan['Node Type']) else []
+    for child in plan.get('Plans', []):
+        found.extend(relations(child, node_type))
+    return found
+
+
+def scan_nodes(plan):
+    nodes = [f"{plan['Node Type']} using {plan['Index Name']}" if 'Index Name' in plan else plan['Node Type']]
+    for child in plan.get('Plans', []):
+        nodes.extend(scan_nodes(child))
+    return nodes
+
+
+def outside_window(names, window_days=db_operations.GATE_WINDOW_DAYS):
+    """Partitions in `names` that end before the gate window starts, i.e. that should have been pruned."""
+    start = datetime.now() - timedelta(days=window_days)
+    first = start.year * 12 + start.month - 1
+    stale = []
+    for name in names:
+        match = db_operations._PARTITION_NAME.match(name)
+        if match and int(match.group(1)) * 12 + int(match.group(2)) - 1 < first:
+            stale.append(name)
+    return stale
+
+
+def check_query(cursor, query, plate):
+    """EXPLAIN ANALYZE one gate query: (ok, milliseconds, plan summary, problems)."""
+    cursor.execute("EXPLAIN (ANALYZE, FORMAT JSON) " + query, {'plate': plate})
+    result = cursor.fetchone()[0][0]
+    plan = result['Plan']
+    problems = []
+    # Sequential scans of empty (future) partitions cost nothing and are fine
+    scanned = relations(plan, 'Seq Scan')
+    if scanned:
+        cursor.execute("SELECT relname FROM pg_class WHERE relnamespace = %s::regnamespace "
+                       "AND relname = ANY(%s) AND reltuples > 0", (SCRATCH_SCHEMA, scanned))
+        problems += [f"seq scan of {name}" for (name,) in cursor.fetchall()]
+    # GATE_WINDOW must prune plates_log to the partitions it overlaps
+    problems += [f"not pruned: {name}" for name in outside_window(set(relations(plan)))]
+    return not problems, result['Execution Time'], ' > '.join(scan_nodes(plan)), problems
+
+
+def run(rows=ROWS, keep=False):
+    """Seed a scratch plates_log (once) and EXPLAIN every db_operations.GATE_QUERIES statement on it.
+
+    Returns [(name, ok, milliseconds, plan summary, problems)], or None if
+    the database is unreachable.
+    """
+    if db_operations.migrate() is None:
+        return None
+    conn = db_operations.connect_to_db()
+    if conn is None:
+        return None
+
+    results = []
+    try:
+        with conn.cursor() as cursor:
+            cursor.execute("SELECT to_regclass(%s)", (f"{SCRATCH_SCHEMA}.plates_log",))
+            if cursor.fetchone()[0] is None:
+                # Same columns and indexes as production, built by the real migrations
+                cursor.execute("SELECT date_trunc('second', LOCALTIMESTAMP - %s * %s::interval)", (rows, SEED_STEP))
+                start = cursor.fetchone()[0]
+                cursor.execute(f"CREATE SCHEMA IF NOT EXISTS {SCRATCH_SCHEMA}")
+                cursor.execute(f"CREATE TABLE {SCRATCH_SCHEMA}.plates_log "
+                               f"(LIKE public.plates_log INCLUDING ALL) PARTITION BY RANGE (entry_timestamp)")
+                print(f"[CHECK] Created {create_partitions(cursor, rows, start)} monthly partitions")
+                cursor.execute(f"SET search_path TO {SCRATCH_SCHEMA}, public")
+                began = time.perf_counter()
+                print(f"[CHECK] Seeding {rows:,} rows...")
+                seed(cursor, rows, start)
+                cursor.execute("ANALYZE plates_log")
+                conn.commit()
+                print(f"[CHECK] Seeded in {time.perf_counter() - began:.0f}s")
+            cursor.execute(f"SET search_path TO {SCRATCH_SCHEMA}, public")
+            cursor.execute("SELECT count(*) FROM plates_log")
+            print(f"[CHECK] {cursor.fetchone()[0]:,} rows in {SCRATCH_SCHEMA}.plates_log")
+            # A plate seen recently, so the lookups find rows inside the window
+            cursor.execute("SELECT plate_number FROM plates_log ORDER BY entry_timestamp DESC LIMIT 1")
+            plate = cursor.fetchone()[0]
+
+            for name, query in db_operations.GATE_QUERIES.items():
+                results.append((name, *check_query(cursor, query, plate)))
+    finally:
+        conn.rollback()
+        with conn.cursor() as cursor:
+            # The connection goes back to the shared pool
+            cursor.execute("RESET search_path")
+            if not keep:
+                cursor.execute(f"DROP SCHEMA IF EXISTS {SCRATCH_SCHEMA} CASCADE")
+        conn.commit()
+        db_operations.release_connection(conn)
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Check that every gate query uses index scans on the partitions inside the gate window, "
+                    "on a large scratch copy of plates_log.")
+    parser.add_argument('--rows', type=int, default=ROWS)
+    parser.add_argument('--keep', action='store_true', help=f"leave the {SCRATCH_SCHEMA} schema in place")
+    args = parser.parse_args()
+
+    results = run(args.rows, args.keep)
+    db_operations.close_pool()
+    if results is None:
+        sys.exit(2)
+    for name, ok, ms, plan, problems in results:
+        print(f"[{'PASS' if ok else 'FAIL'}] {name:<24} {ms:>8.3f} ms  {plan}"
+              f"{'  (' + '; '.join(problems) + ')' if problems else ''}")
+    sys.exit(0 if all(ok for _, ok, *_ in results) else 1)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,12 +1,21 @@
+import argparse
 import cv2
-from ultralytics import YOLO
-import pytesseract
+from ocr_engine import get_backend
+from preprocess import preprocess_plate
+from model_manager import MODEL_PATH, RUNTIME, RUNTIMES, load_optimized
 import os
 import time
 import re
 
-# Load YOLOv8 model (update path if needed)
-model = YOLO('C://Users//hp//Desktop//NE_2025//Embedded//Intelligent Robotics & Embedded//best.pt')
+parser = argparse.ArgumentParser(description="Detect, save and OCR plate crops from the webcam.")
+parser.add_argument('--headless', action='store_true', help="no preview windows and no pause per crop")
+parser.add_argument('--runtime', choices=RUNTIMES, default=RUNTIME, help="YOLO inference runtime")
+args = parser.parse_args()
+
+# Load YOLOv8 model (update MODEL_PATH in model_manager.py if needed), exported and warmed up
+model = load_optimized(MODEL_PATH, args.runtime)
+
+ocr = get_backend()
 
 # Create folder to save cropped plates
 save_dir = 'plates'
@@ -37,15 +46,11 @@ while True:
             plate_count += 1
 
             # ===== COOL Plate Processing =====
-            gray = cv2.cvtColor(plate_img, cv2.COLOR_BGR2GRAY)
-            blur = cv2.GaussianBlur(gray, (5, 5), 0)
-            thresh = cv2.threshold(blur, 0, 255, cv2.THRESH_BINARY + cv2.THRESH_OTSU)[1]
+            # Reused buffers; only copied when it is going to be shown
+            thresh = preprocess_plate(plate_img, copy=not args.headless)
 
             # ===== OCR Extraction =====
-            plate_text = pytesseract.image_to_string(
-                thresh,
-                config='--psm 8 --oem 3 -c tessedit_char_whitelist=ABCDEFGHIJKLMNOPQRSTUVWXYZ0123456789'
-            ).strip()
+            plate_text = ocr.read(thresh).text.strip()
 
             # ===== Validation Logic with 8th Char Tolerance =====
             match = re.search(r'RA[A-Z0-9 ]*', plate_text.upper())
@@ -71,10 +76,13 @@ while True:
                 print(f"❌ No valid RA plate found in: '{plate_text}'")
 
             # Show processed images
-            cv2.imshow("Cropped Plate", plate_img)
-            cv2.imshow("Processed Plate", thresh)
-            time.sleep(1)
+            if not args.headless:
+                cv2.imshow("Cropped Plate", plate_img)
+                cv2.imshow("Processed Plate", thresh)
+                time.sleep(1)
 
+    if args.headless:
+        continue
     # Show annotated webcam frame
     annotated_frame = results[0].plot()
     cv2.imshow('Webcam Detection', annotated_frame)
@@ -83,4 +91,5 @@ while True:
         break
 
 cap.release()
-cv2.destroyAllWindows()
\ No newline at end of file
+if not args.headless:
+    cv2.destroyAllWindows()
\ No newline at end of file
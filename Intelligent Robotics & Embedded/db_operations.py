@@ -1,5 +1,12 @@
 import psycopg2
 from psycopg2 import sql
+from psycopg2 import pool as pg_pool
+from psycopg2 import extensions
+from psycopg2 import extras
+import json
+import os
+import re
+import threading
 import time
 from datetime import datetime
 import uuid
@@ -25,46 +32,724 @@ def print_boxed_message(message, border_char="=", width=50):
     print(f"|{padding}{message}{padding}{' ' if len(message) % 2 else ''}|")
     print(border)
 
+# ===== Shared connection pool =====
+POOL_MIN_CONN = 1
+POOL_MAX_CONN = 8
+POOL_CHECKOUT_TIMEOUT = 5     # seconds to wait for a free connection
+POOL_HEALTH_CHECK_IDLE = 30   # ping connections idle for longer than this on checkout
+
+_pool = None
+_pool_lock = threading.Lock()
+_pool_slots = threading.BoundedSemaphore(POOL_MAX_CONN)
+_last_used = {}
+_issued = {}            # id(conn) -> the pool that handed it out, while checked out
+_idle = set()           # ids of connections the current pool holds open between checkouts
+_preopened = 0          # connections the current pool opened up front and has not handed out yet
+_pool_stats = {
+    'checkouts': 0,
+    'timeouts': 0,
+    'failures': 0,
+    'reconnects': 0,
+    'wait_total': 0.0,
+    'wait_max': 0.0,
+}
+
+
+def _get_pool():
+    """Create the shared pool on first use (and again after close_pool())."""
+    global _pool, _preopened
+    with _pool_lock:
+        if _pool is None:
+            _pool = pg_pool.ThreadedConnectionPool(POOL_MIN_CONN, POOL_MAX_CONN, **DB_PARAMS)
+            _preopened = POOL_MIN_CONN
+        return _pool
+
+
+def _is_healthy(conn):
+    """Return False for closed connections or idle ones that no longer answer."""
+    if conn.closed:
+        return False
+    with _pool_lock:
+        last_used = _last_used.get(id(conn))
+    if last_used is None or time.time() - last_used < POOL_HEALTH_CHECK_IDLE:
+        return True
+    try:
+        with conn.cursor() as cursor:
+            cursor.execute("SELECT 1")
+        conn.rollback()
+        return True
+    except psycopg2.Error:
+        return False
+
+
+def _checkout(pool):
+    """pool.getconn(), noting which pool issued the connection and whether it was already open."""
+    global _preopened
+    conn = pool.getconn()
+    with _pool_lock:
+        if pool is _pool:
+            if id(conn) in _idle:
+                _idle.discard(id(conn))
+            elif _preopened:
+                # getconn() hands out idle connections before opening new ones
+                _preopened -= 1
+        _issued[id(conn)] = pool
+    return conn
+
+
+def _discard(pool, conn):
+    """Close a broken connection and drop it from the pool."""
+    with _pool_lock:
+        _last_used.pop(id(conn), None)
+        _issued.pop(id(conn), None)
+    try:
+        pool.putconn(conn, close=True)
+    except pg_pool.PoolError:
+        conn.close()
+
+
 def connect_to_db():
-    """Establish a connection to the PostgreSQL database."""
+    """Check a connection out of the shared pool.
+
+    Returns None when the database is unreachable or no connection frees up
+    within POOL_CHECKOUT_TIMEOUT. Hand the connection back with
+    release_connection() instead of closing it.
+    """
+    start = time.perf_counter()
+    if not _pool_slots.acquire(timeout=POOL_CHECKOUT_TIMEOUT):
+        with _pool_lock:
+            _pool_stats['timeouts'] += 1
+        print_boxed_message("Database Pool Exhausted", "!")
+        print(f"[{get_timestamp()}] No free connection after {POOL_CHECKOUT_TIMEOUT}s.")
+        return None
+
     try:
-        conn = psycopg2.connect(**DB_PARAMS)
-        return conn
+        pool = _get_pool()
+        conn = _checkout(pool)
+        if not _is_healthy(conn):
+            _discard(pool, conn)
+            with _pool_lock:
+                _pool_stats['reconnects'] += 1
+            conn = _checkout(pool)
     except Exception as e:
+        _pool_slots.release()
+        with _pool_lock:
+            _pool_stats['failures'] += 1
         print_boxed_message("Database Connection Error", "!")
         print(f"[{get_timestamp()}] Error connecting to database: {e}")
         return None
 
-def initialize_db():
-    """Create the necessary tables if they don't exist."""
+    waited = time.perf_counter() - start
+    with _pool_lock:
+        _pool_stats['checkouts'] += 1
+        _pool_stats['wait_total'] += waited
+        _pool_stats['wait_max'] = max(_pool_stats['wait_max'], waited)
+    return conn
+
+
+def release_connection(conn):
+    """Return a connection to the pool that issued it, rolling back any open transaction.
+
+    A connection from a pool that close_pool() has since replaced is just
+    closed: the new pool would reject it.
+    """
+    if conn is None:
+        return
+    with _pool_lock:
+        pool = _issued.pop(id(conn), None)
+        current = pool is not None and pool is _pool
+    broken = conn.closed != 0
+    if current and not broken and conn.get_transaction_status() != extensions.TRANSACTION_STATUS_IDLE:
+        try:
+            conn.rollback()
+        except psycopg2.Error:
+            broken = True
+
+    try:
+        if not current:
+            conn.close()
+        elif broken:
+            _discard(pool, conn)
+        else:
+            with _pool_lock:
+                _last_used[id(conn)] = time.time()
+            try:
+                pool.putconn(conn)
+            except pg_pool.PoolError:
+                # close_pool() ran while this connection was on its way back
+                conn.close()
+            # putconn() closes connections beyond POOL_MIN_CONN instead of keeping them
+            if not conn.closed:
+                with _pool_lock:
+                    if pool is _pool:
+                        _idle.add(id(conn))
+    finally:
+        _pool_slots.release()
+
+
+def close_pool():
+    """Close every pooled connection; the pool is rebuilt on the next checkout."""
+    global _pool, _preopened
+    with _pool_lock:
+        pool, _pool = _pool, None
+        _last_used.clear()
+        _idle.clear()
+        _preopened = 0
+    if pool is not None:
+        pool.closeall()
+
+
+def get_pool_stats():
+    """Return a snapshot of pool checkout counters and wait times (seconds)."""
+    with _pool_lock:
+        stats = dict(_pool_stats)
+        in_use = sum(1 for pool in _issued.values() if pool is _pool) if _pool is not None else 0
+        idle = len(_idle) + _preopened
+    stats['wait_avg'] = stats['wait_total'] / stats['checkouts'] if stats['checkouts'] else 0.0
+    stats['max_size'] = POOL_MAX_CONN
+    stats['open'] = in_use + idle
+    stats['in_use'] = in_use
+    return stats
+
+
+def print_pool_stats():
+    """Print the pool counters in the usual boxed format."""
+    stats = get_pool_stats()
+    print_boxed_message("Database Pool Stats", "-")
+    print(f"  Checkouts: {stats['checkouts']} (timeouts: {stats['timeouts']}, failures: {stats['failures']})")
+    print(f"  Reconnects: {stats['reconnects']}")
+    print(f"  Wait avg/max: {stats['wait_avg'] * 1000:.2f} ms / {stats['wait_max'] * 1000:.2f} ms")
+    print(f"  Connections: {stats['in_use']} in use, {stats['open']} open, {stats['max_size']} max")
+
+PLATES_LOG_CHANNEL = 'plates_log_changes'
+SESSION_COLUMNS = ('id', 'plate_number', 'payment_status', 'entry_timestamp',
+                   'payment_timestamp', 'exit_timestamp', 'exit_status')
+GATE_WINDOW_DAYS = 60   # gate queries only see sessions entered this recently; older ones are settled by hand
+# Every gate query bounds the partition key, so the planner prunes plates_log to the last few
+# monthly partitions. LOCALTIMESTAMP, not now(): entry_timestamp has no time zone.
+GATE_WINDOW = f"entry_timestamp >= LOCALTIMESTAMP - interval '{GATE_WINDOW_DAYS} days'"
+
+# Gate row lookups, written once with a {plate} placeholder: the Python queries fill in
+# %(plate)s and the gate_* SQL functions p_plate. check_gate_indexes.py EXPLAINs these.
+_OPEN_LOOKUP = f"""
+    SELECT 1 FROM plates_log
+    WHERE plate_number = {{plate}} AND exit_timestamp IS NULL AND {GATE_WINDOW}"""
+_UNPAID_LOOKUP = f"""
+    SELECT id FROM plates_log
+    WHERE plate_number = {{plate}} AND payment_status = 0 AND {GATE_WINDOW}
+    ORDER BY entry_timestamp DESC
+    LIMIT 1"""
+_PAID_OPEN_LOOKUP = f"""
+    SELECT id FROM plates_log
+    WHERE plate_number = {{plate}} AND payment_status = 1 AND exit_timestamp IS NULL AND {GATE_WINDOW}
+    ORDER BY payment_timestamp DESC
+    LIMIT 1"""
+_OPEN_UNFLAGGED_LOOKUP = f"""
+    SELECT id FROM plates_log
+    WHERE plate_number = {{plate}} AND exit_timestamp IS NULL AND exit_status IS NULL AND {GATE_WINDOW}
+    ORDER BY entry_timestamp DESC
+    LIMIT 1"""
+
+# ===== Schema migrations =====
+# (version, name, statements). Append new versions; never edit one that has shipped.
+MIGRATIONS = [
+    (1, "create plates_log", [
+        """
+        CREATE TABLE IF NOT EXISTS plates_log (
+            id UUID PRIMARY KEY,
+            plate_number VARCHAR(10) NOT NULL,
+            payment_status INTEGER DEFAULT 0,
+            entry_timestamp TIMESTAMP NOT NULL,
+            payment_timestamp TIMESTAMP,
+            exit_timestamp TIMESTAMP,
+            exit_status VARCHAR(100),
+            amount_charged NUMERIC(10, 2)
+        )
+        """,
+    ]),
+    # Broadcast every row change so in-process occupancy indexes stay current
+    (2, "notify plates_log changes", [
+        f"""
+        CREATE OR REPLACE FUNCTION plates_log_notify() RETURNS trigger AS $$
+        BEGIN
+            PERFORM pg_notify('{PLATES_LOG_CHANNEL}', row_to_json(NEW)::text);
+            RETURN NEW;
+        END;
+        $$ LANGUAGE plpgsql
+        """,
+        "DROP TRIGGER IF EXISTS plates_log_notify ON plates_log",
+        """
+        CREATE TRIGGER plates_log_notify
+        AFTER INSERT OR UPDATE ON plates_log
+        FOR EACH ROW EXECUTE FUNCTION plates_log_notify()
+        """,
+    ]),
+    # One index per gate query shape, so lookups stay index scans as history grows
+    (3, "gate query indexes", [
+        # Latest session per plate: is_payment_complete, fetch_latest_sessions
+        """
+        CREATE INDEX IF NOT EXISTS plates_log_plate_entry
+        ON plates_log (plate_number, entry_timestamp DESC)
+        """,
+        # Cars still inside: log_plate_entry, DENIED checks in log_plate_exit
+        """
+        CREATE INDEX IF NOT EXISTS plates_log_open_sessions
+        ON plates_log (plate_number, entry_timestamp DESC)
+        WHERE exit_timestamp IS NULL
+        """,
+        # Paid and still inside: update_exit_status, normal exits in log_plate_exit
+        """
+        CREATE INDEX IF NOT EXISTS plates_log_paid_open
+        ON plates_log (plate_number, payment_timestamp DESC)
+        WHERE payment_status = 1 AND exit_timestamp IS NULL
+        """,
+        # Waiting for payment: read_last_unpaid_entry, payment updates
+        """
+        CREATE INDEX IF NOT EXISTS plates_log_unpaid
+        ON plates_log (plate_number, entry_timestamp DESC)
+        WHERE payment_status = 0
+        """,
+    ]),
+    # Entry check-and-insert in one call; the per-plate lock stops two lanes logging the same car twice
+    (4, "atomic gate entry", [
+        """
+        CREATE OR REPLACE FUNCTION gate_log_entry(p_id UUID, p_plate VARCHAR, p_status INTEGER,
+                                                  p_entry TIMESTAMP) RETURNS TIMESTAMP AS $$
+        BEGIN
+            PERFORM pg_advisory_xact_lock(hashtext('plates_log:' || p_plate));
+            INSERT INTO plates_log (id, plate_number, payment_status, entry_timestamp)
+            SELECT p_id, p_plate, p_status, p_entry
+            WHERE NOT EXISTS (SELECT 1 FROM plates_log
+                              WHERE plate_number = p_plate AND exit_timestamp IS NULL);
+            IF FOUND THEN
+                RETURN p_entry;
+            END IF;
+            RETURN NULL;
+        END;
+        $$ LANGUAGE plpgsql
+        """,
+    ]),
+    # Journaled gate events (see journal.py): each event_id is applied at most once,
+    # at the time it happened rather than the time it reached the database
+    (5, "idempotent gate events", [
+        """
+        CREATE TABLE IF NOT EXISTS gate_events (
+            event_id UUID PRIMARY KEY,
+            kind VARCHAR(10) NOT NULL,
+            plate_number VARCHAR(10) NOT NULL,
+            occurred_at TIMESTAMP NOT NULL,
+            applied_at TIMESTAMP NOT NULL DEFAULT now()
+        )
+        """,
+        """
+        CREATE OR REPLACE FUNCTION gate_apply_event(p_event UUID, p_kind VARCHAR, p_plate VARCHAR,
+                                                    p_at TIMESTAMP, p_status VARCHAR, p_amount NUMERIC)
+        RETURNS BOOLEAN AS $$
+        BEGIN
+            INSERT INTO gate_events (event_id, kind, plate_number, occurred_at)
+            VALUES (p_event, p_kind, p_plate, p_at)
+            ON CONFLICT DO NOTHING;
+            IF NOT FOUND THEN
+                RETURN FALSE;
+            END IF;
+
+            IF p_kind = 'entry' THEN
+                -- The entry row takes the event id, so the gate knows it before the flush
+                PERFORM gate_log_entry(p_event, p_plate, 0, p_at);
+            ELSIF p_kind = 'exit' AND p_status = 'DENIED' THEN
+                UPDATE plates_log SET exit_status = p_status, exit_timestamp = p_at
+                WHERE id = (SELECT id FROM plates_log
+                            WHERE plate_number = p_plate AND exit_timestamp IS NULL AND exit_status IS NULL
+                            ORDER BY entry_timestamp DESC LIMIT 1 FOR UPDATE);
+            ELSIF p_kind = 'exit' THEN
+                UPDATE plates_log SET exit_timestamp = p_at, exit_status = COALESCE(p_status, exit_status)
+                WHERE id = (SELECT id FROM plates_log
+                            WHERE plate_number = p_plate AND payment_status = 1 AND exit_timestamp IS NULL
+                            ORDER BY payment_timestamp DESC LIMIT 1 FOR UPDATE);
+            ELSIF p_kind = 'payment' THEN
+                UPDATE plates_log SET payment_status = 1, payment_timestamp = p_at,
+                                      amount_charged = COALESCE(p_amount, amount_charged)
+                WHERE id = (SELECT id FROM plates_log
+                            WHERE plate_number = p_plate AND payment_status = 0
+                            ORDER BY entry_timestamp DESC LIMIT 1 FOR UPDATE);
+            END IF;
+            RETURN TRUE;
+        END;
+        $$ LANGUAGE plpgsql
+        """,
+    ]),
+    # Bulk loads set plates_log.bulk_load so millions of imported rows do not each send a NOTIFY
+    (6, "quiet bulk loads", [
+        f"""
+        CREATE OR REPLACE FUNCTION plates_log_notify() RETURNS trigger AS $$
+        BEGIN
+            IF current_setting('plates_log.bulk_load', true) = 'on' THEN
+                RETURN NEW;
+            END IF;
+            PERFORM pg_notify('{PLATES_LOG_CHANNEL}', row_to_json(NEW)::text);
+            RETURN NEW;
+        END;
+        $$ LANGUAGE plpgsql
+        """,
+    ]),
+    # Monthly range partitions on entry_timestamp. plates_log_ensure_partitions() creates
+    # missing months; maintain_partitions() calls it and archives old months.
+    (7, "partition plates_log by month", [
+        """
+        CREATE OR REPLACE FUNCTION plates_log_ensure_partitions(p_from DATE, p_months_ahead INTEGER)
+        RETURNS INTEGER AS $$
+        DECLARE
+            month DATE := date_trunc('month', p_from);
+            last_month DATE := date_trunc('month', now()) + make_interval(months => p_months_ahead);
+            partition_name TEXT;
+            created INTEGER := 0;
+        BEGIN
+            WHILE month <= last_month LOOP
+                partition_name := 'plates_log_' || to_char(month, 'YYYY_MM');
+                IF to_regclass(partition_name) IS NULL THEN
+                    EXECUTE format('CREATE TABLE %I PARTITION OF plates_log FOR VALUES FROM (%L) TO (%L)',
+                                   partition_name, month, month + interval '1 month');
+                    created := created + 1;
+                END IF;
+                month := month + interval '1 month';
+            END LOOP;
+            RETURN created;
+        END;
+        $$ LANGUAGE plpgsql
+        """,
+        # Existing databases: move the rows of the plain table into the partitioned one
+        """
+        DO $$
+        BEGIN
+            IF (SELECT relkind FROM pg_class WHERE oid = 'plates_log'::regclass) = 'p' THEN
+                RETURN;
+            END IF;
+            ALTER TABLE plates_log RENAME TO plates_log_unpartitioned;
+            ALTER TABLE plates_log_unpartitioned RENAME CONSTRAINT plates_log_pkey TO plates_log_unpartitioned_pkey;
+            DROP TRIGGER IF EXISTS plates_log_notify ON plates_log_unpartitioned;
+            DROP INDEX IF EXISTS plates_log_plate_entry, plates_log_open_sessions,
+                                 plates_log_paid_open, plates_log_unpaid;
+
+            CREATE TABLE plates_log (LIKE plates_log_unpartitioned INCLUDING DEFAULTS)
+                PARTITION BY RANGE (entry_timestamp);
+            -- Unique keys on a partitioned table must contain the partition key
+            ALTER TABLE plates_log ADD PRIMARY KEY (id, entry_timestamp);
+            CREATE INDEX plates_log_plate_entry ON plates_log (plate_number, entry_timestamp DESC);
+            CREATE INDEX plates_log_open_sessions ON plates_log (plate_number, entry_timestamp DESC)
+                WHERE exit_timestamp IS NULL;
+            CREATE INDEX plates_log_paid_open ON plates_log (plate_number, payment_timestamp DESC)
+                WHERE payment_status = 1 AND exit_timestamp IS NULL;
+            CREATE INDEX plates_log_unpaid ON plates_log (plate_number, entry_timestamp DESC)
+                WHERE payment_status = 0;
+            CREATE TRIGGER plates_log_notify AFTER INSERT OR UPDATE ON plates_log
+                FOR EACH ROW EXECUTE FUNCTION plates_log_notify();
+
+            PERFORM plates_log_ensure_partitions(
+                COALESCE((SELECT min(entry_timestamp) FROM plates_log_unpartitioned), now())::date, 0);
+            PERFORM set_config('plates_log.bulk_load', 'on', true);
+            INSERT INTO plates_log SELECT * FROM plates_log_unpartitioned;
+            DROP TABLE plates_log_unpartitioned;
+        END;
+        $$
+        """,
+        "CREATE SCHEMA IF NOT EXISTS plates_log_archive",
+    ]),
+    # Journaled kiosk payments carry the id of the session that was charged, so a replay
+    # pays that row rather than whichever session of the plate is unpaid by then
+    (8, "payments name their session", [
+        "DROP FUNCTION IF EXISTS gate_apply_event(UUID, VARCHAR, VARCHAR, TIMESTAMP, VARCHAR, NUMERIC)",
+        """
+        CREATE OR REPLACE FUNCTION gate_apply_event(p_event UUID, p_kind VARCHAR, p_plate VARCHAR,
+                                                    p_at TIMESTAMP, p_status VARCHAR, p_amount NUMERIC,
+                                                    p_entry UUID DEFAULT NULL)
+        RETURNS BOOLEAN AS $$
+        BEGIN
+            INSERT INTO gate_events (event_id, kind, plate_number, occurred_at)
+            VALUES (p_event, p_kind, p_plate, p_at)
+            ON CONFLICT DO NOTHING;
+            IF NOT FOUND THEN
+                RETURN FALSE;
+            END IF;
+
+            IF p_kind = 'entry' THEN
+                -- The entry row takes the event id, so the gate knows it before the flush
+                PERFORM gate_log_entry(p_event, p_plate, 0, p_at);
+            ELSIF p_kind = 'exit' AND p_status = 'DENIED' THEN
+                UPDATE plates_log SET exit_status = p_status, exit_timestamp = p_at
+                WHERE id = (SELECT id FROM plates_log
+                            WHERE plate_number = p_plate AND exit_timestamp IS NULL AND exit_status IS NULL
+                            ORDER BY entry_timestamp DESC LIMIT 1 FOR UPDATE);
+            ELSIF p_kind = 'exit' THEN
+                UPDATE plates_log SET exit_timestamp = p_at, exit_status = COALESCE(p_status, exit_status)
+                WHERE id = (SELECT id FROM plates_log
+                            WHERE plate_number = p_plate AND payment_status = 1 AND exit_timestamp IS NULL
+                            ORDER BY payment_timestamp DESC LIMIT 1 FOR UPDATE);
+            ELSIF p_kind = 'payment' AND p_entry IS NOT NULL THEN
+                UPDATE plates_log SET payment_status = 1, payment_timestamp = p_at,
+                                      amount_charged = COALESCE(p_amount, amount_charged)
+                WHERE id = p_entry AND payment_status = 0;
+            ELSIF p_kind = 'payment' THEN
+                UPDATE plates_log SET payment_status = 1, payment_timestamp = p_at,
+                                      amount_charged = COALESCE(p_amount, amount_charged)
+                WHERE id = (SELECT id FROM plates_log
+                            WHERE plate_number = p_plate AND payment_status = 0
+                            ORDER BY entry_timestamp DESC LIMIT 1 FOR UPDATE);
+            END IF;
+            RETURN TRUE;
+        END;
+        $$ LANGUAGE plpgsql
+        """,
+    ]),
+    # to_regclass() only searches search_path, so months already moved to the archive
+    # schema were created again in public, and the next archive run collided with them
+    (9, "skip archived months when creating partitions", [
+        """
+        CREATE OR REPLACE FUNCTION plates_log_ensure_partitions(p_from DATE, p_months_ahead INTEGER)
+        RETURNS INTEGER AS $$
+        DECLARE
+            month DATE := date_trunc('month', p_from);
+            last_month DATE := date_trunc('month', now()) + make_interval(months => p_months_ahead);
+            partition_name TEXT;
+            created INTEGER := 0;
+        BEGIN
+            WHILE month <= last_month LOOP
+                partition_name := 'plates_log_' || to_char(month, 'YYYY_MM');
+                IF to_regclass(partition_name) IS NULL
+                        AND to_regclass(format('plates_log_archive.%I', partition_name)) IS NULL THEN
+                    EXECUTE format('CREATE TABLE %I PARTITION OF plates_log FOR VALUES FROM (%L) TO (%L)',
+                                   partition_name, month, month + interval '1 month');
+                    created := created + 1;
+                END IF;
+                month := month + interval '1 month';
+            END LOOP;
+            RETURN created;
+        END;
+        $$ LANGUAGE plpgsql
+        """,
+    ]),
+    # Bound the gate functions' lookups to GATE_WINDOW like the Python gate queries, so they
+    # prune to the recent partitions instead of probing every month's index
+    (10, "gate lookups within the entry window", [
+        f"""
+        CREATE OR REPLACE FUNCTION gate_log_entry(p_id UUID, p_plate VARCHAR, p_status INTEGER,
+                                                  p_entry TIMESTAMP) RETURNS TIMESTAMP AS $$
+        BEGIN
+            PERFORM pg_advisory_xact_lock(hashtext('plates_log:' || p_plate));
+            INSERT INTO plates_log (id, plate_number, payment_status, entry_timestamp)
+            SELECT p_id, p_plate, p_status, p_entry
+            WHERE NOT EXISTS ({_OPEN_LOOKUP.format(plate='p_plate')});
+            IF FOUND THEN
+                RETURN p_entry;
+            END IF;
+            RETURN NULL;
+        END;
+        $$ LANGUAGE plpgsql
+        """,
+        f"""
+        CREATE OR REPLACE FUNCTION gate_apply_event(p_event UUID, p_kind VARCHAR, p_plate VARCHAR,
+                                                    p_at TIMESTAMP, p_status VARCHAR, p_amount NUMERIC,
+                                                    p_entry UUID DEFAULT NULL)
+        RETURNS BOOLEAN AS $$
+        BEGIN
+            INSERT INTO gate_events (event_id, kind, plate_number, occurred_at)
+            VALUES (p_event, p_kind, p_plate, p_at)
+            ON CONFLICT DO NOTHING;
+            IF NOT FOUND THEN
+                RETURN FALSE;
+            END IF;
+
+            IF p_kind = 'entry' THEN
+                -- The entry row takes the event id, so the gate knows it before the flush
+                PERFORM gate_log_entry(p_event, p_plate, 0, p_at);
+            ELSIF p_kind = 'exit' AND p_status = 'DENIED' THEN
+                UPDATE plates_log SET exit_status = p_status, exit_timestamp = p_at
+                WHERE {GATE_WINDOW} AND id = ({_OPEN_UNFLAGGED_LOOKUP.format(plate='p_plate')}
+                    FOR UPDATE);
+            ELSIF p_kind = 'exit' THEN
+                UPDATE plates_log SET exit_timestamp = p_at, exit_status = COALESCE(p_status, exit_status)
+                WHERE {GATE_WINDOW} AND id = ({_PAID_OPEN_LOOKUP.format(plate='p_plate')}
+                    FOR UPDATE);
+            ELSIF p_kind = 'payment' AND p_entry IS NOT NULL THEN
+                UPDATE plates_log SET payment_status = 1, payment_timestamp = p_at,
+                                      amount_charged = COALESCE(p_amount, amount_charged)
+                WHERE id = p_entry AND payment_status = 0 AND {GATE_WINDOW};
+            ELSIF p_kind = 'payment' THEN
+                UPDATE plates_log SET payment_status = 1, payment_timestamp = p_at,
+                                      amount_charged = COALESCE(p_amount, amount_charged)
+                WHERE {GATE_WINDOW} AND id = ({_UNPAID_LOOKUP.format(plate='p_plate')}
+                    FOR UPDATE);
+            END IF;
+            RETURN TRUE;
+        END;
+        $$ LANGUAGE plpgsql
+        """,
+    ]),
+]
+
+# Arbitrary key so two processes starting together do not migrate at the same time
+MIGRATION_LOCK_ID = 7301
+
+
+def schema_version(cursor):
+    """Highest applied migration version (0 for a fresh database)."""
+    cursor.execute("SELECT to_regclass('schema_migrations')")
+    if cursor.fetchone()[0] is None:
+        return 0
+    cursor.execute("SELECT COALESCE(MAX(version), 0) FROM schema_migrations")
+    return cursor.fetchone()[0]
+
+
+def migrate(target=None):
+    """Apply pending migrations in order, each in its own transaction; returns the schema version or None."""
     conn = connect_to_db()
     if conn is None:
+        return None
+
+    try:
+        with conn.cursor() as cursor:
+            cursor.execute("SELECT pg_advisory_lock(%s)", (MIGRATION_LOCK_ID,))
+            try:
+                cursor.execute("""
+                    CREATE TABLE IF NOT EXISTS schema_migrations (
+                        version INTEGER PRIMARY KEY,
+                        name VARCHAR(100) NOT NULL,
+                        applied_at TIMESTAMP NOT NULL DEFAULT now()
+                    )
+                """)
+                conn.commit()
+
+                version = schema_version(cursor)
+                for number, name, statements in MIGRATIONS:
+                    if number <= version or (target is not None and number > target):
+                        continue
+                    for statement in statements:
+                        cursor.execute(statement)
+                    cursor.execute("INSERT INTO schema_migrations (version, name) VALUES (%s, %s)",
+                                   (number, name))
+                    conn.commit()
+                    version = number
+                    print(f"[{get_timestamp()}] Applied migration {number}: {name}")
+                return version
+            finally:
+                conn.rollback()
+                cursor.execute("SELECT pg_advisory_unlock(%s)", (MIGRATION_LOCK_ID,))
+                conn.commit()
+    except Exception as e:
+        print_boxed_message("Database Migration Error", "!")
+        print(f"[{get_timestamp()}] Error migrating database: {e}")
+        return None
+    finally:
+        release_connection(conn)
+
+
+def initialize_db():
+    """Bring the schema up to date (creates the tables on a fresh database) and roll the partitions."""
+    version = migrate()
+    if version is None:
         return False
+    maintain_partitions()
+    print(f"[{get_timestamp()}] Database initialized successfully (schema version {version}).")
+    return True
+
+
+SCHEMA_CACHE = '.schema_cache.json'   # last schema version each database was brought up to, and when
+SCHEMA_CACHE_TTL = 24 * 3600          # seconds before a cached check is redone (partitions roll monthly)
+
+
+def _schema_key():
+    return f"{DB_PARAMS['host']}:{DB_PARAMS['port']}/{DB_PARAMS['dbname']}"
+
+
+def ensure_schema(max_age=SCHEMA_CACHE_TTL, path=SCHEMA_CACHE):
+    """initialize_db(), unless this database was brought up to the latest migration less than max_age ago.
+
+    Restarts and admin commands then start without the advisory lock and
+    catalog queries. Adding a migration invalidates the cache; so does
+    deleting SCHEMA_CACHE or passing max_age=0.
+    """
+    latest = MIGRATIONS[-1][0]
+    try:
+        with open(path) as f:
+            cache = json.load(f)
+    except (OSError, ValueError):
+        cache = {}
+    checked = cache.get(_schema_key())
+    if checked and checked['version'] == latest and time.time() - checked['checked_at'] < max_age:
+        return True
+    if not initialize_db():
+        return False
+    cache[_schema_key()] = {'version': latest, 'checked_at': time.time()}
+    try:
+        with open(path + '.tmp', 'w') as f:
+            json.dump(cache, f)
+        os.replace(path + '.tmp', path)
+    except OSError as e:
+        print(f"[{get_timestamp()}] Could not cache the schema check: {e}")
+    return True
+
+
+# ===== Partitions =====
+PARTITION_MONTHS_AHEAD = 2      # months of empty partitions kept ready for new entries
+PARTITION_CHECK_INTERVAL = 6 * 3600     # seconds between partition checks in long-running processes
+ARCHIVE_AFTER_MONTHS = 12       # closed months older than this leave plates_log
+ARCHIVE_SCHEMA = 'plates_log_archive'
+_PARTITION_NAME = re.compile(r'^plates_log_(\d{4})_(\d{2})$')
+
+
+def maintain_partitions(months_ahead=PARTITION_MONTHS_AHEAD, archive_after_months=ARCHIVE_AFTER_MONTHS):
+    """Create upcoming monthly partitions and archive old ones; returns (created, archived) or None.
+
+    A month is archived (detached from plates_log and moved to the
+    plates_log_archive schema, where reports can still read it) once it
+    ended more than archive_after_months ago and has no open session left.
+    archive_after_months=None only creates partitions.
+    """
+    conn = connect_to_db()
+    if conn is None:
+        return None
 
     try:
         with conn.cursor() as cursor:
-            # Create plates_log table
-            cursor.execute("""
-                CREATE TABLE IF NOT EXISTS plates_log (
-                    id UUID PRIMARY KEY,
-                    plate_number VARCHAR(10) NOT NULL,
-                    payment_status INTEGER DEFAULT 0,
-                    entry_timestamp TIMESTAMP NOT NULL,
-                    payment_timestamp TIMESTAMP,
-                    exit_timestamp TIMESTAMP,
-                    exit_status VARCHAR(100),
-                    amount_charged NUMERIC(10, 2)
-                )
-            """)
+            cursor.execute("SELECT plates_log_ensure_partitions(now()::date, %s)", (months_ahead,))
+            created = cursor.fetchone()[0]
             conn.commit()
-            print(f"[{get_timestamp()}] Database initialized successfully.")
-            return True
+
+            archived = []
+            if archive_after_months is not None:
+                cursor.execute("""
+                    SELECT c.relname FROM pg_inherits i JOIN pg_class c ON c.oid = i.inhrelid
+                    WHERE i.inhparent = 'plates_log'::regclass
+                """)
+                now = datetime.now()
+                cutoff = now.year * 12 + now.month - 1 - archive_after_months
+                for (name,) in cursor.fetchall():
+                    match = _PARTITION_NAME.match(name)
+                    # Month index of the partition's end bound
+                    if not match or int(match.group(1)) * 12 + int(match.group(2)) > cutoff:
+                        continue
+                    partition = sql.Identifier(name)
+                    cursor.execute(sql.SQL("SELECT EXISTS (SELECT 1 FROM {} WHERE exit_timestamp IS NULL)")
+                                   .format(partition))
+                    if cursor.fetchone()[0]:
+                        print(f"[PARTITION] Keeping {name}: it still has open sessions")
+                        continue
+                    cursor.execute(sql.SQL("ALTER TABLE plates_log DETACH PARTITION {}").format(partition))
+                    cursor.execute(sql.SQL("ALTER TABLE {} SET SCHEMA {}")
+                                   .format(partition, sql.Identifier(ARCHIVE_SCHEMA)))
+                    conn.commit()
+                    archived.append(name)
+
+            if created or archived:
+                print(f"[PARTITION] Created {created} partition(s), archived {len(archived)}"
+                      f"{': ' + ', '.join(archived) if archived else ''}")
+            return created, len(archived)
     except Exception as e:
-        print_boxed_message("Database Initialization Error", "!")
-        print(f"[{get_timestamp()}] Error initializing database: {e}")
-        return False
+        print_boxed_message("Database Partition Error", "!")
+        print(f"[{get_timestamp()}] Error maintaining plates_log partitions: {e}")
+        return None
     finally:
-        conn.close()
+        release_connection(conn)
+
 
 def log_plate_entry(plate, payment_status=0):
     """Log a new plate entry to the database if it hasn't already entered and not exited."""
@@ -74,27 +759,16 @@ def log_plate_entry(plate, payment_status=0):
 
     try:
         with conn.cursor() as cursor:
-            # Check for existing entry with no exit timestamp
-            cursor.execute("""
-                SELECT id FROM plates_log
-                WHERE plate_number = %s AND exit_timestamp IS NULL
-                ORDER BY entry_timestamp DESC
-                LIMIT 1
-            """, (plate,))
-            result = cursor.fetchone()
+            # Check for an un-exited entry and insert in one round trip (see migration 4)
+            timestamp = get_timestamp()
+            cursor.execute("SELECT gate_log_entry(%s, %s, %s, %s)",
+                           (str(uuid.uuid4()), plate, payment_status, timestamp))
+            logged = cursor.fetchone()[0]
+            conn.commit()
 
-            if result is not None:
+            if logged is None:
                 print(f"[SKIP] Plate {plate} already logged without exit. Skipping entry.")
                 return None
-
-            # No existing un-exited entry, proceed to log new entry
-            timestamp = get_timestamp()
-            plate_id = str(uuid.uuid4())
-            cursor.execute("""
-                INSERT INTO plates_log (id, plate_number, payment_status, entry_timestamp)
-                VALUES (%s, %s, %s, %s)
-            """, (plate_id, plate, payment_status, timestamp))
-            conn.commit()
             print(f"[ENTRY] Plate {plate} logged at {timestamp}.")
             return timestamp
     except Exception as e:
@@ -102,7 +776,7 @@ def log_plate_entry(plate, payment_status=0):
         print(f"[{get_timestamp()}] Error logging plate to database: {e}")
         return None
     finally:
-        conn.close()
+        release_connection(conn)
 
 
 def read_last_unpaid_entry(plate):
@@ -113,10 +787,10 @@ def read_last_unpaid_entry(plate):
 
     try:
         with conn.cursor() as cursor:
-            cursor.execute("""
-                SELECT plate_number, payment_status, entry_timestamp::text
+            cursor.execute(f"""
+                SELECT plate_number, payment_status, entry_timestamp::text, id
                 FROM plates_log
-                WHERE plate_number = %s AND payment_status = 0
+                WHERE plate_number = %s AND payment_status = 0 AND {GATE_WINDOW}
                 ORDER BY entry_timestamp DESC
                 LIMIT 1
             """, (plate,))
@@ -128,49 +802,113 @@ def read_last_unpaid_entry(plate):
             return {
                 'Plate Number': result[0],
                 'Payment Status': str(result[1]),
-                'Timestamp': result[2]
+                'Timestamp': result[2],
+                'Id': str(result[3])
             }
     except Exception as e:
         print_boxed_message("Database Query Error", "!")
         print(f"[{get_timestamp()}] Error reading from database: {e}")
         return None
     finally:
-        conn.close()
+        release_connection(conn)
+
+# Row-locking lookups used as `WHERE id = (...)` so each gate event is a single
+# UPDATE; SKIP LOCKED lets a concurrent lane move on instead of double-updating.
+_LATEST_UNPAID = _UNPAID_LOOKUP.format(plate='%(plate)s') + "\n    FOR UPDATE SKIP LOCKED"
+_LATEST_PAID_OPEN = _PAID_OPEN_LOOKUP.format(plate='%(plate)s') + "\n    FOR UPDATE SKIP LOCKED"
+_LATEST_OPEN_UNFLAGGED = _OPEN_UNFLAGGED_LOOKUP.format(plate='%(plate)s') + "\n    FOR UPDATE SKIP LOCKED"
+# Plain reads: is_payment_complete, and the kiosk's price lookup in fetch_unpaid_session
+_LATEST_SESSION = f"""
+    SELECT payment_status FROM plates_log
+    WHERE plate_number = %(plate)s AND {GATE_WINDOW}
+    ORDER BY entry_timestamp DESC
+    LIMIT 1
+"""
+_UNPAID_SESSION = f"""
+    SELECT id, entry_timestamp FROM plates_log
+    WHERE plate_number = %(plate)s AND payment_status = 0 AND {GATE_WINDOW}
+    ORDER BY entry_timestamp DESC
+    LIMIT 1
+"""
+# Every statement the gates and kiosks run per event, as check_gate_indexes.py EXPLAINs them
+GATE_QUERIES = {
+    'latest session': _LATEST_SESSION,
+    'unpaid session': _UNPAID_SESSION,
+    'latest unpaid (lock)': _LATEST_UNPAID,
+    'paid, open (lock)': _LATEST_PAID_OPEN,
+    'open, unflagged (lock)': _LATEST_OPEN_UNFLAGGED,
+    'gate_log_entry check': _OPEN_LOOKUP.format(plate='%(plate)s'),
+    'apply exit': _PAID_OPEN_LOOKUP.format(plate='%(plate)s') + "\n    FOR UPDATE",
+    'apply DENIED exit': _OPEN_UNFLAGGED_LOOKUP.format(plate='%(plate)s') + "\n    FOR UPDATE",
+    'apply payment': _UNPAID_LOOKUP.format(plate='%(plate)s') + "\n    FOR UPDATE",
+}
+
+
+def _mark_paid(cursor, row_filter, params, amount_charged=None):
+    """Mark the unpaid row picked by row_filter (an id subquery, or "%(id)s") as paid; the caller commits."""
+    cursor.execute(f"""
+        UPDATE plates_log
+        SET payment_status = 1, payment_timestamp = %(paid_at)s,
+            amount_charged = COALESCE(%(amount)s, amount_charged)
+        WHERE id = ({row_filter}) AND payment_status = 0 AND {GATE_WINDOW}
+        RETURNING payment_timestamp
+    """, dict(params, paid_at=get_timestamp(), amount=amount_charged))
+    result = cursor.fetchone()
+    if result is None:
+        print(f"[{get_timestamp()}] No matching unpaid entry found for plate {params['plate']}.")
+        return None
+    return result[0].strftime('%Y-%m-%d %H:%M:%S')
+
+# Why update_payment_status did not mark a row paid
+PAYMENT_DB_DOWN = 'db_down'             # Postgres unreachable or the write failed; safe to journal and replay
+PAYMENT_ALREADY_PAID = 'already_paid'   # the session was paid meanwhile (double tap, two kiosks, one card)
+PAYMENT_NOT_FOUND = 'not_found'         # no such unpaid session
+
+
+def update_payment_status(plate, entry_timestamp, amount_charged=None, entry_id=None):
+    """Update the Payment Status to 1, log the payment timestamp, and store the amount charged.
 
-def update_payment_status(plate, entry_timestamp, amount_charged=None):
-    """Update the Payment Status to 1, log the payment timestamp, and store the amount charged."""
+    The row is addressed by entry_id when given (see read_last_unpaid_entry),
+    otherwise by plate and entry time compared as a timestamp. Returns
+    (payment time, None), or (None, reason) with one of the PAYMENT_* reasons.
+    """
     conn = connect_to_db()
     if conn is None:
-        return None
+        return None, PAYMENT_DB_DOWN
 
     try:
         with conn.cursor() as cursor:
-            payment_time = get_timestamp()
-            if amount_charged is not None:
-                cursor.execute("""
-                    UPDATE plates_log
-                    SET payment_status = 1, payment_timestamp = %s, amount_charged = %s
-                    WHERE plate_number = %s AND entry_timestamp::text = %s AND payment_status = 0
-                """, (payment_time, amount_charged, plate, entry_timestamp))
+            if entry_id is not None:
+                payment_time = _mark_paid(cursor, "%(id)s", {'id': entry_id, 'plate': plate}, amount_charged)
             else:
-                cursor.execute("""
-                    UPDATE plates_log
-                    SET payment_status = 1, payment_timestamp = %s
-                    WHERE plate_number = %s AND entry_timestamp::text = %s AND payment_status = 0
-                """, (payment_time, plate, entry_timestamp))
-
-            if cursor.rowcount == 0:
-                print(f"[{get_timestamp()}] No matching unpaid entry found for plate {plate}.")
-                return None
+                payment_time = _mark_paid(cursor, """
+                    SELECT id FROM plates_log
+                    WHERE plate_number = %(plate)s AND entry_timestamp = %(entry)s::timestamp
+                          AND payment_status = 0
+                    LIMIT 1
+                    FOR UPDATE SKIP LOCKED
+                """, {'plate': plate, 'entry': entry_timestamp}, amount_charged)
+            if payment_time is None:
+                if entry_id is not None:
+                    cursor.execute(f"SELECT payment_status FROM plates_log WHERE id = %s AND {GATE_WINDOW}",
+                                   (entry_id,))
+                else:
+                    cursor.execute("""
+                        SELECT max(payment_status) FROM plates_log
+                        WHERE plate_number = %s AND entry_timestamp = %s::timestamp
+                        HAVING count(*) > 0
+                    """, (plate, entry_timestamp))
+                row = cursor.fetchone()
+                return None, PAYMENT_ALREADY_PAID if row is not None and row[0] == 1 else PAYMENT_NOT_FOUND
 
             conn.commit()
-            return payment_time
+            return payment_time, None
     except Exception as e:
         print_boxed_message("Database Update Error", "!")
         print(f"[{get_timestamp()}] Error updating payment status: {e}")
-        return None
+        return None, PAYMENT_DB_DOWN
     finally:
-        conn.close()
+        release_connection(conn)
 
 def is_payment_complete(plate):
     """Check if the latest entry for a plate is paid (payment_status = 1)."""
@@ -180,13 +918,7 @@ def is_payment_complete(plate):
 
     try:
         with conn.cursor() as cursor:
-            cursor.execute("""
-                SELECT payment_status
-                FROM plates_log
-                WHERE plate_number = %s
-                ORDER BY entry_timestamp DESC
-                LIMIT 1
-            """, (plate,))
+            cursor.execute(_LATEST_SESSION, {'plate': plate})
             result = cursor.fetchone()
             if result is None:
                 return False
@@ -196,89 +928,33 @@ def is_payment_complete(plate):
         print(f"[{get_timestamp()}] Error checking payment status: {e}")
         return False
     finally:
-        conn.close()
+        release_connection(conn)
+
 
+def fetch_unpaid_session(plate):
+    """Return {'id', 'entry_timestamp'} of the plate's latest unpaid session, or None.
 
-def process_payment(plate, balance, ser):
-    """Process payment for a plate."""
+    The payment kiosk prices the stay from this and marks the row paid with
+    update_payment_status(entry_id=...) once the card has been written, so
+    no connection is held while it waits on the reader.
+    """
     conn = connect_to_db()
     if conn is None:
-        return False
+        return None
 
     try:
         with conn.cursor() as cursor:
-            # Get the last unpaid entry
-            cursor.execute("""
-                SELECT entry_timestamp
-                FROM plates_log
-                WHERE plate_number = %s AND payment_status = 0
-                ORDER BY entry_timestamp DESC
-                LIMIT 1
-            """, (plate,))
-
+            cursor.execute(_UNPAID_SESSION, {'plate': plate})
             result = cursor.fetchone()
             if result is None:
-                print(f"[{get_timestamp()}] No unpaid entry found for plate {plate}.")
-                return False
-
-            entry_time_str = result[0].strftime('%Y-%m-%d %H:%M:%S')
-            entry_time = result[0]
-            exit_time = datetime.now()
-            # Calculate minutes spent, with a minimum of 1 minute
-            minutes_spent = max(1, int((exit_time - entry_time).total_seconds() / 60))
-            # Use a rate of 8 units per minute (500 RWF per hour / 60 minutes)
-            amount_due = minutes_spent * 8  # RATE_PER_MINUTE = 8
-
-            if balance < amount_due:
-                print("[PAYMENT] Insufficient balance")
-                ser.write(b'I\n')
-                return False
-            else:
-                new_balance = balance - amount_due
-
-                # Wait for Arduino to send "READY"
-                print("[WAIT] Waiting for Arduino to be READY...")
-                start_time = time.time()
-                while True:
-                    if ser.in_waiting:
-                        arduino_response = ser.readline().decode().strip()
-                        print(f"[ARDUINO] {arduino_response}")
-                        if arduino_response == "READY":
-                            break
-                    if time.time() - start_time > 5:
-                        print("[ERROR] Timeout waiting for Arduino READY")
-                        return False
-
-                # Send new balance
-                ser.write(f"{new_balance}\r\n".encode())
-                print(f"[PAYMENT] Sent new balance {new_balance}")
-
-                # Wait for confirmation with timeout
-                start_time = time.time()
-                print("[WAIT] Waiting for Arduino confirmation...")
-                while True:
-                    if ser.in_waiting:
-                        confirm = ser.readline().decode().strip()
-                        print(f"[ARDUINO] {confirm}")
-                        if "DONE" in confirm:
-                            print("[ARDUINO] Write confirmed")
-                            # Update payment status and store amount charged
-                            update_payment_status(plate, entry_time_str, amount_due)
-                            return True
-
-                    # Add timeout condition
-                    if time.time() - start_time > 10:
-                        print("[ERROR] Timeout waiting for confirmation")
-                        return False
-
-                    # Small delay to avoid CPU spinning
-                    time.sleep(0.1)
+                return None
+            return {'id': str(result[0]), 'entry_timestamp': result[1]}
     except Exception as e:
-        print_boxed_message("Database Payment Error", "!")
-        print(f"[{get_timestamp()}] Error processing payment: {e}")
-        return False
+        print_boxed_message("Database Query Error", "!")
+        print(f"[{get_timestamp()}] Error reading unpaid session: {e}")
+        return None
     finally:
-        conn.close()
+        release_connection(conn)
 
 def mark_payment_success(plate_number):
     """Mark payment as successful for a plate."""
@@ -288,35 +964,22 @@ def mark_payment_success(plate_number):
 
     try:
         with conn.cursor() as cursor:
-            # Get the last unpaid entry
-            cursor.execute("""
-                SELECT entry_timestamp::text
-                FROM plates_log
-                WHERE plate_number = %s AND payment_status = 0
-                ORDER BY entry_timestamp DESC
-                LIMIT 1
-            """, (plate_number,))
-
-            result = cursor.fetchone()
-            if result is None:
-                print(f"[INFO] No unpaid record found for {plate_number}")
-                return False
-
-            entry_timestamp = result[0]
             # Since this is a manual payment success marking, we don't have amount information
-            payment_time = update_payment_status(plate_number, entry_timestamp)
+            payment_time = _mark_paid(cursor, _LATEST_UNPAID, {'plate': plate_number})
 
             if payment_time:
+                conn.commit()
                 print(f"[UPDATED] Payment status set to 1 for {plate_number}")
                 return True
             else:
+                print(f"[INFO] No unpaid record found for {plate_number}")
                 return False
     except Exception as e:
         print_boxed_message("Database Update Error", "!")
         print(f"[{get_timestamp()}] Error marking payment as successful: {e}")
         return False
     finally:
-        conn.close()
+        release_connection(conn)
 
 def update_exit_status(plate_number, status):
     """Update the exit status for a plate."""
@@ -326,30 +989,19 @@ def update_exit_status(plate_number, status):
 
     try:
         with conn.cursor() as cursor:
-            # Get the most recent paid entry without an exit timestamp
-            cursor.execute("""
-                SELECT id
-                FROM plates_log
-                WHERE plate_number = %s AND payment_status = 1 AND exit_timestamp IS NULL
-                ORDER BY payment_timestamp DESC
-                LIMIT 1
-            """, (plate_number,))
+            # Close the most recent paid entry without an exit timestamp
+            exit_time = get_timestamp()
+            cursor.execute(f"""
+                UPDATE plates_log
+                SET exit_timestamp = %(exit)s, exit_status = %(status)s
+                WHERE id = ({_LATEST_PAID_OPEN}) AND {GATE_WINDOW}
+                RETURNING id
+            """, {'plate': plate_number, 'exit': exit_time, 'status': status})
 
-            result = cursor.fetchone()
-            if result is None:
+            if cursor.fetchone() is None:
                 print(f"[INFO] No paid entry without exit time found for {plate_number}")
                 return False
 
-            entry_id = result[0]
-            exit_time = get_timestamp()
-
-            # Update the exit timestamp and status
-            cursor.execute("""
-                UPDATE plates_log
-                SET exit_timestamp = %s, exit_status = %s
-                WHERE id = %s
-            """, (exit_time, status, entry_id))
-
             conn.commit()
             print(f"[EXIT] Recorded exit time {exit_time} for plate {plate_number} with status: {status}")
             return True
@@ -358,7 +1010,7 @@ def update_exit_status(plate_number, status):
         print(f"[{get_timestamp()}] Error recording exit status: {e}")
         return False
     finally:
-        conn.close()
+        release_connection(conn)
 
 def log_plate_exit(plate_number, exit_status=None):
     """Record the exit time for a plate.
@@ -373,113 +1025,295 @@ def log_plate_exit(plate_number, exit_status=None):
 
     try:
         with conn.cursor() as cursor:
-            # For access denied (unpaid), we need to record the incident
+            exit_time = get_timestamp()
+            params = {'plate': plate_number, 'exit': exit_time, 'status': exit_status}
             if exit_status == "DENIED":
-                # Check if there's already a DENIED record for this plate
-                cursor.execute("""
-                    SELECT id
-                    FROM plates_log
-                    WHERE plate_number = %s AND exit_timestamp IS NULL AND exit_status = 'DENIED'
-                    ORDER BY entry_timestamp DESC
-                    LIMIT 1
-                """, (plate_number,))
-
-                if cursor.fetchone() is not None:
-                    print(f"[SKIP] Plate {plate_number} already has a DENIED exit status. Skipping update.")
-                    return True
-
-                # Get the most recent entry without an exit timestamp, regardless of payment status
-                cursor.execute("""
-                    SELECT id
-                    FROM plates_log
-                    WHERE plate_number = %s AND exit_timestamp IS NULL AND exit_status IS NULL
-                    ORDER BY entry_timestamp DESC
-                    LIMIT 1
-                """, (plate_number,))
+                # Record the incident on the most recent open entry, regardless of payment status
+                cursor.execute(f"""
+                    UPDATE plates_log
+                    SET exit_status = %(status)s, exit_timestamp = %(exit)s
+                    WHERE id = ({_LATEST_OPEN_UNFLAGGED}) AND {GATE_WINDOW}
+                    RETURNING amount_charged
+                """, params)
             else:
-                # We'll no longer skip if there's already an exit record with the specified status
-                # This ensures that each entry gets its own exit record
-
-                # For normal exits, get the most recent paid entry without an exit timestamp
-                cursor.execute("""
-                    SELECT id, amount_charged
-                    FROM plates_log
-                    WHERE plate_number = %s AND payment_status = 1 AND exit_timestamp IS NULL
-                    ORDER BY payment_timestamp DESC
-                    LIMIT 1
-                """, (plate_number,))
+                # Normal exits close the most recent paid entry; without a status only the time is set
+                cursor.execute(f"""
+                    UPDATE plates_log
+                    SET exit_timestamp = %(exit)s, exit_status = COALESCE(%(status)s, exit_status)
+                    WHERE id = ({_LATEST_PAID_OPEN}) AND {GATE_WINDOW}
+                    RETURNING amount_charged
+                """, params)
 
             result = cursor.fetchone()
             if result is None:
                 print(f"[INFO] No suitable entry without exit time found for {plate_number}")
                 return False
+            conn.commit()
 
-            entry_id = result[0]
-            exit_time = get_timestamp()
-
-            # Get amount charged if available (for normal exits)
-            amount_charged = result[1] if exit_status != "DENIED" and len(result) > 1 else None
-
-            # Update the exit timestamp and status
+            amount_charged = result[0]
             if exit_status == "DENIED":
-                # For denied exits, update both exit_status and exit_timestamp
-                cursor.execute("""
-                    UPDATE plates_log
-                    SET exit_status = %s, exit_timestamp = %s
-                    WHERE id = %s
-                """, (exit_status, exit_time, entry_id))
-
-                # Check if the update was successful
-                if cursor.rowcount > 0:
-                    print(f"[EXIT] Recorded incident for plate {plate_number} with status: {exit_status} and exit time: {exit_time}")
-                    conn.commit()  # Commit changes immediately after successful update
-                else:
-                    print(f"[ERROR] Failed to update exit status and time for plate {plate_number}")
-                    return False
-            elif exit_status:
-                # For normal exits with status, update both exit_timestamp and exit_status
-                cursor.execute("""
-                    UPDATE plates_log
-                    SET exit_timestamp = %s, exit_status = %s
-                    WHERE id = %s
-                """, (exit_time, exit_status, entry_id))
-
-                # Check if the update was successful
-                if cursor.rowcount > 0:
-                    if amount_charged is not None:
-                        print(f"[EXIT] Recorded exit time {exit_time} for plate {plate_number} with status: {exit_status}, amount charged: {amount_charged}")
-                    else:
-                        print(f"[EXIT] Recorded exit time {exit_time} for plate {plate_number} with status: {exit_status}")
-                    conn.commit()  # Commit changes immediately after successful update
-                else:
-                    print(f"[ERROR] Failed to update exit time and status for plate {plate_number}")
-                    return False
+                print(f"[EXIT] Recorded incident for plate {plate_number} with status: {exit_status} and exit time: {exit_time}")
             else:
-                # For exits without status, just update exit_timestamp
-                cursor.execute("""
-                    UPDATE plates_log
-                    SET exit_timestamp = %s
-                    WHERE id = %s
-                """, (exit_time, entry_id))
-
-                # Check if the update was successful
-                if cursor.rowcount > 0:
-                    if amount_charged is not None:
-                        print(f"[EXIT] Recorded exit time {exit_time} for plate {plate_number}, amount charged: {amount_charged}")
-                    else:
-                        print(f"[EXIT] Recorded exit time {exit_time} for plate {plate_number}")
-                    conn.commit()  # Commit changes immediately after successful update
-                else:
-                    print(f"[ERROR] Failed to update exit time for plate {plate_number}")
-                    return False
-
+                details = f" with status: {exit_status}" if exit_status else ""
+                if amount_charged is not None:
+                    details += f", amount charged: {amount_charged}"
+                print(f"[EXIT] Recorded exit time {exit_time} for plate {plate_number}{details}")
             return True
     except Exception as e:
         print_boxed_message("Database Exit Record Error", "!")
         print(f"[{get_timestamp()}] Error recording exit time: {e}")
         return False
     finally:
-        conn.close()
+        release_connection(conn)
+
+def apply_events(events, page_size=100):
+    """Apply journaled gate events in one transaction; returns how many were new, or None on failure.
+
+    events are (event_id, kind, plate, occurred_at, exit_status, amount,
+    entry_id) tuples in the order they happened. Events already applied are skipped,
+    so a batch can safely be sent again after a failed commit.
+    """
+    conn = connect_to_db()
+    if conn is None:
+        return None
+
+    try:
+        with conn.cursor() as cursor:
+            # execute_batch sends page_size calls per round trip
+            extras.execute_batch(cursor, "SELECT gate_apply_event(%s, %s, %s, %s, %s, %s, %s)",
+                                 events, page_size=page_size)
+            cursor.execute("SELECT count(*) FROM gate_events WHERE event_id = ANY(%s::uuid[]) "
+                           "AND applied_at = now()", ([event[0] for event in events],))
+            applied = cursor.fetchone()[0]
+            conn.commit()
+            return applied
+    except Exception as e:
+        print_boxed_message("Database Event Flush Error", "!")
+        print(f"[{get_timestamp()}] Error applying {len(events)} journaled event(s): {e}")
+        return None
+    finally:
+        release_connection(conn)
+
+
+# Server errors that say nothing about the event itself: serialization failure, deadlock,
+# lock not available and statement timeout. A row with no partition (23514) is retried too.
+RETRYABLE_SQLSTATES = {'40001', '40P01', '55P03', '57014'}
+
+
+def _is_retryable(error):
+    if error.pgcode in RETRYABLE_SQLSTATES:
+        return True
+    return error.pgcode == '23514' and 'no partition' in (error.pgerror or '')
+
+
+def apply_event(event):
+    """Apply one journaled event on its own, telling a bad event from a database that is down or busy.
+
+    Returns (1 or 0 new, None) on success, (None, None) if Postgres could not
+    be reached or failed for a reason worth retrying (RETRYABLE_SQLSTATES, a
+    missing partition), and (None, error text) if it rejected the event's
+    data itself.
+    """
+    conn = connect_to_db()
+    if conn is None:
+        return None, None
+
+    try:
+        with conn.cursor() as cursor:
+            cursor.execute("SELECT gate_apply_event(%s, %s, %s, %s, %s, %s, %s)", event)
+            cursor.execute("SELECT count(*) FROM gate_events WHERE event_id = %s::uuid AND applied_at = now()",
+                           (event[0],))
+            applied = cursor.fetchone()[0]
+            conn.commit()
+            return applied, None
+    except (psycopg2.OperationalError, psycopg2.InterfaceError) as e:
+        print(f"[{get_timestamp()}] Postgres unavailable applying event {event[0]}: {e}")
+        return None, None
+    except psycopg2.Error as e:
+        if _is_retryable(e):
+            print(f"[{get_timestamp()}] Transient error applying event {event[0]} ({e.pgcode}): {str(e).strip()}")
+            return None, None
+        error = f"{type(e).__name__}: {str(e).strip()}"
+        print(f"[{get_timestamp()}] Event {event[0]} ({event[1]} {event[2]}) rejected: {error}")
+        return None, error
+    finally:
+        release_connection(conn)
+
+# ===== Bulk COPY =====
+PLATES_LOG_COLUMNS = ('id', 'plate_number', 'payment_status', 'entry_timestamp', 'payment_timestamp',
+                      'exit_timestamp', 'exit_status', 'amount_charged')
+
+
+def copy_plates_in(stream):
+    """Bulk-load plates_log from a file-like object of CSV rows in PLATES_LOG_COLUMNS order.
+
+    Rows go through COPY into a temporary staging table and are then
+    inserted in one statement, skipping ids that already exist, so the same
+    file can be imported twice. Rows of months already archived go straight
+    into their table in ARCHIVE_SCHEMA. Returns the number of new rows, or None.
+    """
+    conn = connect_to_db()
+    if conn is None:
+        return None
+
+    try:
+        with conn.cursor() as cursor:
+            cursor.execute("SET LOCAL plates_log.bulk_load = 'on'")
+            cursor.execute("CREATE TEMP TABLE plates_log_import (LIKE plates_log INCLUDING DEFAULTS) ON COMMIT DROP")
+            cursor.copy_expert(f"COPY plates_log_import ({', '.join(PLATES_LOG_COLUMNS)}) "
+                               f"FROM STDIN WITH (FORMAT csv)", stream)
+            # History may reach back before the oldest partition (archived months are skipped)
+            cursor.execute("SELECT plates_log_ensure_partitions(min(entry_timestamp)::date, 0) "
+                           "FROM plates_log_import HAVING count(*) > 0")
+            columns = sql.SQL(', ').join(map(sql.Identifier, PLATES_LOG_COLUMNS))
+            inserted = 0
+            cursor.execute("SELECT DISTINCT to_char(entry_timestamp, 'YYYY_MM') FROM plates_log_import")
+            for (month,) in cursor.fetchall():
+                name = f'plates_log_{month}'
+                cursor.execute("SELECT to_regclass(%s)", (f'{ARCHIVE_SCHEMA}.{name}',))
+                if cursor.fetchone()[0] is None:
+                    continue
+                cursor.execute(sql.SQL("""
+                    INSERT INTO {archived} ({columns})
+                    SELECT {columns} FROM plates_log_import WHERE to_char(entry_timestamp, 'YYYY_MM') = %s
+                    ON CONFLICT (id, entry_timestamp) DO NOTHING
+                """).format(archived=sql.Identifier(ARCHIVE_SCHEMA, name), columns=columns), (month,))
+                inserted += cursor.rowcount
+                cursor.execute("DELETE FROM plates_log_import WHERE to_char(entry_timestamp, 'YYYY_MM') = %s",
+                               (month,))
+            cursor.execute(sql.SQL("""
+                INSERT INTO plates_log ({columns})
+                SELECT {columns} FROM plates_log_import
+                ON CONFLICT (id, entry_timestamp) DO NOTHING
+            """).format(columns=columns))
+            inserted += cursor.rowcount
+            conn.commit()
+            return inserted
+    except Exception as e:
+        print_boxed_message("Database Import Error", "!")
+        print(f"[{get_timestamp()}] Error importing into plates_log: {e}")
+        return None
+    finally:
+        release_connection(conn)
+
+def copy_plates_out(out, query, params=None):
+    """Stream the rows of a SELECT to a file-like object as CSV with a header; returns the row count or None."""
+    conn = connect_to_db()
+    if conn is None:
+        return None
+
+    try:
+        with conn.cursor() as cursor:
+            copy = cursor.mogrify(f"COPY ({query}) TO STDOUT WITH (FORMAT csv, HEADER)", params)
+            cursor.copy_expert(copy.decode(), out)
+            return cursor.rowcount
+    except Exception as e:
+        print_boxed_message("Database Export Error", "!")
+        print(f"[{get_timestamp()}] Error exporting plates_log: {e}")
+        return None
+    finally:
+        release_connection(conn)
+
+def iter_paid_sessions(since=None, until=None, chunk_size=500_000):
+    """Yield (entry_timestamps, payment_timestamps, amounts_charged) lists, chunk_size paid sessions at a time.
+
+    Reads through a server-side cursor so pricing years of history (tariff.py)
+    never holds more than one chunk in memory. since/until bound entry_timestamp.
+    """
+    conn = connect_to_db()
+    if conn is None:
+        return
+
+    try:
+        with conn.cursor(name='paid_sessions') as cursor:
+            cursor.itersize = chunk_size
+            cursor.execute("""
+                SELECT entry_timestamp, payment_timestamp, amount_charged
+                FROM plates_log
+                WHERE payment_timestamp IS NOT NULL
+                  AND entry_timestamp >= COALESCE(%s::timestamp, '-infinity')
+                  AND entry_timestamp < COALESCE(%s::timestamp, 'infinity')
+            """, (since, until))
+            while True:
+                rows = cursor.fetchmany(chunk_size)
+                if not rows:
+                    break
+                entries, payments, amounts = zip(*rows)
+                yield entries, payments, amounts
+        conn.commit()
+    except Exception as e:
+        print_boxed_message("Database Query Error", "!")
+        print(f"[{get_timestamp()}] Error reading paid sessions: {e}")
+    finally:
+        release_connection(conn)
+
+def fetch_latest_sessions():
+    """Return the most recent session of every plate as dicts, or None if the query fails."""
+    conn = connect_to_db()
+    if conn is None:
+        return None
+
+    try:
+        with conn.cursor() as cursor:
+            cursor.execute(f"""
+                SELECT DISTINCT ON (plate_number) {', '.join(SESSION_COLUMNS)}
+                FROM plates_log
+                WHERE {GATE_WINDOW}
+                ORDER BY plate_number, entry_timestamp DESC
+            """)
+            return [dict(zip(SESSION_COLUMNS, row)) for row in cursor.fetchall()]
+    except Exception as e:
+        print_boxed_message("Database Query Error", "!")
+        print(f"[{get_timestamp()}] Error loading sessions: {e}")
+        return None
+    finally:
+        release_connection(conn)
+
+def fetch_open_sessions(plates=()):
+    """Return every open session, plus the latest session of each plate in `plates`, or None on failure.
+
+    The occupancy index's periodic catch-up: open sessions come off the
+    plates_log_open_sessions partial index, and passing the plates the index
+    believes parked picks up the ones that left since, without reading the
+    rest of the history.
+    """
+    conn = connect_to_db()
+    if conn is None:
+        return None
+
+    try:
+        with conn.cursor() as cursor:
+            cursor.execute(f"""
+                SELECT {', '.join(SESSION_COLUMNS)} FROM plates_log WHERE exit_timestamp IS NULL AND {GATE_WINDOW}
+            """)
+            rows = cursor.fetchall()
+            if plates:
+                cursor.execute(f"""
+                    SELECT DISTINCT ON (plate_number) {', '.join(SESSION_COLUMNS)}
+                    FROM plates_log
+                    WHERE plate_number = ANY(%s) AND {GATE_WINDOW}
+                    ORDER BY plate_number, entry_timestamp DESC
+                """, (list(plates),))
+                rows += cursor.fetchall()
+            return [dict(zip(SESSION_COLUMNS, row)) for row in rows]
+    except Exception as e:
+        print_boxed_message("Database Query Error", "!")
+        print(f"[{get_timestamp()}] Error loading open sessions: {e}")
+        return None
+    finally:
+        release_connection(conn)
+
+def open_listen_connection(channel=PLATES_LOG_CHANNEL):
+    """Open a dedicated autocommit connection LISTENing on a channel (kept out of the pool)."""
+    try:
+        conn = psycopg2.connect(**DB_PARAMS)
+        conn.set_session(autocommit=True)
+        with conn.cursor() as cursor:
+            cursor.execute(sql.SQL("LISTEN {}").format(sql.Identifier(channel)))
+        return conn
+    except Exception as e:
+        print(f"[{get_timestamp()}] Error listening on {channel}: {e}")
+        return None
 
 
 # Initialize the database when the module is imported
@@ -0,0 +1,228 @@
+import os
+import queue
+import shutil
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime, timedelta
+import cv2
+import numpy as np
+from pipeline import DropOldestQueue
+from metrics import EVENTS, GATE_STAGE_SECONDS
+
+EVIDENCE_DIR = 'evidence'
+JPEG_QUALITY = 90
+SESSION_IDLE = 10.0         # seconds without a read before an uncommitted session is written anyway
+RETENTION_DAYS = 30         # day directories older than this are deleted
+MAX_EVIDENCE_BYTES = 2 * 1024 ** 3   # oldest days are deleted beyond this total size
+PRUNE_INTERVAL = 3600       # seconds between retention passes
+WRITE_QUEUE_SIZE = 64       # crops waiting for the encoder; the oldest is dropped beyond this
+CLOSED_SESSIONS = 1024      # committed session keys remembered so late reads are ignored
+UNCONFIRMED = 'unconfirmed'
+
+
+def crop_score(reading, plate_img):
+    """How good a crop is as evidence: mean OCR confidence, ties broken by size."""
+    confidence = float(np.mean(reading.confidences)) if len(reading.confidences) else 0.0
+    return confidence, plate_img.shape[0] * plate_img.shape[1]
+
+
+class _Session:
+    __slots__ = ('score', 'image', 'text', 'seen_at', 'last_read')
+
+    def __init__(self):
+        self.score = None
+        self.image = None
+        self.text = None
+        self.seen_at = None
+        self.last_read = 0.0
+
+
+class EvidenceStore:
+    """Keeps the best crop of each vehicle session and writes it off the detection path.
+
+    offer() is called for every read of a session (e.g. a tracker id) and
+    only copies the crop when it beats the session's best so far. commit()
+    queues that best crop for the background writer and ignores later reads
+    of the session. The writer encodes it to JPEG under
+    root/YYYY-MM-DD/PLATE/PLATE_YYYYmmdd_HHMMSS_session.jpg, a name
+    char_recognizer.plate_label understands. Sessions that never commit are
+    written after SESSION_IDLE seconds under root/YYYY-MM-DD/unconfirmed/.
+    Day directories past retention_days, or beyond max_bytes oldest-first,
+    are deleted by the writer every PRUNE_INTERVAL seconds.
+    """
+
+    def __init__(self, root=EVIDENCE_DIR, retention_days=RETENTION_DAYS, max_bytes=MAX_EVIDENCE_BYTES,
+                 session_idle=SESSION_IDLE, keep_unconfirmed=True, quality=JPEG_QUALITY):
+        self.root = root
+        self.retention_days = retention_days
+        self.max_bytes = max_bytes
+        self.session_idle = session_idle
+        self.keep_unconfirmed = keep_unconfirmed
+        self.quality = quality
+        self.sessions = {}
+        self.closed = OrderedDict()
+        self.writes = DropOldestQueue(WRITE_QUEUE_SIZE)
+        self.written = 0
+        self.replaced = 0
+        self._lock = threading.Lock()
+        self.stop_event = threading.Event()
+        self.thread = threading.Thread(target=self._run, name="evidence-writer", daemon=True)
+        os.makedirs(root, exist_ok=True)
+
+    def start(self):
+        self.thread.start()
+        return self
+
+    def stop(self):
+        """Drain the write queue, stop the writer, then write every session still held."""
+        self.stop_event.set()
+        self.thread.join(timeout=10)
+        with self._lock:
+            pending = list(self.sessions.items())
+            self.sessions.clear()
+        for key, session in pending:
+            self._write_session(key, session, None)
+
+    def offer(self, key, reading, plate_img):
+        """Consider one read's crop for session `key`; cheap unless it is the best crop so far."""
+        score = crop_score(reading, plate_img)
+        now = time.time()
+        with self._lock:
+            if key in self.closed:
+                return False
+            session = self.sessions.get(key)
+            if session is None:
+                session = self.sessions[key] = _Session()
+                session.seen_at = datetime.now()
+            session.last_read = now
+            if session.score is not None and score <= session.score:
+                return False
+            if session.image is not None:
+                self.replaced += 1
+            session.score = score
+            session.text = reading.text
+            session.image = np.ascontiguousarray(plate_img).copy()
+            return True
+
+    def commit(self, key, plate):
+        """The session's plate is known: queue its best crop under that plate."""
+        with self._lock:
+            session = self.sessions.pop(key, None)
+            self.closed[key] = True
+            if len(self.closed) > CLOSED_SESSIONS:
+                self.closed.popitem(last=False)
+        if session is not None and session.image is not None:
+            item = self._item(key, session, plate)
+            if item is not None:
+                self.writes.put(item)
+
+    def _item(self, key, session, plate):
+        """(path, image) to write for a session, or None if it is not kept."""
+        if plate is None and not self.keep_unconfirmed:
+            return None
+        day = session.seen_at.strftime('%Y-%m-%d')
+        stamp = session.seen_at.strftime('%Y%m%d_%H%M%S')
+        tag = '_'.join(str(part) for part in (key if isinstance(key, tuple) else (key,)))
+        if plate is None:
+            path = os.path.join(self.root, day, UNCONFIRMED, f"{UNCONFIRMED}_{session.text}_{stamp}_{tag}.jpg")
+        else:
+            path = os.path.join(self.root, day, plate, f"{plate}_{stamp}_{tag}.jpg")
+        return path, session.image
+
+    def _write_session(self, key, session, plate):
+        item = self._item(key, session, plate)
+        if item is not None:
+            try:
+                self._write(item)
+            except OSError as e:
+                print(f"[EVIDENCE] Could not write {item[0]}: {e}")
+
+    def _expire(self):
+        """Write sessions that stopped getting reads without committing (runs on the writer thread)."""
+        cutoff = time.time() - self.session_idle
+        with self._lock:
+            idle = [(key, session) for key, session in self.sessions.items() if session.last_read < cutoff]
+            for key, _ in idle:
+                del self.sessions[key]
+        for key, session in idle:
+            self._write_session(key, session, None)
+
+    def _write(self, item):
+        path, image = item
+        began = time.perf_counter()
+        ok, encoded = cv2.imencode('.jpg', image, [cv2.IMWRITE_JPEG_QUALITY, self.quality])
+        if not ok:
+            print(f"[EVIDENCE] Could not encode {path}")
+            return
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, 'wb') as f:
+            f.write(encoded.tobytes())
+        self.written += 1
+        seconds = time.perf_counter() - began
+        GATE_STAGE_SECONDS.observe(seconds, 'evidence', 'encode')
+        EVENTS.event('evidence_saved', seconds, path=path)
+
+    def _run(self):
+        next_prune = 0.0
+        while True:
+            stopping = self.stop_event.is_set()
+            try:
+                item = self.writes.get(timeout=0.5)
+            except queue.Empty:
+                item = None
+            if item is not None:
+                try:
+                    self._write(item)
+                except OSError as e:
+                    print(f"[EVIDENCE] Could not write {item[0]}: {e}")
+                finally:
+                    self.writes.task_done()
+                continue
+            if stopping:
+                return
+            self._expire()
+            if time.time() >= next_prune:
+                self.prune()
+                next_prune = time.time() + PRUNE_INTERVAL
+
+    def _days(self):
+        """(date, path) of every day directory, oldest first."""
+        days = []
+        for name in os.listdir(self.root):
+            path = os.path.join(self.root, name)
+            try:
+                days.append((datetime.strptime(name, '%Y-%m-%d').date(), path))
+            except ValueError:
+                continue
+        return sorted(days)
+
+    def prune(self):
+        """Apply retention; returns the number of day directories deleted."""
+        today = datetime.now().date()
+        cutoff = today - timedelta(days=self.retention_days) if self.retention_days is not None else None
+        days = self._days()
+        removed = 0
+        sizes = {}
+        for day, path in days:
+            if cutoff is not None and day < cutoff:
+                shutil.rmtree(path, ignore_errors=True)
+                removed += 1
+            else:
+                sizes[path] = sum(os.path.getsize(os.path.join(folder, name))
+                                  for folder, _, names in os.walk(path) for name in names)
+        if self.max_bytes is not None:
+            total = sum(sizes.values())
+            for day, path in days:
+                if total <= self.max_bytes or day >= today or path not in sizes:
+                    continue
+                shutil.rmtree(path, ignore_errors=True)
+                total -= sizes[path]
+                removed += 1
+        if removed:
+            print(f"[EVIDENCE] Retention removed {removed} day(s) from {self.root}")
+        return removed
+
+    def stats(self):
+        return {'written': self.written, 'replaced': self.replaced, 'dropped': self.writes.dropped,
+                'open_sessions': len(self.sessions)}
@@ -0,0 +1,131 @@
+import argparse
+import os
+import pty
+import select
+import threading
+import time
+import tty
+
+RESPONSE_TIMEOUT = 10   # seconds, as in payment/payment.ino
+
+
+class FakePaymentArduino:
+    """Pseudo-terminal that speaks the payment/payment.ino protocol.
+
+    Open `port` with pyserial like a real reader. tap() queues a card: the
+    fake prints "PLATE,BALANCE" and READY, then waits for "I" or a new
+    balance and answers like the sketch (DONE after a successful write).
+    Balances written back are kept per plate in `balances`; tap(plate)
+    without a balance reuses the last one written.
+    """
+
+    def __init__(self, ready_delay=0.0, done_delay=0.05, silent=False):
+        self.master, slave = pty.openpty()
+        tty.setraw(slave)
+        self.port = os.ttyname(slave)
+        self._slave = slave
+        self.ready_delay = ready_delay
+        self.done_delay = done_delay
+        self.silent = silent
+        self.balances = {}
+        self.cards = []
+        self.completed = 0
+        self._cards_ready = threading.Condition()
+        self.stop_event = threading.Event()
+        self.thread = threading.Thread(target=self._run, name="fake-arduino", daemon=True)
+
+    def start(self):
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.stop_event.set()
+        with self._cards_ready:
+            self._cards_ready.notify_all()
+        self.thread.join(timeout=2)
+        os.close(self.master)
+        os.close(self._slave)
+
+    def tap(self, plate, balance=None):
+        with self._cards_ready:
+            self.cards.append((plate, balance))
+            self._cards_ready.notify()
+
+    def _println(self, text):
+        os.write(self.master, f"{text}\r\n".encode())
+
+    def _readline(self, timeout):
+        data = b''
+        deadline = time.monotonic() + timeout
+        while not data.endswith(b'\n'):
+            remaining = deadline - time.monotonic()
+            if remaining <= 0 or self.stop_event.is_set():
+                return None
+            if select.select([self.master], [], [], min(remaining, 0.1))[0]:
+                data += os.read(self.master, 256)
+        return data.decode(errors='ignore').strip()
+
+    def _run(self):
+        self._println("==== PAYMENT MODE RFID ====")
+        self._println("Place your card near the reader...")
+        while not self.stop_event.is_set():
+            with self._cards_ready:
+                while not self.cards and not self.stop_event.is_set():
+                    self._cards_ready.wait(0.1)
+                if self.stop_event.is_set():
+                    return
+                plate, balance = self.cards.pop(0)
+            if balance is None:
+                # Tapping the same card again: it carries whatever balance was last written
+                balance = self.balances.get(plate, 0)
+
+            self._println(f"{plate},{balance}")
+            time.sleep(self.ready_delay)
+            self._println("READY")
+            response = self._readline(RESPONSE_TIMEOUT)
+            if response is None:
+                self._println("[TIMEOUT] No response from PC. Resetting.")
+            else:
+                self._println(f"[RECEIVED FROM PC]: {response}")
+                if response == "I":
+                    self._println("[DENIED] Insufficient balance")
+                elif response.lstrip('-').isdigit() and int(response) >= 0:
+                    time.sleep(self.done_delay)
+                    self._println("[WRITING] New balance to card...")
+                    self.balances[plate] = int(response)
+                    self._println("DONE")
+                    self._println(f"[UPDATED] New Balance: {response}")
+                else:
+                    self._println("[ERROR] Invalid new balance received.")
+            self.completed += 1
+            if not self.silent:
+                print(f"[FAKE ARDUINO] {plate}: {response}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Serve a fake payment Arduino on a pseudo-terminal.")
+    parser.add_argument('cards', nargs='*', help="PLATE,BALANCE cards to tap, one after another")
+    parser.add_argument('--interval', type=float, default=3.0, help="seconds between taps")
+    args = parser.parse_args()
+
+    fake = FakePaymentArduino().start()
+    print(f"[FAKE ARDUINO] Listening on {fake.port}  (python process_payment.py --port {fake.port})")
+    try:
+        time.sleep(3)
+        for card in args.cards:
+            plate, balance = card.split(',')
+            fake.tap(plate.strip(), int(balance))
+            time.sleep(args.interval)
+        while True:
+            line = input("card PLATE,BALANCE> ").strip()
+            if line:
+                plate, balance = line.split(',')
+                fake.tap(plate.strip(), int(balance))
+    except (KeyboardInterrupt, EOFError):
+        pass
+    finally:
+        fake.stop()
+
+
+if __name__ == "__main__":
+    main()
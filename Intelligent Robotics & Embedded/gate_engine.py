@@ -0,0 +1,391 @@
+import argparse
+import cv2
+import time
+import threading
+import serial
+import serial.tools.list_ports
+import db_operations
+import startup
+from pipeline import GatePipeline, WorkerPool, StageTimes
+from inference_service import BatchInferenceService
+from presence import UltrasonicSensor, MotionDetector, PresenceTrigger
+from ocr_engine import get_backend
+from plate_grammar import decode
+from plate_tracker import PlateTracker
+from occupancy import OccupancyIndex
+from journal import EventJournal, journal_path
+from sources import open_source
+from preprocess import preprocess_plate
+from evidence_store import EvidenceStore, EVIDENCE_DIR
+from metrics import EVENTS, GATE_PLATES, METRICS_PORTS, start_http_server
+from model_manager import MODEL_PATH, RUNTIME, RUNTIMES, load_optimized
+from roi_detector import RoiDetector, parse_roi
+
+GATE_OPEN = 'open'
+GATE_DENY = 'deny'
+GATE_DWELL = 5          # seconds the barrier stays up
+ENTRY_COOLDOWN = 300    # seconds before the same plate may enter again
+
+_models = {}
+_ocr_pool = None
+_inference_service = None
+_occupancy = None
+_journals = {}
+_evidence_stores = {}
+_shared_lock = threading.Lock()
+
+
+# ===== Shared resources (one per process, whatever the number of lanes) =====
+def load_model(path=MODEL_PATH, runtime=RUNTIME, int8=False):
+    """Load a warmed-up YOLO model once per path and runtime and hand the same instance to every lane.
+
+    runtime='openvino'/'onnx' loads the export cached by model_manager
+    (exporting it on first use); 'torch' runs the .pt weights directly.
+    """
+    key = (path, runtime, int8)
+    with _shared_lock:
+        if key not in _models:
+            _models[key] = load_optimized(path, runtime, int8)
+        return _models[key]
+
+
+def shared_ocr_pool():
+    """Return the process-wide OCR worker pool."""
+    global _ocr_pool
+    with _shared_lock:
+        if _ocr_pool is None:
+            _ocr_pool = WorkerPool("ocr")
+        return _ocr_pool
+
+
+def shared_inference_service(path=MODEL_PATH, runtime=RUNTIME):
+    """Return the process-wide batched inference service for lanes created with batched=True."""
+    global _inference_service
+    model = load_model(path, runtime)
+    with _shared_lock:
+        if _inference_service is None:
+            _inference_service = BatchInferenceService(model).start()
+        return _inference_service
+
+
+def shared_occupancy(role):
+    """Return the process-wide occupancy index and the journal `role`'s gate decisions are written to."""
+    global _occupancy
+    with _shared_lock:
+        if _occupancy is None:
+            _occupancy = OccupancyIndex()
+            _occupancy.warm()
+            _occupancy.start()
+        if role not in _journals:
+            _journals[role] = EventJournal(journal_path(role)).start()
+        return _occupancy, _journals[role]
+
+
+def shared_evidence_store(root=EVIDENCE_DIR):
+    """Return the process-wide evidence store (and its writer thread) for a directory."""
+    with _shared_lock:
+        if root not in _evidence_stores:
+            _evidence_stores[root] = EvidenceStore(root).start()
+        return _evidence_stores[root]
+
+
+# ===== Arduino =====
+def detect_arduino_port(hints=("Arduino", "USB-SERIAL")):
+    ports = list(serial.tools.list_ports.comports())
+    for port in ports:
+        if any(hint in port.description for hint in hints):
+            return port.device
+    return None
+
+
+def open_arduino(port):
+    if port:
+        print(f"[CONNECTED] Arduino on {port}")
+        arduino = serial.Serial(port, 9600, timeout=1)
+        time.sleep(2)
+        return arduino
+    print("[ERROR] Arduino not detected.")
+    return None
+
+
+# ===== Plate reading =====
+def read_plate(plate_img, ocr=None, timings=None, copy=True):
+    """Preprocess and OCR one crop; return (OcrResult of a valid plate or None, thresholded image).
+
+    copy=False returns the thresholded image in this thread's reused buffer,
+    for callers that do not keep it (headless lanes).
+    """
+    began = time.perf_counter()
+    thresh = preprocess_plate(plate_img, copy)
+    preprocessed = time.perf_counter()
+    reading = decode((ocr or get_backend()).read(thresh))
+    ocr_seconds = time.perf_counter() - preprocessed
+    if timings is not None:
+        timings.record('preprocess', preprocessed - began)
+        timings.record('ocr', ocr_seconds)
+    if reading:
+        # Sampled: one line per read would cost the OCR workers more than the read
+        EVENTS.event('plate_read', ocr_seconds, plate=reading.text)
+    return reading, thresh
+
+
+# ===== Policy hooks: plate -> GATE_OPEN / GATE_DENY / None =====
+# With a journal, policies record the event locally and Postgres is updated by the
+# journal's flusher; decisions come from the OccupancyIndex once it has loaded.
+# Without one they query and write synchronously.
+class EntryPolicy:
+    """Log the entry and open, unless the car is already parked or was just let in.
+
+    While the occupancy index has not loaded (Postgres unreachable since
+    start-up) journaled entries are let in; the flush skips any that turn
+    out to be already parked.
+    """
+
+    def __init__(self, cooldown=ENTRY_COOLDOWN, index=None, journal=None):
+        self.cooldown = cooldown
+        self.index = index
+        self.journal = journal
+        self.last_saved_plate = None
+        self.last_entry_time = 0
+
+    def __call__(self, plate):
+        current_time = time.time()
+        if plate == self.last_saved_plate and (current_time - self.last_entry_time) <= self.cooldown:
+            print("[SKIPPED] Duplicate within 5 min window.")
+            return None
+        if self.journal is not None:
+            known = self.index is not None and self.index.ready.is_set()
+            if known and self.index.is_parked(plate):
+                print(f"[SKIPPED] {plate} already in parking lot. Gate not opened.")
+                return None
+            row_id = self.journal.entry(plate)
+            if known:
+                self.index.record_entry(plate, row_id)
+            print(f"[SAVED] {plate} journaled{'' if known else ' (occupancy unknown)'}.")
+        elif db_operations.log_plate_entry(plate) is None:
+            print(f"[SKIPPED] {plate} already in parking lot. Gate not opened.")
+            return None
+        else:
+            print(f"[SAVED] {plate} logged to database.")
+        self.last_saved_plate = plate
+        self.last_entry_time = current_time
+        return GATE_OPEN
+
+
+class ExitPolicy:
+    """Open for paid sessions, otherwise record the incident and sound the buzzer."""
+
+    def __init__(self, index=None, journal=None):
+        self.index = index
+        self.journal = journal
+
+    def __call__(self, plate):
+        known = self.index is not None and self.index.ready.is_set()
+        # Without the index an unreachable DB reads as unpaid: the exit fails closed
+        paid = self.index.is_paid(plate) if known else db_operations.is_payment_complete(plate)
+        status = "NORMAL" if paid else "DENIED"
+        if paid:
+            print(f"[ACCESS GRANTED] Payment complete for {plate}")
+        else:
+            print(f"[ACCESS DENIED] Payment NOT complete for {plate}")
+        if self.journal is not None:
+            event_id = self.journal.exit(plate, status)
+            if known:
+                self.index.record_exit(plate, status, self.journal, event_id)
+        else:
+            db_operations.log_plate_exit(plate, status)
+            if known:
+                self.index.record_exit(plate, status)
+        return GATE_OPEN if paid else GATE_DENY
+
+
+ROLES = {
+    'entry': {'policy': EntryPolicy, 'port_hints': ("Arduino", "COM8", "USB-SERIAL"),
+              'save_dir': EVIDENCE_DIR, 'title': 'Webcam Feed'},
+    'exit': {'policy': ExitPolicy, 'port_hints': ("Arduino", "COM9", "USB-SERIAL"),
+             'save_dir': None, 'title': 'Exit Webcam Feed'},
+}
+
+
+class GateEngine:
+    """One gate lane: camera, YOLO + OCR pipeline, plate tracker, policy and barrier.
+
+    role picks the default policy, Arduino port hints and evidence folder.
+    Lanes in one process share the model, OCR pool, occupancy index and
+    journal; pass model/ocr_pool/policy to override them, or batched=True to
+    batch frames with other lanes. source is anything open_source() takes.
+    serial_port=None auto-detects the Arduino and False runs without one.
+    Inference only runs while should_infer (by default the PresenceTrigger)
+    reports a vehicle. roi/adaptive narrow detection (RoiDetector).
+    ocr_backend and runtime pick the OCR backend and model runtime by name.
+    headless=True skips the preview images; stage latencies go to `timings`.
+    """
+
+    def __init__(self, role, source=0, serial_port=None, policy=None, model=None,
+                 ocr_pool=None, should_infer=None, name=None, save_dir='default', batched=False,
+                 ocr_backend=None, headless=False, runtime=RUNTIME, roi=None, adaptive=False):
+        if role not in ROLES:
+            raise ValueError(f"Unknown gate role: {role}")
+        defaults = ROLES[role]
+        self.role = role
+        self.name = name or role
+        self.title = defaults['title'] if name is None else f"{defaults['title']} ({name})"
+        self.source = source
+        self.headless = headless
+        if policy is None:
+            index, journal = shared_occupancy(role)
+            policy = defaults['policy'](index=index, journal=journal)
+        self.policy = policy
+        self.save_dir = defaults['save_dir'] if save_dir == 'default' else save_dir
+        self.evidence = shared_evidence_store(self.save_dir) if self.save_dir else None
+        self.tracker = PlateTracker()
+        self.ocr = get_backend(ocr_backend)
+
+        self.timings = StageTimes(self.name)
+
+        self.arduino = None if serial_port is False else \
+            open_arduino(serial_port or detect_arduino_port(defaults['port_hints']))
+        self.cap = open_source(source)
+        if model is None:
+            model = shared_inference_service(runtime=runtime).client(self.name) if batched \
+                else load_model(runtime=runtime)
+        self.detector = None
+        if roi is not None or adaptive:
+            model = self.detector = RoiDetector(model, roi, adaptive, timings=self.timings)
+        self.trigger = None
+        if should_infer is None:
+            sensor = UltrasonicSensor(self.arduino) if self.arduino else None
+            self.trigger = should_infer = PresenceTrigger(sensor, MotionDetector(), name=self.name)
+        self.pipeline = GatePipeline(self.cap, model, self.read_plate, self.handle_plate,
+                                     should_infer=should_infer,
+                                     ocr_pool=ocr_pool or shared_ocr_pool(), name=self.name,
+                                     select=self.tracker.assign, display=not headless,
+                                     timings=self.timings)
+
+    def read_plate(self, plate_img):
+        return read_plate(plate_img, self.ocr, self.timings, copy=not self.headless)
+
+    def handle_plate(self, track_id, reading, plate_img):
+        """Runs on the lane's actuator thread: keep evidence, fuse the read, apply policy, drive the gate."""
+        if self.evidence is not None:
+            began = time.perf_counter()
+            self.evidence.offer((self.name, track_id), reading, plate_img)
+            self.timings.record('save', time.perf_counter() - began)
+
+        began = time.perf_counter()
+        plate = self.tracker.add_read(track_id, reading)
+        self.timings.record('vote', time.perf_counter() - began)
+        if plate is None:
+            return
+        if self.evidence is not None:
+            self.evidence.commit((self.name, track_id), plate)
+        began = time.perf_counter()
+        action = self.policy(plate)
+        self.timings.record('db', time.perf_counter() - began)
+        GATE_PLATES.inc(self.name, action or 'none')
+        if action == GATE_OPEN:
+            self.open_gate()
+        elif action == GATE_DENY:
+            self.deny()
+
+    def _send(self, command):
+        began = time.perf_counter()
+        self.arduino.write(command)
+        self.timings.record('serial', time.perf_counter() - began)
+
+    def open_gate(self):
+        if self.arduino:
+            self._send(b'1')
+            print("[GATE] Opening gate (sent '1')")
+            time.sleep(GATE_DWELL)
+            self._send(b'0')
+            print("[GATE] Closing gate (sent '0')")
+
+    def deny(self):
+        if self.arduino:
+            self._send(b'2')
+            print("[ALERT] Buzzer triggered (sent '2')")
+
+    def start(self):
+        self.pipeline.start()
+        return self
+
+    def running(self):
+        return self.pipeline.running()
+
+    def views(self):
+        """Latest images keyed by window title."""
+        titles = {'frame': self.title, 'plate': f"Plate ({self.name})", 'processed': f"Processed ({self.name})"}
+        return {titles[key]: image for key, image in self.pipeline.views().items()}
+
+    def close(self):
+        self.pipeline.stop()
+        if self.trigger is not None:
+            self.trigger.close()
+        self.cap.release()
+        if self.arduino:
+            self.arduino.close()
+
+
+def lane_args(description, role):
+    """Parse the lane options shared by car_entry.py and car_exit.py."""
+    parser = argparse.ArgumentParser(description=description)
+    parser.add_argument('--source', default='0',
+                        help="camera index, video file, image directory or rtsp:// URL (default: camera 0)")
+    parser.add_argument('--headless', action='store_true', help="run without preview windows")
+    parser.add_argument('--metrics-port', type=int, default=METRICS_PORTS[role],
+                        help=f"local port for Prometheus /metrics, 0 to disable (default: {METRICS_PORTS[role]})")
+    parser.add_argument('--runtime', choices=RUNTIMES, default=RUNTIME,
+                        help=f"YOLO inference runtime; exports are cached under models/ (default: {RUNTIME})")
+    parser.add_argument('--roi', type=parse_roi, metavar='X1,Y1,X2,Y2',
+                        help="only detect plates in this part of the frame (fractions, e.g. 0.2,0.4,0.8,1, or pixels)")
+    parser.add_argument('--adaptive', action='store_true',
+                        help="search at low resolution and track found plates with full-resolution windows")
+    return parser.parse_args()
+
+
+def run_lanes(engines, headless=False, metrics_port=None):
+    """Start every lane and show their feeds until 'q' is pressed or all cameras end.
+
+    headless=True shows nothing and runs until the sources end or Ctrl+C.
+    With metrics_port, stage latency histograms are served at /metrics.
+    """
+    metrics_server = start_http_server(metrics_port)
+    for engine in engines:
+        engine.start()
+    startup.phase('start')
+    startup.report(f"{len(engines)} lane(s) ready")
+    print("[SYSTEM] Ready. Press Ctrl+C to exit." if headless else "[SYSTEM] Ready. Press 'q' to exit.")
+    try:
+        while any(engine.running() for engine in engines):
+            if headless:
+                time.sleep(0.1)
+                continue
+            for engine in engines:
+                for title, image in engine.views().items():
+                    cv2.imshow(title, image)
+            if cv2.waitKey(30) & 0xFF == ord('q'):
+                break
+    except KeyboardInterrupt:
+        print("[EXIT] Program terminated")
+    finally:
+        for engine in engines:
+            engine.close()
+            if engine.detector is not None:
+                engine.detector.print_stats(engine.name)
+        if _ocr_pool is not None:
+            _ocr_pool.stop()
+        if _inference_service is not None:
+            _inference_service.stop()
+            _inference_service.print_stats()
+        if _occupancy is not None:
+            _occupancy.stop()
+        for journal in _journals.values():
+            journal.stop()
+        for store in _evidence_stores.values():
+            store.stop()
+        db_operations.close_pool()
+        if metrics_server is not None:
+            metrics_server.shutdown()
+        if not headless:
+            cv2.destroyAllWindows()
@@ -0,0 +1,143 @@
+import queue
+import threading
+import time
+from concurrent.futures import Future
+
+MAX_BATCH = 8
+MAX_WAIT = 0.02     # seconds the first frame of a batch waits for company
+
+
+class _Request:
+    __slots__ = ('lane', 'frame', 'future', 'submitted')
+
+    def __init__(self, lane, frame):
+        self.lane = lane
+        self.frame = frame
+        self.future = Future()
+        self.submitted = time.perf_counter()
+
+
+class LaneClient:
+    """Callable stand-in for a YOLO model that routes frames through the shared batcher."""
+
+    def __init__(self, service, lane):
+        self.service = service
+        self.lane = lane
+
+    def __call__(self, frame, **kwargs):
+        return self.service.infer(self.lane, frame)
+
+
+class BatchInferenceService:
+    """Collects frames from many lanes and runs them through the model in one call.
+
+    A batch is flushed when it holds max_batch frames or when its oldest frame
+    has waited max_wait seconds. Each lane gets back the same list-of-results
+    shape as calling the model directly, so pipelines need no changes.
+    """
+
+    def __init__(self, model, max_batch=MAX_BATCH, max_wait=MAX_WAIT):
+        self.model = model
+        self.max_batch = max_batch
+        self.max_wait = max_wait
+        self.requests = queue.Queue()
+        self.stop_event = threading.Event()
+        self.thread = threading.Thread(target=self._run, name="batch-inference", daemon=True)
+
+        self._lock = threading.Lock()
+        self._lanes = {}
+        self._batches = 0
+        self._batched_frames = 0
+        self._infer_time = 0.0
+        self._started_at = None
+
+    def start(self):
+        if self._started_at is None:
+            self._started_at = time.perf_counter()
+            self.thread.start()
+        return self
+
+    def stop(self):
+        self.stop_event.set()
+        self.thread.join(timeout=2)
+
+    def client(self, lane):
+        return LaneClient(self, lane)
+
+    def infer(self, lane, frame, timeout=5):
+        """Queue one frame for the next batch and block until its results are back."""
+        request = _Request(lane, frame)
+        self.requests.put(request)
+        return request.future.result(timeout=timeout)
+
+    def _run(self):
+        while not self.stop_event.is_set():
+            try:
+                first = self.requests.get(timeout=0.1)
+            except queue.Empty:
+                continue
+            batch = [first]
+            deadline = first.submitted + self.max_wait
+            while len(batch) < self.max_batch:
+                remaining = deadline - time.perf_counter()
+                if remaining <= 0:
+                    break
+                try:
+                    batch.append(self.requests.get(timeout=remaining))
+                except queue.Empty:
+                    break
+            self._run_batch(batch)
+
+    def _run_batch(self, batch):
+        start = time.perf_counter()
+        try:
+            results = self.model([request.frame for request in batch], verbose=False)
+        except Exception as e:
+            print(f"[INFERENCE] Batch of {len(batch)} failed: {e}")
+            for request in batch:
+                request.future.set_exception(e)
+            return
+        done = time.perf_counter()
+
+        for request, result in zip(batch, results):
+            request.future.set_result([result])
+
+        with self._lock:
+            self._batches += 1
+            self._batched_frames += len(batch)
+            self._infer_time += done - start
+            for request in batch:
+                lane = self._lanes.setdefault(request.lane, {'frames': 0, 'latency_total': 0.0, 'latency_max': 0.0})
+                latency = done - request.submitted
+                lane['frames'] += 1
+                lane['latency_total'] += latency
+                lane['latency_max'] = max(lane['latency_max'], latency)
+
+    def stats(self):
+        """Per-lane frames/latency/throughput plus batch size and model capacity."""
+        with self._lock:
+            elapsed = time.perf_counter() - self._started_at if self._started_at else 0.0
+            lanes = {}
+            for name, lane in self._lanes.items():
+                lanes[name] = {
+                    'frames': lane['frames'],
+                    'latency_avg': lane['latency_total'] / lane['frames'],
+                    'latency_max': lane['latency_max'],
+                    'fps': lane['frames'] / elapsed if elapsed else 0.0,
+                }
+            return {
+                'lanes': lanes,
+                'batches': self._batches,
+                'avg_batch': self._batched_frames / self._batches if self._batches else 0.0,
+                'utilization': self._infer_time / elapsed if elapsed else 0.0,
+                # frames/sec the model could sustain if it never sat idle
+                'capacity_fps': self._batched_frames / self._infer_time if self._infer_time else 0.0,
+            }
+
+    def print_stats(self):
+        stats = self.stats()
+        print(f"[INFERENCE] {stats['batches']} batches, avg size {stats['avg_batch']:.2f}, "
+              f"utilization {stats['utilization'] * 100:.0f}%, capacity {stats['capacity_fps']:.1f} fps")
+        for name, lane in stats['lanes'].items():
+            print(f"  {name}: {lane['frames']} frames, {lane['fps']:.1f} fps, "
+                  f"latency avg {lane['latency_avg'] * 1000:.1f} ms / max {lane['latency_max'] * 1000:.1f} ms")
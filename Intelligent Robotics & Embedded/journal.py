@@ -0,0 +1,259 @@
+import argparse
+import sqlite3
+import threading
+import time
+import uuid
+import db_operations
+from metrics import JOURNAL_DEAD_EVENTS
+
+JOURNAL_PATH = '{role}_journal.db'     # one file per role, so processes never flush each other's events
+FLUSH_BATCH = 200           # events per Postgres transaction
+FLUSH_INTERVAL = 0.5        # seconds between flushes when nothing wakes the flusher
+MAX_BACKOFF = 30            # seconds between retries while Postgres is unreachable
+JOURNAL_RETENTION = 86400   # seconds flushed events stay in the journal for inspection
+DEAD_LETTER_ATTEMPTS = 5    # rejections before an event is moved to dead_events and skipped
+
+
+def journal_path(role):
+    """Journal file of the processes in `role` ('entry', 'exit', 'payment')."""
+    return JOURNAL_PATH.format(role=role)
+
+
+class EventJournal:
+    """Append-only SQLite (WAL) log of gate events, flushed to Postgres in the background.
+
+    entry()/exit()/payment() return as soon as the event is on local disk, so
+    gates keep working while Postgres is slow or down. The flusher sends
+    events in order, FLUSH_BATCH per transaction, through
+    db_operations.apply_events; each carries a uuid event id that Postgres
+    applies at most once, so a batch that fails half-way is simply resent.
+    When a batch fails, its events are retried one at a time. An event that
+    Postgres rejects DEAD_LETTER_ATTEMPTS times for its data (not for a
+    lock, serialization or partition error, which are retried as if the
+    database were down) is moved to the dead_events table with its error,
+    counted in journal_dead_events_total, and no longer holds back the
+    events behind it.
+    The flusher also creates upcoming plates_log partitions every
+    PARTITION_CHECK_INTERVAL, so a process that runs for months keeps
+    having somewhere to insert entries.
+
+    Each journal file must have a single writer and flusher: open it with
+    journal_path(role), one role per process.
+    """
+
+    def __init__(self, path, batch_size=FLUSH_BATCH, flush_interval=FLUSH_INTERVAL):
+        self.path = path
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.db = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self.db.execute("PRAGMA journal_mode=WAL")
+        self.db.execute("PRAGMA synchronous=NORMAL")
+        self.db.execute("""
+            CREATE TABLE IF NOT EXISTS events (
+                seq INTEGER PRIMARY KEY AUTOINCREMENT,
+                event_id TEXT NOT NULL UNIQUE,
+                kind TEXT NOT NULL,
+                plate TEXT NOT NULL,
+                occurred_at TEXT NOT NULL,
+                exit_status TEXT,
+                amount REAL,
+                flushed_at REAL
+            )
+        """)
+        # Journals written before dead-lettering and before payments named their session
+        self._add_missing_columns('events', (('attempts', 'INTEGER NOT NULL DEFAULT 0'), ('last_error', 'TEXT'),
+                                             ('entry_id', 'TEXT')))
+        self.db.execute("CREATE INDEX IF NOT EXISTS events_pending ON events (seq) WHERE flushed_at IS NULL")
+        self.db.execute("""
+            CREATE TABLE IF NOT EXISTS dead_events (
+                seq INTEGER PRIMARY KEY,
+                event_id TEXT NOT NULL UNIQUE,
+                kind TEXT NOT NULL,
+                plate TEXT NOT NULL,
+                occurred_at TEXT NOT NULL,
+                exit_status TEXT,
+                amount REAL,
+                attempts INTEGER NOT NULL,
+                error TEXT NOT NULL,
+                dead_at REAL NOT NULL
+            )
+        """)
+        self._add_missing_columns('dead_events', (('entry_id', 'TEXT'),))
+        self._lock = threading.Lock()
+        self.wake = threading.Event()
+        self.stop_event = threading.Event()
+        self.thread = None
+        self.flushed = 0
+        self.failures = 0
+        self.dead = 0
+
+    def _add_missing_columns(self, table, columns):
+        existing = {row[1] for row in self.db.execute(f"PRAGMA table_info({table})")}
+        for name, definition in columns:
+            if name not in existing:
+                self.db.execute(f"ALTER TABLE {table} ADD COLUMN {name} {definition}")
+
+    # ===== Recording =====
+    def record(self, kind, plate, exit_status=None, amount=None, entry_id=None):
+        """Append one event and return its id (also the plates_log row id of an entry)."""
+        event_id = str(uuid.uuid4())
+        with self._lock:
+            self.db.execute("""
+                INSERT INTO events (event_id, kind, plate, occurred_at, exit_status, amount, entry_id)
+                VALUES (?, ?, ?, ?, ?, ?, ?)
+            """, (event_id, kind, plate, db_operations.get_timestamp(), exit_status, amount, entry_id))
+        self.wake.set()
+        return event_id
+
+    def entry(self, plate):
+        return self.record('entry', plate)
+
+    def exit(self, plate, exit_status):
+        return self.record('exit', plate, exit_status=exit_status)
+
+    def payment(self, plate, amount=None, entry_id=None):
+        """A card payment; entry_id is the session charged, which the replay pays rather than the latest unpaid one."""
+        return self.record('payment', plate, amount=amount, entry_id=entry_id)
+
+    def pending(self):
+        with self._lock:
+            return self.db.execute("SELECT count(*) FROM events WHERE flushed_at IS NULL").fetchone()[0]
+
+    def is_pending(self, event_id):
+        """Is the event still waiting for Postgres? False once flushed or dead-lettered."""
+        with self._lock:
+            return self.db.execute("SELECT 1 FROM events WHERE event_id = ? AND flushed_at IS NULL",
+                                   (event_id,)).fetchone() is not None
+
+    # ===== Flushing =====
+    def flush(self):
+        """Send the next batch to Postgres; returns the number flushed, or None if nothing could be sent."""
+        with self._lock:
+            rows = self.db.execute("""
+                SELECT seq, event_id, kind, plate, occurred_at, exit_status, amount, entry_id
+                FROM events WHERE flushed_at IS NULL ORDER BY seq LIMIT ?
+            """, (self.batch_size,)).fetchall()
+        if not rows:
+            return 0
+
+        if db_operations.apply_events([row[1:] for row in rows]) is not None:
+            self._mark_flushed(rows[0][0], rows[-1][0])
+            self.flushed += len(rows)
+            return len(rows)
+
+        # Postgres is down or an event in the batch is bad: find out one event at a time
+        flushed = 0
+        for row in rows:
+            applied, error = db_operations.apply_event(row[1:])
+            if applied is not None:
+                self._mark_flushed(row[0], row[0])
+                flushed += 1
+            elif error is None or not self._reject(row, error):
+                # Unreachable, or rejected but not yet dead: later events wait to keep their order
+                break
+        self.flushed += flushed
+        return flushed or None
+
+    def _mark_flushed(self, first_seq, last_seq):
+        with self._lock:
+            self.db.execute("UPDATE events SET flushed_at = ? WHERE seq BETWEEN ? AND ? AND flushed_at IS NULL",
+                            (time.time(), first_seq, last_seq))
+
+    def _reject(self, row, error):
+        """Count a rejection of `row`; returns True if it was moved to dead_events."""
+        seq = row[0]
+        with self._lock:
+            self.db.execute("UPDATE events SET attempts = attempts + 1, last_error = ? WHERE seq = ?", (error, seq))
+            attempts = self.db.execute("SELECT attempts FROM events WHERE seq = ?", (seq,)).fetchone()[0]
+            if attempts < DEAD_LETTER_ATTEMPTS:
+                return False
+            self.db.execute("BEGIN")
+            self.db.execute("""
+                INSERT INTO dead_events (seq, event_id, kind, plate, occurred_at, exit_status, amount,
+                                         entry_id, attempts, error, dead_at)
+                SELECT seq, event_id, kind, plate, occurred_at, exit_status, amount, entry_id,
+                       attempts, last_error, ?
+                FROM events WHERE seq = ?
+            """, (time.time(), seq))
+            self.db.execute("DELETE FROM events WHERE seq = ?", (seq,))
+            self.db.execute("COMMIT")
+        self.dead += 1
+        JOURNAL_DEAD_EVENTS.inc(self.path, row[2])
+        db_operations.print_boxed_message("Journal Event Dropped", "!")
+        print(f"[JOURNAL] Event {row[1]} ({row[2]} {row[3]}) rejected {attempts} times; moved to dead_events "
+              f"in {self.path} and skipped: {error}")
+        return True
+
+    def dead_letters(self):
+        """Events Postgres kept rejecting, oldest first, with their last error."""
+        with self._lock:
+            return self.db.execute("""
+                SELECT event_id, kind, plate, occurred_at, exit_status, amount, entry_id, attempts, error
+                FROM dead_events ORDER BY seq
+            """).fetchall()
+
+    def prune(self, retention=JOURNAL_RETENTION):
+        with self._lock:
+            self.db.execute("DELETE FROM events WHERE flushed_at < ?", (time.time() - retention,))
+
+    def _run(self):
+        backoff = self.flush_interval
+        next_partition_check = 0.0
+        while not self.stop_event.is_set():
+            self.wake.wait(backoff)
+            self.wake.clear()
+            if time.time() >= next_partition_check:
+                ok = db_operations.maintain_partitions(archive_after_months=None) is not None
+                next_partition_check = time.time() + (db_operations.PARTITION_CHECK_INTERVAL if ok else MAX_BACKOFF)
+            # Drain everything pending before sleeping again
+            while True:
+                flushed = self.flush()
+                if flushed is None:
+                    self.failures += 1
+                    # A missing partition looks like a failed flush too: check again before the next retry
+                    next_partition_check = 0.0
+                    backoff = min(MAX_BACKOFF, backoff * 2)
+                    print(f"[JOURNAL] Flush failed, {self.pending()} event(s) pending; "
+                          f"retrying in {backoff:.0f}s")
+                    break
+                backoff = self.flush_interval
+                if flushed < self.batch_size:
+                    break
+        self.prune()
+
+    def start(self):
+        if self.thread is None:
+            self.thread = threading.Thread(target=self._run, name="journal-flusher", daemon=True)
+            self.thread.start()
+        return self
+
+    def stop(self):
+        """Stop the flusher after a last attempt to drain; unflushed events stay on disk for next start."""
+        self.stop_event.set()
+        self.wake.set()
+        if self.thread is not None:
+            self.thread.join(timeout=10)
+        while self.flush():
+            pass
+        pending = self.pending()
+        if pending:
+            print(f"[JOURNAL] {pending} event(s) left in {self.path}, will flush on next start")
+        self.db.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Flush a journal file's pending events and list its dead events, "
+                                                 "e.g. a gate_journal.db left from before journals were per role.")
+    parser.add_argument('path', help="journal file, e.g. entry_journal.db")
+    args = parser.parse_args()
+    journal = EventJournal(args.path)
+    while journal.flush():
+        pass
+    print(f"[JOURNAL] {args.path}: {journal.flushed} event(s) flushed, {journal.pending()} pending")
+    for event_id, kind, plate, occurred_at, _, _, _, attempts, error in journal.dead_letters():
+        print(f"[JOURNAL] Dead: {event_id} {kind} {plate} at {occurred_at}, {attempts} attempts: {error}")
+    journal.db.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,393 @@
+import asyncio
+import threading
+import time
+from collections import deque
+from datetime import datetime
+import numpy as np
+import serial
+import serial.tools.list_ports
+import db_operations
+from tariff import load_tariff
+from metrics import PAYMENT_STAGE_SECONDS, PAYMENTS
+
+try:
+    import serial_asyncio
+except ImportError:
+    serial_asyncio = None
+
+BAUD_RATE = 9600
+RESET_DELAY = 2         # seconds the Arduino needs after the port opens (it resets)
+READY_TIMEOUT = 5       # seconds to wait for READY after a card is read
+DONE_TIMEOUT = 10       # seconds to wait for DONE after the new balance is sent
+STATS_WINDOW = 200      # recent transactions kept per kiosk for latency figures
+RESCAN_INTERVAL = 2.0   # seconds between serial port scans for readers plugged in or out
+OPEN_RETRY = 30         # seconds before retrying a port that failed to open
+STATS_INTERVAL = 60     # seconds between per-kiosk stats lines
+# Substrings of a port's device name or description that mark a USB serial reader
+READER_PORT_HINTS = ("ttyUSB", "ttyACM", "usbmodem", "usbserial", "Arduino", "USB-SERIAL", "CH340")
+
+# Transaction states, in the order a successful payment goes through them
+CARD, QUOTED, READY, BALANCE_SENT, DONE, FAILED = 'CARD', 'QUOTED', 'READY', 'BALANCE_SENT', 'DONE', 'FAILED'
+TRANSITIONS = {
+    CARD: {QUOTED, FAILED},
+    QUOTED: {READY, FAILED},
+    READY: {BALANCE_SENT, FAILED},
+    BALANCE_SENT: {DONE, FAILED},
+    DONE: set(),
+    FAILED: set(),
+}
+
+
+# ===== Line protocol =====
+def parse_line(line):
+    """Classify one line from the payment sketch: ('card', (plate, balance)), ('ready'|'done'|'timeout', None) or ('info', line)."""
+    line = line.strip()
+    if line == "READY":
+        return 'ready', None
+    if line == "DONE":
+        return 'done', None
+    if line.startswith("[TIMEOUT]"):
+        return 'timeout', None
+    parts = line.split(',')
+    if len(parts) == 2 and parts[0].strip() and not line.startswith('['):
+        # The balance block is padded on the card; keep only its digits
+        balance = ''.join(c for c in parts[1] if c.isdigit())
+        if balance:
+            return 'card', (parts[0].strip(), int(balance))
+    return 'info', line
+
+
+class PaymentTransaction:
+    """One card tap, moved through CARD -> QUOTED -> READY -> BALANCE_SENT -> DONE (or FAILED)."""
+
+    def __init__(self, plate, balance):
+        self.plate = plate
+        self.balance = balance
+        self.state = CARD
+        self.entry_id = None
+        self.amount = None
+        self.reason = None
+        self.started = time.perf_counter()
+        self.finished = None
+
+    def advance(self, state):
+        if state not in TRANSITIONS[self.state]:
+            raise RuntimeError(f"{self.plate}: cannot go from {self.state} to {state}")
+        self.state = state
+        if state in (DONE, FAILED):
+            self.finished = time.perf_counter()
+
+    def fail(self, reason):
+        self.reason = reason
+        self.advance(FAILED)
+        print(f"[PAYMENT] {self.plate}: {reason}")
+        return False
+
+    @property
+    def new_balance(self):
+        return self.balance - self.amount
+
+    @property
+    def latency(self):
+        return (self.finished or time.perf_counter()) - self.started
+
+
+# ===== Serial transports =====
+class AsyncSerialLink:
+    """Line transport over pyserial-asyncio."""
+
+    def __init__(self, reader, writer):
+        self.reader = reader
+        self.writer = writer
+
+    async def readline(self):
+        """Next line without its line ending, or None once the port is closed."""
+        data = await self.reader.readline()
+        return data.decode(errors='ignore').strip() if data else None
+
+    def write(self, text):
+        self.writer.write(text.encode())
+
+    def close(self):
+        self.writer.close()
+
+
+class ThreadedSerialLink:
+    """Same interface on plain pyserial: a reader thread hands lines to the event loop.
+
+    The thread blocks in readline() (with a short timeout), so no core is
+    spent polling in_waiting.
+    """
+
+    def __init__(self, ser, loop):
+        self.ser = ser
+        self.loop = loop
+        self.lines = asyncio.Queue()
+        self.stop_event = threading.Event()
+        self.thread = threading.Thread(target=self._read, name=f"serial-{ser.port}", daemon=True)
+        self.thread.start()
+
+    def _read(self):
+        while not self.stop_event.is_set():
+            try:
+                data = self.ser.readline()
+            except Exception as e:
+                if not self.stop_event.is_set():
+                    print(f"[SERIAL] {self.ser.port}: read failed: {e}")
+                break
+            if data:
+                self._deliver(data.decode(errors='ignore').strip())
+        self._deliver(None)
+
+    def _deliver(self, line):
+        try:
+            self.loop.call_soon_threadsafe(self.lines.put_nowait, line)
+        except RuntimeError:
+            # The event loop has already shut down
+            self.stop_event.set()
+
+    async def readline(self):
+        return await self.lines.get()
+
+    def write(self, text):
+        self.ser.write(text.encode())
+
+    def close(self):
+        self.stop_event.set()
+        self.ser.close()
+
+
+async def open_link(port, baudrate=BAUD_RATE, reset_delay=RESET_DELAY):
+    """Open a serial port as a line transport, preferring pyserial-asyncio when it is installed."""
+    if serial_asyncio is not None:
+        reader, writer = await serial_asyncio.open_serial_connection(url=port, baudrate=baudrate)
+        link = AsyncSerialLink(reader, writer)
+    else:
+        ser = await asyncio.to_thread(serial.Serial, port, baudrate, timeout=0.2)
+        link = ThreadedSerialLink(ser, asyncio.get_running_loop())
+    await asyncio.sleep(reset_delay)
+    return link
+
+
+# ===== Kiosk =====
+class Kiosk:
+    """Serves one RFID payment reader.
+
+    Database calls run in worker threads and each checks a pooled connection
+    out only for its own query, so nothing is held while the kiosk waits for
+    READY or DONE. With a journal, a payment that was written to the card
+    but could not be stored because Postgres was down is journaled, with
+    the charged session's id, instead of lost.
+    Charges come from the tariff (tariff.json, or the default rate table).
+    Stage latencies (lookup, ready, serial, done, record, total) and final
+    states are exported through metrics.
+    """
+
+    def __init__(self, link, name="kiosk", journal=None, tariff=None):
+        self.link = link
+        self.name = name
+        self.journal = journal
+        self.tariff = tariff or load_tariff()
+        self.transactions = deque(maxlen=STATS_WINDOW)
+        self.counts = {DONE: 0, FAILED: 0}
+        self.started = time.monotonic()
+        self.connected = True
+
+    async def run(self):
+        """Handle card taps until the port closes."""
+        print(f"[KIOSK] {self.name} ready")
+        while True:
+            line = await self.link.readline()
+            if line is None:
+                print(f"[KIOSK] {self.name} disconnected")
+                self.connected = False
+                return
+            kind, data = parse_line(line)
+            if kind == 'card':
+                await self.pay(*data)
+            elif line:
+                print(f"[ARDUINO] {line}")
+
+    async def wait_for(self, kind, timeout):
+        """Read lines until one of `kind` arrives; False on timeout, reader timeout or disconnect."""
+        deadline = time.monotonic() + timeout
+        while True:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                return False
+            try:
+                line = await asyncio.wait_for(self.link.readline(), remaining)
+            except asyncio.TimeoutError:
+                return False
+            if line is None:
+                return False
+            found, _ = parse_line(line)
+            if found == kind:
+                return True
+            if found == 'timeout':
+                print(f"[ARDUINO] {line}")
+                return False
+            if line:
+                print(f"[ARDUINO] {line}")
+
+    async def pay(self, plate, balance):
+        tx = PaymentTransaction(plate, balance)
+        self.transactions.append(tx)
+        print(f"[PAYMENT] {self.name}: card {plate}, balance {balance}")
+        try:
+            return await self._transact(tx)
+        finally:
+            if tx.state not in (DONE, FAILED):
+                tx.fail("interrupted")
+            self.counts[tx.state] += 1
+            PAYMENTS.inc(self.name, tx.state)
+            PAYMENT_STAGE_SECONDS.observe(tx.latency, self.name, 'total')
+
+    async def _timed(self, stage, awaitable):
+        began = time.perf_counter()
+        try:
+            return await awaitable
+        finally:
+            PAYMENT_STAGE_SECONDS.observe(time.perf_counter() - began, self.name, stage)
+
+    def _write(self, text):
+        began = time.perf_counter()
+        self.link.write(text)
+        PAYMENT_STAGE_SECONDS.observe(time.perf_counter() - began, self.name, 'serial')
+
+    async def _transact(self, tx):
+        plate, balance = tx.plate, tx.balance
+
+        session = await self._timed('lookup', asyncio.to_thread(db_operations.fetch_unpaid_session, plate))
+        if session is None:
+            return tx.fail("no unpaid entry found")
+        tx.entry_id = session['id']
+        tx.amount = self.tariff.charge(session['entry_timestamp'], datetime.now())
+        tx.advance(QUOTED)
+
+        if balance < tx.amount or not self.tariff.accepts(balance):
+            self._write("I\n")
+            return tx.fail(f"insufficient balance ({balance} < {tx.amount})")
+
+        if not await self._timed('ready', self.wait_for('ready', READY_TIMEOUT)):
+            return tx.fail("timeout waiting for READY")
+        tx.advance(READY)
+
+        self._write(f"{tx.new_balance}\r\n")
+        tx.advance(BALANCE_SENT)
+        print(f"[PAYMENT] Sent new balance {tx.new_balance}")
+
+        if not await self._timed('done', self.wait_for('done', DONE_TIMEOUT)):
+            return tx.fail("timeout waiting for DONE")
+        tx.advance(DONE)
+
+        paid_at, reason = await self._timed('record', asyncio.to_thread(db_operations.update_payment_status,
+                                                                         plate, None, tx.amount, tx.entry_id))
+        if paid_at is not None:
+            print(f"[PAYMENT] {plate}: charged {tx.amount} in {tx.latency * 1000:.0f} ms")
+        elif reason != db_operations.PAYMENT_DB_DOWN:
+            # Replaying would pay some other session of the plate: leave it to a person
+            print(f"[ERROR] {plate}: card charged {tx.amount} but session {tx.entry_id} was {reason}; "
+                  f"not recorded")
+        elif self.journal is not None:
+            self.journal.payment(plate, tx.amount, tx.entry_id)
+            print(f"[PAYMENT] {plate}: card charged {tx.amount}, payment journaled")
+        else:
+            print(f"[ERROR] {plate}: card charged {tx.amount} but the payment could not be recorded")
+        return True
+
+    def stats(self):
+        """Taps, outcomes, paid/min since start and latency of recent successful payments."""
+        latencies = np.array([tx.latency for tx in self.transactions if tx.state == DONE]) * 1000
+        minutes = max((time.monotonic() - self.started) / 60, 1e-9)
+        return {
+            'taps': self.counts[DONE] + self.counts[FAILED],
+            'paid': self.counts[DONE],
+            'failed': self.counts[FAILED],
+            'paid_per_min': self.counts[DONE] / minutes,
+            'latency_avg_ms': float(latencies.mean()) if latencies.size else 0.0,
+            'latency_p95_ms': float(np.percentile(latencies, 95)) if latencies.size else 0.0,
+            'connected': self.connected,
+        }
+
+
+# ===== Payment server =====
+def reader_ports(hints=READER_PORT_HINTS, exclude=()):
+    """Serial devices that look like USB readers, minus any in exclude."""
+    return sorted(port.device for port in serial.tools.list_ports.comports()
+                  if port.device not in exclude
+                  and any(hint in port.device or hint in (port.description or '') for hint in hints))
+
+
+class PaymentServer:
+    """Serves every payment reader on the machine from one event loop.
+
+    Ports are rescanned every RESCAN_INTERVAL seconds: a reader that is
+    plugged in gets a Kiosk, one that is unplugged drops out and is picked up
+    again when it returns (its stats carry over). All kiosks share the
+    db_operations connection pool. ports pins an explicit list instead of
+    discovery; exclude keeps discovery off ports other programs own, such as
+    the gate Arduinos. Every kiosk charges from the same tariff.
+    """
+
+    def __init__(self, ports=None, exclude=(), journal=None, rescan_interval=RESCAN_INTERVAL,
+                 stats_interval=STATS_INTERVAL, tariff=None):
+        self.ports = ports
+        self.exclude = set(exclude)
+        self.journal = journal
+        self.tariff = tariff or load_tariff()
+        self.rescan_interval = rescan_interval
+        self.stats_interval = stats_interval
+        self.kiosks = {}
+        self.tasks = {}
+        self.retry_at = {}
+
+    async def run(self):
+        next_stats = time.monotonic() + self.stats_interval
+        try:
+            while True:
+                ports = self.ports or await asyncio.to_thread(reader_ports, exclude=self.exclude)
+                now = time.monotonic()
+                for port in ports:
+                    if port not in self.tasks and now >= self.retry_at.get(port, 0):
+                        self.tasks[port] = asyncio.create_task(self._serve(port))
+                if now >= next_stats:
+                    self.print_stats()
+                    next_stats = now + self.stats_interval
+                await asyncio.sleep(self.rescan_interval)
+        finally:
+            for task in self.tasks.values():
+                task.cancel()
+            await asyncio.gather(*self.tasks.values(), return_exceptions=True)
+            self.print_stats()
+
+    async def _serve(self, port):
+        try:
+            try:
+                link = await open_link(port)
+            except Exception as e:
+                print(f"[KIOSK] Could not open {port}: {e}")
+                self.retry_at[port] = time.monotonic() + OPEN_RETRY
+                return
+            print(f"[CONNECTED] Listening on {port}")
+            kiosk = self.kiosks.get(port)
+            if kiosk is None:
+                kiosk = self.kiosks[port] = Kiosk(link, name=port, journal=self.journal, tariff=self.tariff)
+            kiosk.link = link
+            kiosk.connected = True
+            try:
+                await kiosk.run()
+            finally:
+                kiosk.connected = False
+                link.close()
+        finally:
+            self.tasks.pop(port, None)
+
+    def stats(self):
+        return {port: kiosk.stats() for port, kiosk in self.kiosks.items()}
+
+    def print_stats(self):
+        for port, stats in self.stats().items():
+            print(f"[KIOSK STATS] {port}: {stats['taps']} taps, {stats['paid']} paid, {stats['failed']} failed, "
+                  f"{stats['paid_per_min']:.1f} paid/min, latency avg {stats['latency_avg_ms']:.0f} ms "
+                  f"p95 {stats['latency_p95_ms']:.0f} ms{'' if stats['connected'] else ' (disconnected)'}")
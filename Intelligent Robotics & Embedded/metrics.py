@@ -0,0 +1,181 @@
+import bisect
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# Seconds; spans a 0.1 ms frame decode up to a 10 s card wait
+LATENCY_BUCKETS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05,
+                   0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+METRICS_PORTS = {'entry': 9108, 'exit': 9109, 'payment': 9110}   # one local endpoint per process
+LOG_SAMPLE_EVERY = 100      # structured log keeps one in this many events of each kind...
+SLOW_EVENT = 0.5            # ...plus every event that took longer than this many seconds
+
+
+def _label_text(names, values, extra=()):
+    pairs = list(zip(names, values)) + list(extra)
+    if not pairs:
+        return ''
+    return '{' + ','.join(f'{name}="{value}"' for name, value in pairs) + '}'
+
+
+class Histogram:
+    """Cumulative-bucket latency histogram with labels, exported in Prometheus text format.
+
+    observe() is a bisect and three additions under a per-histogram lock, so
+    it is cheap enough to call per frame and per OCR read.
+    """
+
+    def __init__(self, name, description, labelnames=(), buckets=LATENCY_BUCKETS):
+        self.name = name
+        self.description = description
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(buckets)
+        self.series = {}
+        self._lock = threading.Lock()
+
+    def observe(self, seconds, *labels):
+        index = bisect.bisect_left(self.buckets, seconds)
+        with self._lock:
+            series = self.series.get(labels)
+            if series is None:
+                series = self.series[labels] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            series[0][index] += 1
+            series[1] += seconds
+            series[2] += 1
+
+    def time(self, *labels):
+        """Context manager that observes the time spent in its block."""
+        return _Timer(self, labels)
+
+    def expose(self):
+        lines = [f"# HELP {self.name} {self.description}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            series = [(labels, list(counts), total, count) for labels, (counts, total, count) in self.series.items()]
+        for labels, counts, total, count in sorted(series):
+            cumulative = 0
+            for bound, bucket in zip(self.buckets + ('+Inf',), counts):
+                cumulative += bucket
+                le = bound if bound == '+Inf' else repr(bound)
+                lines.append(f"{self.name}_bucket{_label_text(self.labelnames, labels, [('le', le)])} {cumulative}")
+            lines.append(f"{self.name}_sum{_label_text(self.labelnames, labels)} {total}")
+            lines.append(f"{self.name}_count{_label_text(self.labelnames, labels)} {count}")
+        return lines
+
+
+class _Timer:
+    __slots__ = ('histogram', 'labels', 'began')
+
+    def __init__(self, histogram, labels):
+        self.histogram = histogram
+        self.labels = labels
+
+    def __enter__(self):
+        self.began = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.histogram.observe(time.perf_counter() - self.began, *self.labels)
+
+
+class Counter:
+    """Monotonic counter with labels."""
+
+    def __init__(self, name, description, labelnames=()):
+        self.name = name
+        self.description = description
+        self.labelnames = tuple(labelnames)
+        self.series = {}
+        self._lock = threading.Lock()
+
+    def inc(self, *labels, amount=1):
+        with self._lock:
+            self.series[labels] = self.series.get(labels, 0) + amount
+
+    def expose(self):
+        lines = [f"# HELP {self.name} {self.description}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            series = sorted(self.series.items())
+        lines.extend(f"{self.name}{_label_text(self.labelnames, labels)} {value}" for labels, value in series)
+        return lines
+
+
+# ===== Process-wide metrics =====
+GATE_STAGE_SECONDS = Histogram('gate_stage_seconds', "Time spent in each gate lane stage.", ('lane', 'stage'))
+GATE_PLATES = Counter('gate_plates_total', "Plates committed by the tracker, by gate decision.", ('lane', 'action'))
+PAYMENT_STAGE_SECONDS = Histogram('payment_stage_seconds', "Time spent in each payment kiosk stage.",
+                                  ('kiosk', 'stage'))
+PAYMENTS = Counter('payment_transactions_total', "Card taps by final transaction state.", ('kiosk', 'state'))
+JOURNAL_DEAD_EVENTS = Counter('journal_dead_events_total',
+                              "Journaled events Postgres kept rejecting, moved to dead_events.", ('journal', 'kind'))
+REGISTRY = [GATE_STAGE_SECONDS, GATE_PLATES, PAYMENT_STAGE_SECONDS, PAYMENTS, JOURNAL_DEAD_EVENTS]
+
+
+def exposition(registry=REGISTRY):
+    """Every metric in Prometheus text exposition format."""
+    lines = []
+    for metric in registry:
+        lines.extend(metric.expose())
+    return '\n'.join(lines) + '\n'
+
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path.split('?')[0] != '/metrics':
+            self.send_error(404)
+            return
+        body = exposition().encode()
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/plain; version=0.0.4; charset=utf-8')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def start_http_server(port, host='127.0.0.1'):
+    """Serve /metrics on a daemon thread; returns the server, or None if the port is unavailable or 0."""
+    if not port:
+        return None
+    try:
+        server = ThreadingHTTPServer((host, port), _MetricsHandler)
+    except OSError as e:
+        print(f"[METRICS] Could not listen on {host}:{port}: {e}")
+        return None
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, name="metrics-http", daemon=True).start()
+    print(f"[METRICS] Serving http://{host}:{port}/metrics")
+    return server
+
+
+class SampledLog:
+    """JSON-lines event log that keeps one in `every` events of each kind, and every slow one.
+
+    Replaces per-event print() calls in hot paths: most events only bump a
+    counter, and the ones written carry `seen`, how many of that kind have
+    happened so far.
+    """
+
+    def __init__(self, every=LOG_SAMPLE_EVERY, slow=SLOW_EVENT, write=print):
+        self.every = every
+        self.slow = slow
+        self.write = write
+        self.seen = {}
+        self._lock = threading.Lock()
+
+    def event(self, kind, seconds=None, **fields):
+        with self._lock:
+            seen = self.seen[kind] = self.seen.get(kind, 0) + 1
+        slow = seconds is not None and seconds >= self.slow
+        if self.every > 1 and seen % self.every != 1 and not slow:
+            return
+        record = {'ts': round(time.time(), 3), 'event': kind, 'seen': seen}
+        if seconds is not None:
+            record['ms'] = round(seconds * 1000, 2)
+        record.update(fields)
+        self.write(json.dumps(record))
+
+
+EVENTS = SampledLog()
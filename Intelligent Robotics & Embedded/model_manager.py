@@ -0,0 +1,261 @@
+import argparse
+import contextlib
+import hashlib
+import json
+import os
+import shutil
+import statistics
+import sys
+import time
+from datetime import datetime
+import cv2
+import numpy as np
+
+MODEL_PATH = 'C://Users//hp//Desktop//NE_2025//Embedded//Intelligent Robotics & Embedded//best.pt'
+MODEL_CACHE = 'models'      # exported artifacts, one directory per weights checksum and image size
+RUNTIMES = ('torch', 'onnx', 'openvino')
+RUNTIME = 'openvino'        # what the gates load; 'torch' runs best.pt eagerly as before
+IMGSZ = 640                 # inference size the artifacts are exported at
+CALIBRATION_DATA = 'dataset'    # YOLO dataset whose val/ split calibrates INT8 and scores parity
+WARMUP_RUNS = 3             # blank frames pushed through a model before the first camera frame
+PARITY_RUNS = 5             # timed passes over the val images per runtime
+MAP_TOLERANCE = 0.01        # largest mAP50-95 drop an FP32 export may show against best.pt
+INT8_MAP_TOLERANCE = 0.03   # ...and an INT8 one
+EXPORT_LOCK_WAIT = 600      # seconds a process waits for another one exporting the same artifact
+MANIFEST = 'manifest.json'
+
+
+def file_checksum(path, chunk_size=1 << 20):
+    """SHA-256 of a file, read in chunks."""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def cache_dir(weights, imgsz=IMGSZ, root=MODEL_CACHE):
+    """models/<checksum prefix>-<imgsz>: new weights get a new directory, so stale exports are never loaded."""
+    return os.path.join(root, f"{file_checksum(weights)[:16]}-{imgsz}")
+
+
+def variant(runtime, int8=False):
+    return f"{runtime}-int8" if int8 else runtime
+
+
+def read_manifest(directory):
+    try:
+        with open(os.path.join(directory, MANIFEST)) as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return {}
+
+
+def write_manifest(directory, manifest):
+    path = os.path.join(directory, MANIFEST)
+    with open(path + '.tmp', 'w') as f:
+        json.dump(manifest, f, indent=2, sort_keys=True)
+    os.replace(path + '.tmp', path)
+
+
+@contextlib.contextmanager
+def _export_lock(directory, wait=EXPORT_LOCK_WAIT):
+    """Serialize exports of one cache directory across processes (entry and exit start together)."""
+    path = os.path.join(directory, '.export.lock')
+    deadline = time.time() + wait
+    while True:
+        try:
+            fd = os.open(path, os.O_CREAT | os.O_EXCL | os.O_WRONLY)
+            break
+        except FileExistsError:
+            if time.time() > deadline:
+                raise TimeoutError(f"{path} held for over {wait}s; delete it if no export is running")
+            time.sleep(1)
+    try:
+        yield
+    finally:
+        os.close(fd)
+        os.remove(path)
+
+
+def calibration_yaml(directory, data=CALIBRATION_DATA):
+    """Dataset yaml pointing at the local dataset/ (license_plate.yaml holds another machine's paths)."""
+    path = os.path.join(directory, 'calibration.yaml')
+    with open(path, 'w') as f:
+        f.write(f"path: {os.path.abspath(data)}\ntrain: train/images\nval: val/images\n\n"
+                f"names:\n  0: license_plate\n")
+    return path
+
+
+def export_model(weights=MODEL_PATH, runtime=RUNTIME, int8=False, imgsz=IMGSZ, root=MODEL_CACHE, force=False):
+    """Export `weights` to `runtime` once and return the cached artifact's path.
+
+    The weights are copied into their cache directory first, so ultralytics
+    writes the export there instead of next to best.pt. INT8 (OpenVINO only)
+    is calibrated on the val split of CALIBRATION_DATA. Exports use a dynamic
+    batch so the BatchInferenceService can send several lanes' frames at once.
+    """
+    if runtime == 'torch':
+        return weights
+    if runtime not in RUNTIMES:
+        raise ValueError(f"Unknown runtime: {runtime}")
+    if int8 and runtime != 'openvino':
+        raise ValueError("INT8 export is only supported for the openvino runtime")
+    directory = cache_dir(weights, imgsz, root)
+    os.makedirs(directory, exist_ok=True)
+    key = variant(runtime, int8)
+    with _export_lock(directory):
+        manifest = read_manifest(directory)
+        entry = manifest.get(key)
+        if entry and not force and os.path.exists(os.path.join(directory, entry['artifact'])):
+            return os.path.join(directory, entry['artifact'])
+
+        from ultralytics import YOLO
+        local_weights = os.path.join(directory, 'model.pt')
+        if not os.path.exists(local_weights):
+            shutil.copyfile(weights, local_weights)
+        options = {'format': runtime, 'imgsz': imgsz, 'dynamic': True}
+        if runtime == 'onnx':
+            options['simplify'] = True
+        if int8:
+            options.update(int8=True, data=calibration_yaml(directory))
+        print(f"[MODEL] Exporting {weights} to {key} (once per weights file)...")
+        began = time.perf_counter()
+        exported = YOLO(local_weights).export(**options)
+        seconds = time.perf_counter() - began
+        print(f"[MODEL] Exported {exported} in {seconds:.1f}s")
+
+        manifest = read_manifest(directory)
+        manifest[key] = {'artifact': os.path.relpath(exported, directory), 'source': os.path.abspath(weights),
+                         'sha256': file_checksum(weights), 'imgsz': imgsz,
+                         'exported_at': datetime.now().isoformat(timespec='seconds'),
+                         'export_seconds': round(seconds, 1)}
+        write_manifest(directory, manifest)
+        return os.path.join(directory, manifest[key]['artifact'])
+
+
+def warm_up(model, imgsz=IMGSZ, runs=WARMUP_RUNS):
+    """Run blank frames through the model so the first camera frame doesn't pay for setup; returns per-run seconds."""
+    blank = np.zeros((imgsz, imgsz, 3), np.uint8)
+    times = []
+    for _ in range(runs):
+        began = time.perf_counter()
+        model(blank, verbose=False)
+        times.append(time.perf_counter() - began)
+    return times
+
+
+def load_optimized(weights=MODEL_PATH, runtime=RUNTIME, int8=False, imgsz=IMGSZ, warm=True):
+    """YOLO model for `weights` on `runtime`, exported on first use and warmed up.
+
+    Falls back to the .pt weights on torch when the export fails (e.g. the
+    runtime isn't installed) or when `check` recorded an mAP regression for
+    this export.
+    """
+    from ultralytics import YOLO
+    model_path = weights
+    if runtime != 'torch':
+        try:
+            model_path = export_model(weights, runtime, int8, imgsz)
+        except Exception as e:
+            print(f"[MODEL] {variant(runtime, int8)} export failed ({e}); using torch")
+            runtime, int8 = 'torch', False
+    if runtime != 'torch':
+        parity = read_manifest(os.path.dirname(model_path)).get(variant(runtime, int8), {}).get('parity')
+        if parity is None:
+            print(f"[MODEL] {variant(runtime, int8)} has no parity check yet; run: python model_manager.py check")
+        elif not parity['passed']:
+            print(f"[MODEL] {variant(runtime, int8)} failed its parity check "
+                  f"(mAP50-95 {parity['map']:.3f} vs {parity['map_torch']:.3f}); using torch")
+            model_path, runtime, int8 = weights, 'torch', False
+
+    began = time.perf_counter()
+    model = YOLO(model_path, task='detect')
+    loaded = time.perf_counter() - began
+    if warm:
+        times = warm_up(model, imgsz)
+        print(f"[MODEL] {variant(runtime, int8)} loaded in {loaded * 1000:.0f} ms, first inference "
+              f"{times[0] * 1000:.0f} ms, warm {times[-1] * 1000:.0f} ms")
+    return model
+
+
+# ===== Parity check =====
+def val_images(data=CALIBRATION_DATA):
+    folder = os.path.join(data, 'val', 'images')
+    return [cv2.imread(os.path.join(folder, name)) for name in sorted(os.listdir(folder))]
+
+
+def measure(model, images, imgsz=IMGSZ, runs=PARITY_RUNS):
+    """Median milliseconds per image over `runs` passes, after a warm-up."""
+    warm_up(model, imgsz)
+    passes = []
+    for _ in range(runs):
+        began = time.perf_counter()
+        for image in images:
+            model(image, imgsz=imgsz, verbose=False)
+        passes.append((time.perf_counter() - began) * 1000 / len(images))
+    return statistics.median(passes)
+
+
+def accuracy(model, data_yaml, imgsz=IMGSZ):
+    """(mAP50, mAP50-95) on the val split."""
+    metrics = model.val(data=data_yaml, imgsz=imgsz, batch=1, plots=False, verbose=False)
+    return float(metrics.box.map50), float(metrics.box.map)
+
+
+def check_parity(weights=MODEL_PATH, runtime=RUNTIME, int8=False, imgsz=IMGSZ, data=CALIBRATION_DATA):
+    """Time and score an export against the .pt weights and record the result in the manifest."""
+    from ultralytics import YOLO
+    artifact = export_model(weights, runtime, int8, imgsz)
+    directory = cache_dir(weights, imgsz)
+    data_yaml = calibration_yaml(directory, data)
+    images = val_images(data)
+
+    reference = YOLO(weights, task='detect')
+    optimized = YOLO(artifact, task='detect')
+    torch_ms, ms = measure(reference, images, imgsz), measure(optimized, images, imgsz)
+    map50_torch, map_torch = accuracy(reference, data_yaml, imgsz)
+    map50, map_ = accuracy(optimized, data_yaml, imgsz)
+    tolerance = INT8_MAP_TOLERANCE if int8 else MAP_TOLERANCE
+    parity = {'torch_ms': round(torch_ms, 2), 'ms': round(ms, 2), 'speedup': round(torch_ms / ms, 2),
+              'map50_torch': round(map50_torch, 4), 'map50': round(map50, 4),
+              'map_torch': round(map_torch, 4), 'map': round(map_, 4),
+              'tolerance': tolerance, 'passed': map_torch - map_ <= tolerance,
+              'images': len(images), 'checked_at': datetime.now().isoformat(timespec='seconds')}
+    with _export_lock(directory):
+        manifest = read_manifest(directory)
+        manifest[variant(runtime, int8)]['parity'] = parity
+        write_manifest(directory, manifest)
+    return parity
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Export best.pt to an optimized CPU runtime and check it "
+                                                 "against the torch weights.")
+    parser.add_argument('command', choices=('export', 'check'),
+                        help="export: build the cached artifact; check: also time it and compare mAP on dataset/val")
+    parser.add_argument('--weights', default=MODEL_PATH)
+    parser.add_argument('--runtime', choices=RUNTIMES[1:], default=RUNTIME)
+    parser.add_argument('--int8', action='store_true', help="INT8-quantize (openvino), calibrated on dataset/val")
+    parser.add_argument('--imgsz', type=int, default=IMGSZ)
+    parser.add_argument('--force', action='store_true', help="export again even if the artifact is cached")
+    args = parser.parse_args()
+
+    if args.command == 'export':
+        print(f"[MODEL] {export_model(args.weights, args.runtime, args.int8, args.imgsz, force=args.force)}")
+        return 0
+    if args.force:
+        export_model(args.weights, args.runtime, args.int8, args.imgsz, force=True)
+    parity = check_parity(args.weights, args.runtime, args.int8, args.imgsz)
+    print(f"[MODEL] {variant(args.runtime, args.int8)}: {parity['ms']:.1f} ms/image vs torch "
+          f"{parity['torch_ms']:.1f} ms ({parity['speedup']:.2f}x) on {parity['images']} val images")
+    print(f"[MODEL] mAP50 {parity['map50']:.4f} vs {parity['map50_torch']:.4f}, "
+          f"mAP50-95 {parity['map']:.4f} vs {parity['map_torch']:.4f} (tolerance {parity['tolerance']})")
+    if not parity['passed']:
+        print("[MODEL] FAILED: mAP regression beyond tolerance; gates will keep using torch")
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
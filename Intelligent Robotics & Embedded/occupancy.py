@@ -0,0 +1,191 @@
+import json
+import select
+import threading
+import time
+from datetime import datetime
+import db_operations
+
+RESYNC_INTERVAL = 60    # seconds between catch-ups on open sessions, in case a notification was missed
+LISTEN_TIMEOUT = 1.0    # seconds the listener waits for a notification before checking for stop
+RECONNECT_DELAY = 5     # seconds between attempts to re-open the LISTEN connection
+
+
+def _as_datetime(value):
+    """Timestamps arrive as datetimes from queries and ISO strings from NOTIFY payloads."""
+    if value is None or isinstance(value, datetime):
+        return value
+    return datetime.fromisoformat(str(value))
+
+
+class Session:
+    """The latest plates_log row of one plate, as far as the gate needs it."""
+
+    __slots__ = ('id', 'plate', 'payment_status', 'entry_timestamp', 'exit_timestamp', 'exit_status')
+
+    def __init__(self, id, plate, payment_status=0, entry_timestamp=None, exit_timestamp=None, exit_status=None):
+        self.id = id
+        self.plate = plate
+        self.payment_status = payment_status
+        self.entry_timestamp = _as_datetime(entry_timestamp)
+        self.exit_timestamp = _as_datetime(exit_timestamp)
+        self.exit_status = exit_status
+
+    @classmethod
+    def from_row(cls, row):
+        return cls(str(row['id']), row['plate_number'], row.get('payment_status') or 0,
+                   row.get('entry_timestamp'), row.get('exit_timestamp'), row.get('exit_status'))
+
+    @property
+    def parked(self):
+        return self.exit_timestamp is None
+
+    @property
+    def paid(self):
+        return self.payment_status == 1
+
+
+class OccupancyIndex:
+    """In-process copy of the latest session of every plate, kept current from Postgres.
+
+    warm() loads one row per plate; afterwards a listener thread applies the
+    rows broadcast by the plates_log trigger (LISTEN/NOTIFY). Every
+    resync_interval seconds resync() re-reads only the open sessions and the
+    plates believed parked, in case a notification was lost; the full
+    warm() is repeated only after the LISTEN connection had to be reopened. Gate policies read it instead of querying the DB and
+    record their own decisions with record_entry()/record_exit() so the next
+    read is right before the journaled write reaches Postgres. An exit
+    recorded that way is kept over rows that still show the session open
+    (a resync read before the flush) until its journal event is flushed.
+    """
+
+    def __init__(self, resync_interval=RESYNC_INTERVAL):
+        self.resync_interval = resync_interval
+        self.sessions = {}
+        self.unflushed = {}     # plate -> (journal, event id) of an exit recorded here and not yet in Postgres
+        self.ready = threading.Event()
+        self.stop_event = threading.Event()
+        self.thread = None
+        self._lock = threading.Lock()
+
+    # ===== Loading and coherence =====
+    def warm(self):
+        """Load the latest session of every plate; returns False if the DB could not be read."""
+        rows = db_operations.fetch_latest_sessions()
+        if rows is None:
+            return False
+        for row in rows:
+            self.apply(row)
+        self.ready.set()
+        print(f"[OCCUPANCY] Loaded {len(rows)} plate(s), {self.parked_count()} parked")
+        return True
+
+    def resync(self):
+        """Catch up on open sessions and on plates believed parked; returns False if the DB could not be read."""
+        with self._lock:
+            parked = [plate for plate, session in self.sessions.items() if session.parked]
+        rows = db_operations.fetch_open_sessions(parked)
+        if rows is None:
+            return False
+        for row in rows:
+            self.apply(row)
+        return True
+
+    def apply(self, row):
+        """Merge one plates_log row; an older session never replaces a newer one, nor a stale row an unflushed exit."""
+        session = Session.from_row(row)
+        with self._lock:
+            current = self.sessions.get(session.plate)
+            unflushed = self.unflushed.get(session.plate)
+            if unflushed is not None and current is not None and current.id == session.id:
+                journal, event_id = unflushed
+                if session.parked and not current.parked and journal.is_pending(event_id):
+                    # Read before our journaled exit reached Postgres
+                    return
+                del self.unflushed[session.plate]
+            if (current is None or current.id == session.id or current.entry_timestamp is None
+                    or (session.entry_timestamp is not None and session.entry_timestamp >= current.entry_timestamp)):
+                self.sessions[session.plate] = session
+
+    def start(self):
+        if self.thread is None:
+            self.thread = threading.Thread(target=self._listen, name="occupancy", daemon=True)
+            self.thread.start()
+        return self
+
+    def stop(self):
+        self.stop_event.set()
+        if self.thread is not None:
+            self.thread.join(timeout=2)
+
+    def _listen(self):
+        conn = None
+        next_resync = 0
+        full = not self.ready.is_set()
+        while not self.stop_event.is_set():
+            if conn is None:
+                conn = db_operations.open_listen_connection()
+                if conn is None:
+                    self.stop_event.wait(RECONNECT_DELAY)
+                    continue
+                # Anything committed while we were not listening is picked up by the reload
+                next_resync = 0
+
+            if time.time() >= next_resync:
+                if self.warm() if full else self.resync():
+                    full = False
+                    next_resync = time.time() + self.resync_interval
+
+            try:
+                if select.select([conn], [], [], LISTEN_TIMEOUT)[0]:
+                    conn.poll()
+                    while conn.notifies:
+                        self.apply(json.loads(conn.notifies.pop(0).payload))
+            except Exception as e:
+                print(f"[OCCUPANCY] Lost notification connection: {e}")
+                try:
+                    conn.close()
+                except Exception:
+                    pass
+                conn = None
+                full = True
+        if conn is not None:
+            conn.close()
+
+    # ===== Queries =====
+    def get(self, plate):
+        with self._lock:
+            return self.sessions.get(plate)
+
+    def is_parked(self, plate):
+        session = self.get(plate)
+        return session is not None and session.parked
+
+    def is_paid(self, plate):
+        """Mirror of db_operations.is_payment_complete: is the plate's latest session paid?"""
+        session = self.get(plate)
+        return session is not None and session.paid
+
+    def parked_count(self):
+        with self._lock:
+            return sum(session.parked for session in self.sessions.values())
+
+    # ===== Local updates, ahead of the DB write =====
+    def record_entry(self, plate, row_id=None):
+        """Add a provisional session; the trigger's notification replaces it with the real row."""
+        with self._lock:
+            self.sessions[plate] = Session(row_id, plate, 0, db_operations.get_timestamp())
+
+    def record_exit(self, plate, exit_status, journal=None, event_id=None):
+        """Close the plate's session the way log_plate_exit will (DENIED rows get an exit time too).
+
+        Pass the journal and event id the exit was written with, and rows
+        showing the session open are ignored until that event is flushed.
+        """
+        with self._lock:
+            session = self.sessions.get(plate)
+            if session is not None and session.parked:
+                session.exit_status = exit_status
+                session.exit_timestamp = _as_datetime(db_operations.get_timestamp())
+                if event_id is not None:
+                    self.unflushed[plate] = (journal, event_id)
+
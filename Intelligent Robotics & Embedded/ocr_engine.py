@@ -0,0 +1,151 @@
+import os
+import shutil
+import tempfile
+import threading
+from collections import namedtuple
+import cv2
+import numpy as np
+
+try:
+    import tesserocr
+except ImportError:
+    tesserocr = None
+
+TESSERACT_CMD = r'C:\Program Files\Tesseract-OCR\tesseract.exe'
+TESSDATA_PATH = None    # None lets tesserocr use its compiled-in tessdata location
+PLATE_CHARSET = 'ABCDEFGHIJKLMNOPQRSTUVWXYZ0123456789'
+OCR_CONFIG = f'--psm 8 --oem 3 -c tessedit_char_whitelist={PLATE_CHARSET}'
+OCR_BACKEND = None      # None picks the fastest backend that is installed
+
+# text: recognised characters; confidences: one 0..1 score per character;
+# alternatives: per character, a list of (char, confidence) choices (best first)
+OcrResult = namedtuple('OcrResult', ['text', 'confidences', 'alternatives'])
+
+
+class TesserocrBackend:
+    """Tesseract through its C++ API: one warm engine per thread, no process spawn or temp files."""
+
+    name = 'tesserocr'
+
+    def __init__(self, path=TESSDATA_PATH, lang='eng'):
+        if tesserocr is None:
+            raise RuntimeError("tesserocr is not installed")
+        self.path = path
+        self.lang = lang
+        self._local = threading.local()
+
+    def _api(self):
+        api = getattr(self._local, 'api', None)
+        if api is None:
+            kwargs = {'lang': self.lang, 'psm': tesserocr.PSM.SINGLE_WORD, 'oem': tesserocr.OEM.DEFAULT}
+            if self.path:
+                kwargs['path'] = self.path
+            api = tesserocr.PyTessBaseAPI(**kwargs)
+            api.SetVariable('tessedit_char_whitelist', PLATE_CHARSET)
+            self._local.api = api
+        return api
+
+    def read(self, image):
+        api = self._api()
+        image = np.ascontiguousarray(image)
+        height, width = image.shape[:2]
+        channels = 1 if image.ndim == 2 else image.shape[2]
+        api.SetImageBytes(image.tobytes(), width, height, channels, width * channels)
+        api.Recognize()
+
+        text, confidences, alternatives = [], [], []
+        level = tesserocr.RIL.SYMBOL
+        for symbol in tesserocr.iterate_level(api.GetIterator(), level):
+            char = symbol.GetUTF8Text(level)
+            if not char or char.isspace():
+                continue
+            choices = [(choice.GetUTF8Text(), choice.Confidence() / 100)
+                       for choice in symbol.GetChoiceIterator()]
+            text.append(char)
+            confidences.append(symbol.Confidence(level) / 100)
+            alternatives.append(choices or [(char, confidences[-1])])
+        api.Clear()
+        return OcrResult(''.join(text), confidences, alternatives)
+
+    def read_batch(self, images):
+        return [self.read(image) for image in images]
+
+
+class PytesseractBackend:
+    """Fallback through the tesseract CLI.
+
+    A batch is written to one temp dir and recognised by a single tesseract
+    run over a list file, so the process spawn is paid per batch, not per
+    crop. Only word-level confidences are available; every character of a
+    word gets the word's score.
+    """
+
+    name = 'pytesseract'
+
+    def __init__(self, tesseract_cmd=TESSERACT_CMD):
+        import pytesseract
+        self.pytesseract = pytesseract
+        if tesseract_cmd and os.path.exists(tesseract_cmd):
+            pytesseract.pytesseract.tesseract_cmd = tesseract_cmd
+
+    def read(self, image):
+        return self.read_batch([image])[0]
+
+    def read_batch(self, images):
+        if not images:
+            return []
+        tmp_dir = tempfile.mkdtemp(prefix='ocr_batch_')
+        try:
+            list_path = os.path.join(tmp_dir, 'batch.txt')
+            with open(list_path, 'w') as f:
+                for i, image in enumerate(images):
+                    image_path = os.path.join(tmp_dir, f'{i}.png')
+                    cv2.imwrite(image_path, image)
+                    f.write(image_path + '\n')
+            data = self.pytesseract.image_to_data(list_path, config=OCR_CONFIG,
+                                                  output_type=self.pytesseract.Output.DICT)
+        finally:
+            shutil.rmtree(tmp_dir, ignore_errors=True)
+
+        pages = [([], []) for _ in images]
+        for page, word, conf in zip(data['page_num'], data['text'], data['conf']):
+            word = word.strip().replace(" ", "")
+            if not word or float(conf) < 0 or not 1 <= page <= len(images):
+                continue
+            text, confidences = pages[page - 1]
+            text.append(word)
+            confidences.extend([float(conf) / 100] * len(word))
+
+        results = []
+        for text, confidences in pages:
+            text = ''.join(text)
+            results.append(OcrResult(text, confidences, [[(c, p)] for c, p in zip(text, confidences)]))
+        return results
+
+
+def _char_recognizer_backend():
+    from char_recognizer import CharRecognizerBackend
+    return CharRecognizerBackend()
+
+
+BACKENDS = {
+    TesserocrBackend.name: TesserocrBackend,
+    PytesseractBackend.name: PytesseractBackend,
+    'chars': _char_recognizer_backend,
+}
+
+_backends = {}
+_backends_lock = threading.Lock()
+
+
+def get_backend(name=OCR_BACKEND):
+    """Return a shared backend instance; with no name, prefer the in-process engine."""
+    if name is None:
+        name = TesserocrBackend.name if tesserocr is not None else PytesseractBackend.name
+    if name not in BACKENDS:
+        raise ValueError(f"Unknown OCR backend: {name}")
+    with _backends_lock:
+        if name not in _backends:
+            _backends[name] = BACKENDS[name]()
+            print(f"[OCR] Using {name} backend")
+        return _backends[name]
@@ -0,0 +1,41 @@
+import startup
+import argparse
+import importlib
+import os
+import sys
+
+# command: (module whose main() runs it, arguments put in front of the user's, help)
+COMMANDS = {
+    'entry': ('car_entry', [], "run the entry gate lane"),
+    'exit': ('car_exit', [], "run the exit gate lane"),
+    'pay': ('process_payment', [], "serve the RFID payment kiosks"),
+    'mark-paid': ('payment_success', [], "mark a plate's latest unpaid session as paid"),
+    'import': ('plates_log_io', ['import'], "load a legacy plates_log.csv into plates_log"),
+    'bench': ('bench_gate', [], "replay a recording through a headless lane and report speed and accuracy"),
+}
+
+
+def main(argv=None):
+    """Dispatch to a tool, importing only that tool's module.
+
+    A mark-paid or import never loads OpenCV, the serial stack or the YOLO
+    runtime, and the gates load them once they are actually starting.
+    `python parking.py <command> --help` shows the command's own options.
+    """
+    parser = argparse.ArgumentParser(
+        prog=os.path.basename(sys.argv[0]), description="Parking system gates, kiosks and admin tools.",
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+        epilog="commands:\n" + '\n'.join(f"  {name:<11} {text}" for name, (_, _, text) in COMMANDS.items()))
+    parser.add_argument('command', choices=COMMANDS, metavar='command')
+    parser.add_argument('args', nargs=argparse.REMAINDER, help="options of the command")
+    args = parser.parse_args(argv)
+
+    module_name, prefix, _ = COMMANDS[args.command]
+    module = importlib.import_module(module_name)
+    # The tool parses sys.argv itself; its usage line reads "parking.py entry ..."
+    sys.argv = [f"{parser.prog} {args.command}" if not prefix else parser.prog] + prefix + args.args
+    return module.main()
+
+
+if __name__ == "__main__":
+    sys.exit(main())
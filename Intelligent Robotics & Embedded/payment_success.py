@@ -1,15 +1,30 @@
+import argparse
+import startup
 import db_operations
 
-# Initialize the database
-db_operations.initialize_db()
 
 def mark_payment_success(plate_number):
     """Mark payment as successful for a plate using the database."""
     success = db_operations.mark_payment_success(plate_number)
     if not success:
         print(f"[INFO] No unpaid record found for {plate_number}")
+    return success
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Mark a plate's latest unpaid session as paid.")
+    parser.add_argument('plate', nargs='?', help="plate number (asked for if omitted)")
+    args = parser.parse_args()
+    startup.phase('import')
+    db_operations.ensure_schema()
+    startup.phase('schema')
+    startup.report("Ready")
+
+    plate = (args.plate or input("Enter plate number to mark as paid: ")).strip().upper()
+    success = mark_payment_success(plate)
+    db_operations.close_pool()
+    return 0 if success else 1
+
 
-# ==== TESTING USAGE ====
 if __name__ == "__main__":
-    plate = input("Enter plate number to mark as paid: ").strip().upper()
-    mark_payment_success(plate)
+    raise SystemExit(main())
@@ -0,0 +1,282 @@
+import queue
+import threading
+import time
+from collections import deque
+import numpy as np
+from metrics import GATE_STAGE_SECONDS
+
+FRAME_QUEUE_SIZE = 1    # inference only ever sees the freshest frame
+CROP_QUEUE_SIZE = 8
+PLATE_QUEUE_SIZE = 16
+OCR_WORKERS = 2
+STAGE_WINDOW = 1000     # recent samples kept per stage for latency figures
+
+
+class DropOldestQueue(queue.Queue):
+    """Bounded queue whose put() never blocks: when full, the oldest item is discarded."""
+
+    def __init__(self, maxsize=1):
+        super().__init__(maxsize)
+        self.dropped = 0
+
+    def put(self, item, block=False, timeout=None):
+        with self.not_full:
+            if 0 < self.maxsize <= self._qsize():
+                self._get()
+                self.unfinished_tasks -= 1
+                self.dropped += 1
+            self._put(item)
+            self.unfinished_tasks += 1
+            self.not_empty.notify()
+
+
+def put_waiting(inbox, item, stop_event):
+    """Block until `item` fits in `inbox`, giving up once stop_event is set; True if it was queued."""
+    while not stop_event.is_set():
+        try:
+            inbox.put(item, timeout=0.1)
+            return True
+        except queue.Full:
+            pass
+    return False
+
+
+class Worker(threading.Thread):
+    """Daemon thread that feeds every item from an inbox queue to a handler."""
+
+    def __init__(self, name, inbox, handler, stop_event):
+        super().__init__(name=name, daemon=True)
+        self.inbox = inbox
+        self.handler = handler
+        self.stop_event = stop_event
+
+    def run(self):
+        while not self.stop_event.is_set():
+            try:
+                item = self.inbox.get(timeout=0.1)
+            except queue.Empty:
+                continue
+            try:
+                self.handler(item)
+            except Exception as e:
+                print(f"[{self.name.upper()}] Error: {e}")
+            finally:
+                self.inbox.task_done()
+
+
+class WorkerPool:
+    """N workers sharing one drop-oldest inbox of (handler, item) pairs.
+
+    Several pipelines can submit to the same pool, so lanes in one process
+    share a fixed number of OCR threads instead of each starting their own.
+    A lossless pool never drops: submit() waits for room instead.
+    """
+
+    def __init__(self, name, size=OCR_WORKERS, maxsize=CROP_QUEUE_SIZE, lossless=False):
+        self.lossless = lossless
+        self.inbox = queue.Queue(maxsize) if lossless else DropOldestQueue(maxsize)
+        self.stop_event = threading.Event()
+        self.workers = [Worker(f"{name}-{i}", self.inbox, self._run, self.stop_event)
+                        for i in range(size)]
+        self.started = False
+
+    def _run(self, job):
+        handler, item = job
+        handler(item)
+
+    def submit(self, handler, item):
+        if self.lossless:
+            put_waiting(self.inbox, (handler, item), self.stop_event)
+        else:
+            self.inbox.put((handler, item))
+
+    def start(self):
+        if not self.started:
+            self.started = True
+            for worker in self.workers:
+                worker.start()
+        return self
+
+    def stop(self):
+        self.stop_event.set()
+        for worker in self.workers:
+            worker.join(timeout=2)
+
+
+class StageTimes:
+    """Thread-safe per-stage latency samples (the last `window` of each) and counts.
+
+    With a lane name every sample also goes to the gate_stage_seconds histogram.
+    """
+
+    def __init__(self, lane=None, window=STAGE_WINDOW):
+        self.lane = lane
+        self.window = window
+        self.samples = {}
+        self.counts = {}
+        self._lock = threading.Lock()
+
+    def record(self, stage, seconds):
+        with self._lock:
+            if stage not in self.samples:
+                self.samples[stage] = deque(maxlen=self.window)
+                self.counts[stage] = 0
+            self.samples[stage].append(seconds)
+            self.counts[stage] += 1
+        if self.lane is not None:
+            GATE_STAGE_SECONDS.observe(seconds, self.lane, stage)
+
+    def summary(self):
+        """{stage: {'count', 'avg_ms', 'p95_ms'}} in the order stages were first seen."""
+        with self._lock:
+            samples = {stage: np.array(values) * 1000 for stage, values in self.samples.items()}
+            counts = dict(self.counts)
+        return {stage: {'count': counts[stage], 'avg_ms': float(values.mean()),
+                        'p95_ms': float(np.percentile(values, 95))}
+                for stage, values in samples.items()}
+
+
+class GatePipeline:
+    """Capture -> YOLO inference -> OCR pool -> DB/gate actuator, one thread per stage.
+
+    Stages are linked by drop-oldest queues, so a slow OCR call or a gate held
+    open by the actuator never leaves the camera buffer stale.
+
+    read_plate(plate_img) must return (reading or None, processed_img) and is
+    called concurrently from the OCR workers. on_plate(tag, reading, plate_img)
+    runs on the single actuator thread, so it may block (DB writes, gate dwell).
+    should_infer(frame) is called per frame and can skip inference (e.g. no car).
+    select(boxes, captured_at) runs on the inference thread with the frame's
+    x1, y1, x2, y2 boxes and capture time (cap.clock if the source has one,
+    else the wall clock) and returns the (tag, box) pairs to OCR, e.g. to tag
+    boxes with a track id and skip vehicles that are already identified.
+    Pass a shared WorkerPool as ocr_pool to share OCR threads between lanes;
+    otherwise the pipeline starts and stops a private one.
+
+    A live source (cap.live, default True) has stale frames dropped; a
+    recording is replayed losslessly, every stage waiting for the next one
+    instead of dropping frames, crops or plates (a shared ocr_pool keeps
+    whatever policy it was built with).
+    When the source ends, running() turns False once the queued work has
+    drained. display=False skips drawing the annotated frame. Stage latencies
+    (decode, detect) go to `timings`, which read_plate/on_plate may share.
+    """
+
+    def __init__(self, cap, model, read_plate, on_plate, should_infer=None, ocr_pool=None, name="lane",
+                 select=None, display=True, timings=None):
+        self.cap = cap
+        self.model = model
+        self.read_plate = read_plate
+        self.on_plate = on_plate
+        self.should_infer = should_infer
+        self.select = select
+        self.name = name
+        self.display = display
+        self.timings = StageTimes() if timings is None else timings
+        self.stop_event = threading.Event()
+        self.ended = threading.Event()
+
+        self.live = getattr(cap, 'live', True)
+        self.owns_ocr_pool = ocr_pool is None
+        self.ocr_pool = WorkerPool(f"{name}-ocr", lossless=not self.live) if ocr_pool is None else ocr_pool
+        self.frames = DropOldestQueue(FRAME_QUEUE_SIZE) if self.live else queue.Queue(FRAME_QUEUE_SIZE)
+        self.plates = DropOldestQueue(PLATE_QUEUE_SIZE) if self.live else queue.Queue(PLATE_QUEUE_SIZE)
+
+        self._views = {}
+        self._views_lock = threading.Lock()
+
+        self.threads = [threading.Thread(target=self._capture, name=f"{name}-capture", daemon=True),
+                        Worker(f"{name}-inference", self.frames, self._infer, self.stop_event),
+                        Worker(f"{name}-actuator", self.plates, self._actuate, self.stop_event)]
+
+    def start(self):
+        self.ocr_pool.start()
+        for thread in self.threads:
+            thread.start()
+        return self
+
+    def stop(self):
+        self.stop_event.set()
+        for thread in self.threads:
+            thread.join(timeout=2)
+        if self.owns_ocr_pool:
+            self.ocr_pool.stop()
+
+    def running(self):
+        if self.stop_event.is_set():
+            return False
+        return not (self.ended.is_set() and self.idle())
+
+    def idle(self):
+        """True when no frame, crop or plate is queued or being handled (upstream queues first)."""
+        return (self.frames.unfinished_tasks == 0 and self.ocr_pool.inbox.unfinished_tasks == 0
+                and self.plates.unfinished_tasks == 0)
+
+    def views(self):
+        """Return the latest images for display, keyed by window name."""
+        with self._views_lock:
+            return dict(self._views)
+
+    def _publish(self, **views):
+        with self._views_lock:
+            self._views.update(views)
+
+    # ===== Stages =====
+    def _capture(self):
+        while not self.stop_event.is_set():
+            began = time.perf_counter()
+            ret, frame = self.cap.read()
+            if not ret:
+                print("[CAPTURE] Camera stream ended.")
+                self.ended.set()
+                break
+            self.timings.record('decode', time.perf_counter() - began)
+            item = (frame, getattr(self.cap, 'clock', None) or time.time())
+            if self.live:
+                self.frames.put(item)
+            else:
+                put_waiting(self.frames, item, self.stop_event)
+
+    def _infer(self, item):
+        frame, captured_at = item
+        if self.should_infer is not None and not self.should_infer(frame):
+            if self.display:
+                self._publish(frame=frame)
+            return
+
+        began = time.perf_counter()
+        results = self.model(frame, verbose=False)
+        self.timings.record('detect', time.perf_counter() - began)
+        boxes = [tuple(map(int, box.xyxy[0])) for result in results for box in result.boxes]
+        jobs = self.select(boxes, captured_at) if self.select is not None else [(None, box) for box in boxes]
+        for tag, (x1, y1, x2, y2) in jobs:
+            plate_img = frame[y1:y2, x1:x2]
+            if plate_img.size:
+                self.ocr_pool.submit(self._ocr, (tag, plate_img))
+        if self.display:
+            self._publish(frame=results[0].plot())
+
+    def _ocr(self, job):
+        if self.stop_event.is_set():
+            return
+        tag, plate_img = job
+        reading, processed = self.read_plate(plate_img)
+        if self.display:
+            self._publish(plate=plate_img, processed=processed)
+        if not reading:
+            return
+        if self.live:
+            self.plates.put((tag, reading, plate_img))
+        else:
+            put_waiting(self.plates, (tag, reading, plate_img), self.stop_event)
+
+    def _actuate(self, item):
+        self.on_plate(*item)
+
+    def stats(self):
+        """Return how many items each queue has dropped because a stage fell behind."""
+        return {
+            'frames_dropped': getattr(self.frames, 'dropped', 0),
+            'crops_dropped': getattr(self.ocr_pool.inbox, 'dropped', 0),
+            'plates_dropped': getattr(self.plates, 'dropped', 0),
+        }
@@ -0,0 +1,73 @@
+import math
+import numpy as np
+from ocr_engine import OcrResult, PLATE_CHARSET
+
+LETTERS = frozenset('ABCDEFGHIJKLMNOPQRSTUVWXYZ')
+DIGITS = frozenset('0123456789')
+# Rwandan plates: R A <letter> <digit> <digit> <digit> <letter>
+SLOTS = (frozenset('R'), frozenset('A'), LETTERS, DIGITS, DIGITS, DIGITS, LETTERS)
+PLATE_LENGTH = len(SLOTS)
+
+# Look-alike characters OCR swaps; a read is moved to the one that fits the slot
+CONFUSIONS = {
+    'O': '0', '0': 'O', 'Q': '0', 'D': '0',
+    'I': '1', '1': 'I',
+    'B': '8', '8': 'B',
+    'S': '5', '5': 'S',
+    'Z': '2', '2': 'Z',
+    'A': '4', '4': 'A',
+    'G': '6', '6': 'G',
+}
+CONFUSION_PENALTY = 0.6     # a substituted character keeps this share of its confidence
+DEFAULT_CONFIDENCE = 0.9    # for backends that give no per-character scores
+
+
+def slot_mask():
+    """(PLATE_LENGTH, len(PLATE_CHARSET)) boolean array of the characters each slot allows."""
+    return np.array([[char in slot for char in PLATE_CHARSET] for slot in SLOTS])
+
+
+def slot_candidates(choices, slot):
+    """Map OCR choices for one character onto a slot, best first: [(char, confidence), ...]."""
+    best = {}
+    for char, confidence in choices:
+        if char in slot:
+            candidate = char
+        elif CONFUSIONS.get(char) in slot:
+            candidate = CONFUSIONS[char]
+            confidence *= CONFUSION_PENALTY
+        else:
+            continue
+        best[candidate] = max(best.get(candidate, 0.0), confidence)
+    return sorted(best.items(), key=lambda item: -item[1])
+
+
+def decode(result):
+    """Return the most likely valid plate in an OcrResult as a new OcrResult, or None.
+
+    Every 7-character window of the read is fitted to the slot grammar using
+    the backend's alternatives and the confusion map (so RAB12OC becomes
+    RAB120C); the window with the highest joint confidence wins. The returned
+    alternatives only contain characters the slot allows.
+    """
+    keep = [i for i, char in enumerate(result.text) if not char.isspace()]
+    per_char = len(result.confidences) == len(result.text) and len(result.alternatives) == len(result.text)
+    choices = [result.alternatives[i] if per_char else [(result.text[i], DEFAULT_CONFIDENCE)] for i in keep]
+
+    best, best_score = None, -math.inf
+    for start in range(len(choices) - PLATE_LENGTH + 1):
+        window = []
+        for slot, options in zip(SLOTS, choices[start:start + PLATE_LENGTH]):
+            candidates = slot_candidates(options, slot)
+            if not candidates:
+                break
+            window.append(candidates)
+        else:
+            score = sum(math.log(max(candidates[0][1], 1e-6)) for candidates in window)
+            if score > best_score:
+                best, best_score = window, score
+
+    if best is None:
+        return None
+    plate = ''.join(candidates[0][0] for candidates in best)
+    return OcrResult(plate, [candidates[0][1] for candidates in best], best)
@@ -0,0 +1,146 @@
+import itertools
+import threading
+import time
+from collections import OrderedDict
+import numpy as np
+from ocr_engine import PLATE_CHARSET
+from plate_grammar import PLATE_LENGTH, slot_mask
+
+IOU_THRESHOLD = 0.3         # minimum overlap for a box to continue a track
+TRACK_MAX_AGE = 1.5         # seconds a track survives without a matching box
+COMMIT_CONFIDENCE = 0.95    # every position must be at least this certain to commit
+MAX_READS = 6               # commit the best guess after this many reads regardless
+RETIRED_TRACKS = 32         # expired tracks kept so OCR reads still in flight count
+
+_CHAR_INDEX = {char: i for i, char in enumerate(PLATE_CHARSET)}
+# Characters a slot can never hold start with zero probability
+_PRIOR = np.where(slot_mask(), 0.0, -np.inf)
+
+
+def iou_matrix(a, b):
+    """Pairwise IoU between (N, 4) and (M, 4) arrays of x1, y1, x2, y2 boxes."""
+    a = np.asarray(a, dtype=np.float32).reshape(-1, 4)
+    b = np.asarray(b, dtype=np.float32).reshape(-1, 4)
+    x1 = np.maximum(a[:, None, 0], b[None, :, 0])
+    y1 = np.maximum(a[:, None, 1], b[None, :, 1])
+    x2 = np.minimum(a[:, None, 2], b[None, :, 2])
+    y2 = np.minimum(a[:, None, 3], b[None, :, 3])
+    inter = np.clip(x2 - x1, 0, None) * np.clip(y2 - y1, 0, None)
+    area_a = (a[:, 2] - a[:, 0]) * (a[:, 3] - a[:, 1])
+    area_b = (b[:, 2] - b[:, 0]) * (b[:, 3] - b[:, 1])
+    return inter / np.maximum(area_a[:, None] + area_b[None, :] - inter, 1e-6)
+
+
+def read_likelihoods(reading):
+    """(PLATE_LENGTH, len(PLATE_CHARSET)) per-position character probabilities for one OCR read.
+
+    Characters the OCR did not offer share whatever probability mass the
+    offered alternatives leave over.
+    """
+    probs = np.empty((PLATE_LENGTH, len(PLATE_CHARSET)), dtype=np.float64)
+    for position, choices in enumerate(reading.alternatives[:PLATE_LENGTH]):
+        offered = [(_CHAR_INDEX[c], p) for c, p in choices if c in _CHAR_INDEX]
+        offered_mass = min(sum(p for _, p in offered), 0.99)
+        probs[position] = (1 - offered_mass) / max(1, len(PLATE_CHARSET) - len(offered))
+        for index, p in offered:
+            probs[position, index] = max(p, 1e-3)
+    return probs
+
+
+class Track:
+    """One vehicle's plate box across frames plus the fused evidence from its OCR reads."""
+
+    def __init__(self, track_id, box, now):
+        self.id = track_id
+        self.box = box
+        self.last_seen = now
+        self.reads = 0
+        self.log_evidence = _PRIOR.copy()
+        self.plate = None
+
+    def posterior(self):
+        """Per-position probability of each character given every read so far."""
+        shifted = self.log_evidence - self.log_evidence.max(axis=1, keepdims=True)
+        probs = np.exp(shifted)
+        return probs / probs.sum(axis=1, keepdims=True)
+
+    def best(self):
+        """(most likely plate, confidence of its least certain position)."""
+        posterior = self.posterior()
+        best = posterior.argmax(axis=1)
+        plate = ''.join(PLATE_CHARSET[i] for i in best)
+        return plate, float(posterior[np.arange(PLATE_LENGTH), best].min())
+
+
+class PlateTracker:
+    """IoU tracker that fuses OCR reads per vehicle and commits once the plate is certain.
+
+    assign() runs on the inference thread and only hands out boxes whose
+    track has not committed yet, so a car stops costing OCR calls as soon as
+    its plate is known. add_read() runs on the actuator thread; a read that
+    arrives after its track expired still counts towards that track.
+    """
+
+    def __init__(self, iou_threshold=IOU_THRESHOLD, max_age=TRACK_MAX_AGE,
+                 commit_confidence=COMMIT_CONFIDENCE, max_reads=MAX_READS):
+        self.iou_threshold = iou_threshold
+        self.max_age = max_age
+        self.commit_confidence = commit_confidence
+        self.max_reads = max_reads
+        self.tracks = {}
+        self.retired = OrderedDict()
+        self._ids = itertools.count(1)
+        self._lock = threading.Lock()
+
+    def assign(self, boxes, now=None):
+        """Match this frame's boxes to tracks; return (track_id, box) for boxes still worth reading.
+
+        now is the frame's capture time (defaults to the wall clock), so
+        recordings replayed faster or slower than real time track the same.
+        """
+        now = time.time() if now is None else now
+        with self._lock:
+            for track_id in [t.id for t in self.tracks.values() if now - t.last_seen > self.max_age]:
+                self.retired[track_id] = self.tracks.pop(track_id)
+                if len(self.retired) > RETIRED_TRACKS:
+                    self.retired.popitem(last=False)
+
+            tracks = list(self.tracks.values())
+            matched = [None] * len(boxes)
+            if tracks and boxes:
+                overlap = iou_matrix(boxes, [t.box for t in tracks])
+                # Greedy matching, best overlaps first
+                for flat in np.argsort(-overlap, axis=None):
+                    b, t = np.unravel_index(flat, overlap.shape)
+                    if overlap[b, t] < self.iou_threshold:
+                        break
+                    if matched[b] is None and tracks[t] is not None:
+                        matched[b] = tracks[t]
+                        tracks[t] = None
+
+            jobs = []
+            for box, track in zip(boxes, matched):
+                if track is None:
+                    track = Track(next(self._ids), box, now)
+                    self.tracks[track.id] = track
+                track.box = box
+                track.last_seen = now
+                if track.plate is None:
+                    jobs.append((track.id, box))
+            return jobs
+
+    def add_read(self, track_id, reading):
+        """Fuse one OCR read into its track; return the plate the first time the track commits."""
+        with self._lock:
+            track = self.tracks.get(track_id) or self.retired.get(track_id)
+            if track is None or track.plate is not None:
+                return None
+            track.log_evidence += np.log(read_likelihoods(reading))
+            track.reads += 1
+            plate, confidence = track.best()
+            if confidence >= self.commit_confidence or track.reads >= self.max_reads:
+                track.plate = plate
+                print(f"[TRACK] #{track.id} committed {plate} after {track.reads} read(s) "
+                      f"(confidence {confidence:.2f})")
+                return plate
+            return None
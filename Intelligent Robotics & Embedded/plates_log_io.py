@@ -0,0 +1,150 @@
+import argparse
+import csv
+import io
+import sys
+import time
+import uuid
+from datetime import datetime
+import db_operations
+
+LEGACY_HEADER = ['Plate Number', 'Payment Status', 'Timestamp', 'Payment Timestamp']
+LEGACY_FORMAT = '%Y-%m-%d %H:%M:%S'
+IMPORTED_EXIT_STATUS = 'IMPORTED'
+# Fixed namespace so a legacy row always maps to the same plates_log id and re-imports are no-ops
+LEGACY_NAMESPACE = uuid.UUID('6f1c0c9e-0d6b-4b8e-9a51-3f4f2b7d1e10')
+READ_CHUNK = 1 << 20
+
+
+class CsvRowStream:
+    """File-like object that renders rows to CSV on demand, for COPY FROM STDIN.
+
+    Only about one read() request worth of text is held at a time, so memory
+    stays flat however large the input file is.
+    """
+
+    def __init__(self, rows):
+        self.rows = iter(rows)
+        self.buffer = io.StringIO()
+        self.writer = csv.writer(self.buffer, lineterminator='\n')
+        self.count = 0
+
+    def read(self, size=-1):
+        if size is None or size < 0:
+            size = READ_CHUNK
+        while self.buffer.tell() < size:
+            row = next(self.rows, None)
+            if row is None:
+                break
+            self.writer.writerow(row)
+            self.count += 1
+        data = self.buffer.getvalue()
+        self.buffer.seek(0)
+        self.buffer.truncate()
+        if len(data) > size:
+            self.buffer.write(data[size:])
+            data = data[:size]
+        return data
+
+    readline = read
+
+
+def _parse_time(value):
+    value = value.strip()
+    return datetime.strptime(value, LEGACY_FORMAT) if value else None
+
+
+def legacy_rows(path, keep_open=False, errors=None):
+    """Yield plates_log rows (db_operations.PLATES_LOG_COLUMNS order) from a legacy CSV.
+
+    Legacy files have no exit columns: unless keep_open is set, each session
+    is closed with exit_status IMPORTED at its payment (else entry) time so
+    history does not show up as cars still parked.
+    """
+    with open(path, newline='') as f:
+        reader = csv.reader(f)
+        header = next(reader, None)
+        if header is None or [column.strip() for column in header] != LEGACY_HEADER:
+            raise ValueError(f"{path}: expected header {','.join(LEGACY_HEADER)}")
+        for line_number, row in enumerate(reader, start=2):
+            try:
+                plate, status, entered, paid = (value.strip() for value in row)
+                entry_time = _parse_time(entered)
+                payment_time = _parse_time(paid)
+                status = int(status or 0)
+                if not plate or entry_time is None:
+                    raise ValueError("missing plate or timestamp")
+            except ValueError as e:
+                if errors is not None:
+                    errors.append((line_number, str(e)))
+                continue
+            row_id = uuid.uuid5(LEGACY_NAMESPACE, f"{plate}|{entry_time:{LEGACY_FORMAT}}")
+            exit_time = None if keep_open else payment_time or entry_time
+            yield (row_id, plate, status, entry_time, payment_time, exit_time,
+                   None if keep_open else IMPORTED_EXIT_STATUS, None)
+
+
+def import_csv(args):
+    errors = []
+    stream = CsvRowStream(legacy_rows(args.path, args.keep_open, errors))
+    began = time.perf_counter()
+    inserted = db_operations.copy_plates_in(stream)
+    elapsed = time.perf_counter() - began
+    for line_number, reason in errors[:10]:
+        print(f"[IMPORT] Skipped line {line_number}: {reason}")
+    if inserted is None:
+        return 1
+    print(f"[IMPORT] {stream.count:,} rows read, {inserted:,} new, {len(errors):,} skipped "
+          f"in {elapsed:.2f}s ({stream.count / max(elapsed, 1e-9):,.0f} rows/s)")
+    return 0
+
+
+def export_csv(args):
+    if args.full:
+        columns = ', '.join(db_operations.PLATES_LOG_COLUMNS)
+    else:
+        # Same columns and formatting as the legacy plates_log.csv
+        columns = ("plate_number AS \"Plate Number\", payment_status AS \"Payment Status\", "
+                   "to_char(entry_timestamp, 'YYYY-MM-DD HH24:MI:SS') AS \"Timestamp\", "
+                   "to_char(payment_timestamp, 'YYYY-MM-DD HH24:MI:SS') AS \"Payment Timestamp\"")
+    query = f"SELECT {columns} FROM plates_log WHERE entry_timestamp >= %s AND entry_timestamp < %s ORDER BY entry_timestamp"
+    params = (args.since or '-infinity', args.until or 'infinity')
+
+    out = sys.stdout if args.path == '-' else open(args.path, 'w', newline='')
+    began = time.perf_counter()
+    try:
+        rows = db_operations.copy_plates_out(out, query, params)
+    finally:
+        if out is not sys.stdout:
+            out.close()
+    elapsed = time.perf_counter() - began
+    if rows is None:
+        return 1
+    print(f"[EXPORT] {rows:,} rows in {elapsed:.2f}s ({rows / max(elapsed, 1e-9):,.0f} rows/s)", file=sys.stderr)
+    return 0
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Move plates_log history between Postgres and CSV with COPY.")
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    importer = commands.add_parser('import', help="load a legacy plates_log.csv into plates_log")
+    importer.add_argument('path')
+    importer.add_argument('--keep-open', action='store_true',
+                          help="leave exit columns empty instead of closing every imported session")
+    importer.set_defaults(run=import_csv)
+
+    exporter = commands.add_parser('export', help="write plates_log to CSV ('-' for stdout)")
+    exporter.add_argument('path')
+    exporter.add_argument('--since', help="first entry date to include, e.g. 2025-05-01")
+    exporter.add_argument('--until', help="entry date to stop before")
+    exporter.add_argument('--full', action='store_true', help="every plates_log column instead of the legacy four")
+    exporter.set_defaults(run=export_csv)
+
+    args = parser.parse_args()
+    status = args.run(args)
+    db_operations.close_pool()
+    sys.exit(status)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,121 @@
+import re
+import threading
+import time
+import cv2
+import numpy as np
+
+MAX_DISTANCE = 50       # cm; closer than this means a car is at the gate
+SENSOR_STALE = 1.0      # seconds before a distance reading is ignored
+PRESENCE_HOLD = 3.0     # keep inferring this long after the last motion
+
+_DISTANCE_LINE = re.compile(r'^(?:DIST(?:ANCE)?\s*:?\s*)?(\d+(?:\.\d+)?)\s*(?:cm)?$', re.IGNORECASE)
+
+
+class UltrasonicSensor:
+    """Latest distance reported by the gate Arduino over serial.
+
+    The sketch is expected to print one reading per line, either bare ("23")
+    or tagged ("DIST:23"). Other lines are echoed as [ARDUINO] messages.
+    A background thread reads the port so the capture loop never blocks on it.
+    """
+
+    def __init__(self, ser, stale_after=SENSOR_STALE):
+        self.ser = ser
+        self.stale_after = stale_after
+        self.distance = None
+        self.updated_at = 0.0
+        self.stop_event = threading.Event()
+        self.thread = threading.Thread(target=self._read, name="ultrasonic", daemon=True)
+        self.thread.start()
+
+    def _read(self):
+        while not self.stop_event.is_set():
+            try:
+                line = self.ser.readline().decode(errors='ignore').strip()
+            except Exception as e:
+                print(f"[SENSOR] Serial read failed: {e}")
+                break
+            if not line:
+                continue
+            match = _DISTANCE_LINE.match(line)
+            if match:
+                self.distance = float(match.group(1))
+                self.updated_at = time.time()
+            else:
+                print(f"[ARDUINO] {line}")
+
+    def read(self):
+        """Return the latest distance in cm, or None if there is no fresh reading."""
+        if time.time() - self.updated_at > self.stale_after:
+            return None
+        return self.distance
+
+    def close(self):
+        self.stop_event.set()
+
+
+class MotionDetector:
+    """Frame-difference detector against a running background on a downscaled frame."""
+
+    def __init__(self, width=160, threshold=25, min_changed=0.01, learning_rate=0.05):
+        self.width = width
+        self.threshold = threshold
+        self.min_changed = min_changed
+        self.learning_rate = learning_rate
+        self.background = None
+
+    def __call__(self, frame):
+        h, w = frame.shape[:2]
+        small = cv2.resize(frame, (self.width, max(1, h * self.width // w)), interpolation=cv2.INTER_AREA)
+        gray = cv2.GaussianBlur(cv2.cvtColor(small, cv2.COLOR_BGR2GRAY), (5, 5), 0)
+        if self.background is None or self.background.shape != gray.shape:
+            self.background = gray.astype(np.float32)
+            return False
+
+        diff = cv2.absdiff(gray, cv2.convertScaleAbs(self.background))
+        mask = cv2.threshold(diff, self.threshold, 255, cv2.THRESH_BINARY)[1]
+        cv2.accumulateWeighted(gray, self.background, self.learning_rate)
+        return cv2.countNonZero(mask) >= self.min_changed * gray.size
+
+
+class PresenceTrigger:
+    """Decides per frame whether the heavy YOLO + OCR path should run.
+
+    A fresh ultrasonic reading is authoritative. Without one (no Arduino, or
+    the sketch does not report distance) motion is used instead, and presence
+    is held for `hold` seconds so a car that stops at the barrier keeps being
+    read after the motion dies down.
+    """
+
+    def __init__(self, sensor=None, motion=None, max_distance=MAX_DISTANCE, hold=PRESENCE_HOLD, name="lane"):
+        self.sensor = sensor
+        self.motion = motion
+        self.max_distance = max_distance
+        self.hold = hold
+        self.name = name
+        self.last_motion = 0.0
+        self.present = False
+
+    def __call__(self, frame):
+        now = time.time()
+        distance = self.sensor.read() if self.sensor is not None else None
+        if distance is not None:
+            present = distance <= self.max_distance
+            reason = f"distance {distance:.0f} cm"
+        else:
+            if self.motion is not None and self.motion(frame):
+                self.last_motion = now
+            present = now - self.last_motion < self.hold
+            reason = "motion"
+
+        if present != self.present:
+            self.present = present
+            if present:
+                print(f"[SENSOR] {self.name}: vehicle present ({reason})")
+            else:
+                print(f"[SENSOR] {self.name}: lane idle")
+        return present
+
+    def close(self):
+        if self.sensor is not None:
+            self.sensor.close()
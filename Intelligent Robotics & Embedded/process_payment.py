@@ -1,88 +1,39 @@
-import serial
-import time
-import serial.tools.list_ports
-import platform
-from datetime import datetime
+import argparse
+import asyncio
+import startup
 import db_operations
-
-# Initialize the database
-db_operations.initialize_db()
-
-RATE_PER_MINUTE = 8  # Amount charged per minute (500 RWF per hour / 60 minutes)
-
-
-def detect_arduino_port():
-    ports = list(serial.tools.list_ports.comports())
-    system = platform.system()
-    for port in ports:
-        if system == "Linux":
-            if "ttyUSB" in port.device or "ttyACM" in port.device:
-                return port.device
-        elif system == "Darwin":
-            if "usbmodem" in port.device or "usbserial" in port.device:
-                return port.device
-        elif system == "Windows":
-            if "COM9" in port.device:
-                return port.device
-    return None
-
-
-def parse_arduino_data(line):
-    try:
-        parts = line.strip().split(',')
-        print(f"[ARDUINO] Parsed parts: {parts}")
-        if len(parts) != 2:
-            return None, None
-        plate = parts[0].strip()
-
-        # Clean the balance string by removing non-digit characters
-        balance_str = ''.join(c for c in parts[1] if c.isdigit())
-        print(f"[ARDUINO] Cleaned balance: {balance_str}")
-
-        if balance_str:
-            balance = int(balance_str)
-            return plate, balance
-        else:
-            return None, None
-    except ValueError as e:
-        print(f"[ERROR] Value error in parsing: {e}")
-        return None, None
-
-
-def process_payment(plate, balance, ser):
-    """Process payment for a plate using the database."""
-    return db_operations.process_payment(plate, balance, ser)
+from journal import EventJournal, journal_path
+from kiosk import PaymentServer
+from metrics import METRICS_PORTS, start_http_server
 
 
 def main():
-    port = detect_arduino_port()
-    if not port:
-        print("[ERROR] Arduino not found")
-        return
-
+    parser = argparse.ArgumentParser(description="Serve every RFID payment kiosk connected to this machine.")
+    parser.add_argument('--port', action='append', dest='ports',
+                        help="serve only this serial port (repeatable); readers are auto-detected if omitted")
+    parser.add_argument('--exclude', action='append', default=[],
+                        help="never open this port during auto-detection, e.g. a gate Arduino (repeatable)")
+    parser.add_argument('--metrics-port', type=int, default=METRICS_PORTS['payment'],
+                        help=f"local port for Prometheus /metrics, 0 to disable (default: {METRICS_PORTS['payment']})")
+    args = parser.parse_args()
+    startup.phase('import')
+    db_operations.ensure_schema()
+    startup.phase('schema')
+
+    start_http_server(args.metrics_port)
+    journal = EventJournal(journal_path('payment')).start()
+    server = PaymentServer(ports=args.ports, exclude=args.exclude, journal=journal)
+    startup.phase('kiosks')
+    startup.report("Payment server ready")
     try:
-        ser = serial.Serial(port, 9600, timeout=1)
-        print(f"[CONNECTED] Listening on {port}")
-        time.sleep(2)
-
-        # Flush any previous data
-        ser.reset_input_buffer()
-
-        while True:
-            if ser.in_waiting:
-                line = ser.readline().decode().strip()
-                print(f"[SERIAL] Received: {line}")
-                plate, balance = parse_arduino_data(line)
-                if plate and balance is not None:
-                    process_payment(plate, balance, ser)
-
+        asyncio.run(server.run())
     except KeyboardInterrupt:
         print("[EXIT] Program terminated")
     except Exception as e:
         print(f"[ERROR] {e}")
     finally:
-        if 'ser' in locals():
-            ser.close()
+        journal.stop()
+        db_operations.close_pool()
 
 
 if __name__ == "__main__":
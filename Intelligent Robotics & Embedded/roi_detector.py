@@ -0,0 +1,190 @@
+import threading
+import time
+import cv2
+
+FULL_IMGSZ = 640        # what model(frame) ran at before: the whole frame letterboxed to 640
+LOW_IMGSZ = 320         # adaptive search pass over the whole frame, a quarter of the pixels
+STRIDE = 32             # YOLO input sides are multiples of this
+TRACK_MARGIN = 1.0      # the tracking window adds this many box widths/heights on each side
+MIN_WINDOW = 160        # smallest tracking window side, in frame pixels
+MAX_WINDOW_FRACTION = 0.5   # a window covering more of the frame than this is searched at low resolution instead
+FULL_SEARCH_EVERY = 5   # every Nth empty low-resolution search in a row is repeated at FULL_IMGSZ
+
+
+def parse_roi(text):
+    """'x1,y1,x2,y2' -> tuple; values up to 1 are fractions of the frame, larger ones pixels."""
+    if not text:
+        return None
+    roi = tuple(float(value) for value in text.split(','))
+    if len(roi) != 4 or roi[0] >= roi[2] or roi[1] >= roi[3]:
+        raise ValueError(f"ROI must be x1,y1,x2,y2 with x1 < x2 and y1 < y2: {text}")
+    return roi
+
+
+def roi_pixels(roi, shape):
+    """Clip a fractional or pixel ROI to a frame of `shape`; (x1, y1, x2, y2) ints."""
+    h, w = shape[:2]
+    if roi is None:
+        return 0, 0, w, h
+    if all(value <= 1 for value in roi):
+        roi = (roi[0] * w, roi[1] * h, roi[2] * w, roi[3] * h)
+    x1, y1, x2, y2 = (int(round(value)) for value in roi)
+    return max(0, x1), max(0, y1), min(w, x2), min(h, y2)
+
+
+def input_pixels(shape, imgsz, stride=STRIDE):
+    """Pixels YOLO convolves for an image of `shape` at `imgsz` (rect letterbox: long side to imgsz, padded to stride).
+
+    Conv FLOPs scale with this, so it is the detector's cost measure.
+    """
+    h, w = shape[:2]
+    r = imgsz / max(h, w)
+    return -(-round(h * r) // stride) * stride * -(-round(w * r) // stride) * stride
+
+
+def fit_imgsz(shape, scale=1.0, limit=FULL_IMGSZ, stride=STRIDE):
+    """Inference size that shows a crop at `scale` times its resolution, capped at `limit`."""
+    return max(stride, min(limit, -(-int(max(shape[:2]) * scale) // stride) * stride))
+
+
+class Box:
+    """Full-frame x1, y1, x2, y2 box, shaped like an ultralytics box (box.xyxy[0])."""
+
+    def __init__(self, x1, y1, x2, y2):
+        self.xyxy = [(x1, y1, x2, y2)]
+
+
+class Detections:
+    """One frame's boxes, shaped like an ultralytics result (result.boxes, result.plot())."""
+
+    def __init__(self, frame, boxes, windows=()):
+        self.frame = frame
+        self.boxes = boxes
+        self.windows = windows
+
+    def plot(self):
+        """The frame with the searched windows (blue) and the boxes found (green)."""
+        annotated = self.frame.copy()
+        for x1, y1, x2, y2 in self.windows:
+            cv2.rectangle(annotated, (x1, y1), (x2, y2), (255, 0, 0), 1)
+        for box in self.boxes:
+            x1, y1, x2, y2 = box.xyxy[0]
+            cv2.rectangle(annotated, (x1, y1), (x2, y2), (0, 255, 0), 2)
+        return annotated
+
+
+class RoiDetector:
+    """Callable stand-in for the YOLO model that runs it on less of each frame.
+
+    roi limits detection to a fixed part of the frame (the lane's approach,
+    say). The crop is inferred at the scale model(frame) used for the whole
+    frame, so it costs its share of the pixels and plates look the same to
+    the model. adaptive=True then searches that region at LOW_IMGSZ scale.
+    Once a plate is found, the next frame is inferred only on a
+    full-resolution window around the previous boxes. A window that comes
+    back empty falls back to the low-resolution search on the same frame,
+    and every FULL_SEARCH_EVERY-th empty search in a row runs at FULL_IMGSZ
+    scale, so small, distant plates are not lost. Boxes are returned in
+    frame coordinates, so pipelines and trackers need no changes. `stats()`
+    counts passes and the YOLO input pixels (conv FLOPs) relative to
+    running model(frame) at FULL_IMGSZ.
+
+    The imgsz= of each pass is passed to the model, so batched lanes
+    (LaneClient ignores it) only save the static ROI crop.
+    """
+
+    def __init__(self, model, roi=None, adaptive=False, timings=None, full_imgsz=FULL_IMGSZ,
+                 low_imgsz=LOW_IMGSZ):
+        self.model = model
+        self.roi = roi
+        self.adaptive = adaptive
+        self.timings = timings
+        self.full_imgsz = full_imgsz
+        self.low_imgsz = low_imgsz
+        self.previous = []
+        self.empty_searches = 0
+        self.passes = {}
+        self.pixels = 0
+        self.baseline_pixels = 0
+        self.frames = 0
+        self._lock = threading.Lock()
+
+    def __call__(self, frame, **kwargs):
+        region = roi_pixels(self.roi, frame.shape)
+        # Passes over the region keep the scale model(frame) saw (or LOW_IMGSZ's), so plates look the same
+        full_scale = self.full_imgsz / max(frame.shape[:2])
+        windows = []
+        boxes = []
+        cost = 0
+        if self.adaptive and self.previous:
+            window = self._window(self.previous, region)
+            if window is not None:
+                windows.append(window)
+                boxes, cost = self._pass('track', frame, window, max(1.0, full_scale), **kwargs)
+        if not boxes:
+            scale, kind = full_scale, 'region'
+            if self.adaptive:
+                self.empty_searches += 1
+                if self.empty_searches % FULL_SEARCH_EVERY:
+                    scale, kind = self.low_imgsz / max(frame.shape[:2]), 'search'
+                else:
+                    kind = 'full_search'
+            windows.append(region)
+            boxes, pixels = self._pass(kind, frame, region, scale, **kwargs)
+            cost += pixels
+        if boxes:
+            self.empty_searches = 0
+        self.previous = boxes
+        with self._lock:
+            self.frames += 1
+            self.pixels += cost
+            self.baseline_pixels += input_pixels(frame.shape, self.full_imgsz)
+        return [Detections(frame, [Box(*box) for box in boxes], windows)]
+
+    def _window(self, boxes, region):
+        """Full-resolution window around the previous boxes, inside region; None if too big to be worth it."""
+        x1 = min(box[0] for box in boxes)
+        y1 = min(box[1] for box in boxes)
+        x2 = max(box[2] for box in boxes)
+        y2 = max(box[3] for box in boxes)
+        grow_x = max(TRACK_MARGIN * (x2 - x1), (MIN_WINDOW - (x2 - x1)) / 2)
+        grow_y = max(TRACK_MARGIN * (y2 - y1), (MIN_WINDOW - (y2 - y1)) / 2)
+        rx1, ry1, rx2, ry2 = region
+        window = (max(rx1, int(x1 - grow_x)), max(ry1, int(y1 - grow_y)),
+                  min(rx2, int(x2 + grow_x)), min(ry2, int(y2 + grow_y)))
+        area = (window[2] - window[0]) * (window[3] - window[1])
+        if area <= 0 or area > MAX_WINDOW_FRACTION * (rx2 - rx1) * (ry2 - ry1):
+            return None
+        return window
+
+    def _pass(self, kind, frame, window, scale, **kwargs):
+        """Infer on frame[window] shown at `scale`; (frame-coordinate boxes, YOLO input pixels)."""
+        x1, y1, x2, y2 = window
+        crop = frame[y1:y2, x1:x2]
+        imgsz = fit_imgsz(crop.shape, scale, self.full_imgsz)
+        began = time.perf_counter()
+        results = self.model(crop, imgsz=imgsz, **kwargs)
+        if self.timings is not None:
+            self.timings.record(f'detect_{kind}', time.perf_counter() - began)
+        boxes = []
+        for result in results:
+            for box in result.boxes:
+                bx1, by1, bx2, by2 = map(int, box.xyxy[0])
+                boxes.append((bx1 + x1, by1 + y1, bx2 + x1, by2 + y1))
+        with self._lock:
+            self.passes[kind] = self.passes.get(kind, 0) + 1
+        return boxes, input_pixels(crop.shape, imgsz)
+
+    def stats(self):
+        """Frames, passes by kind and YOLO input pixels per frame, relative to model(frame) at full_imgsz."""
+        with self._lock:
+            return {'frames': self.frames, 'passes': dict(self.passes),
+                    'pixels_per_frame': self.pixels / self.frames if self.frames else 0.0,
+                    'relative_cost': self.pixels / self.baseline_pixels if self.baseline_pixels else 0.0}
+
+    def print_stats(self, name):
+        stats = self.stats()
+        passes = ', '.join(f"{kind} {count}" for kind, count in stats['passes'].items())
+        print(f"[DETECT] {name}: {stats['frames']} frames, {passes}; YOLO input "
+              f"{stats['pixels_per_frame'] / 1000:.0f} kpx/frame, {stats['relative_cost']:.0%} of full-frame "
+              f"{self.full_imgsz} ({1 / max(stats['relative_cost'], 1e-9):.1f}x fewer FLOPs)")
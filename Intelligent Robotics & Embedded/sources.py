@@ -0,0 +1,144 @@
+import os
+import time
+import cv2
+from char_recognizer import plate_label
+
+IMAGE_EXTENSIONS = ('.jpg', '.jpeg', '.png', '.bmp')
+STREAM_PREFIXES = ('rtsp://', 'rtmp://', 'http://', 'https://')
+REPLAY_FPS = 10.0       # frame rate assumed for image folders and files that report none
+VISIT_GAP = 5.0         # seconds of replay clock between two vehicles in an image folder
+
+
+class CaptureSource:
+    """A cv2.VideoCapture (camera, video file or network stream) with a replay clock.
+
+    live sources timestamp frames with the wall clock. A file replays on its
+    own clock (its frame positions), as fast as it decodes, unless pace=True
+    makes it play at its native frame rate like a camera or RTSP stream would.
+    label is the plate in the file name, if there is one.
+    """
+
+    def __init__(self, target, live, pace=False, label=None):
+        self.cap = cv2.VideoCapture(target)
+        if live:
+            # Keep the driver's buffer short so a slow consumer sees recent frames
+            self.cap.set(cv2.CAP_PROP_BUFFERSIZE, 1)
+        self.live = live or pace
+        self.pace = pace
+        self.label = label
+        self.fps = self.cap.get(cv2.CAP_PROP_FPS) or REPLAY_FPS
+        self.frames_read = 0
+        self.started = None
+        self.clock = 0.0
+
+    def isOpened(self):
+        return self.cap.isOpened()
+
+    def read(self):
+        if self.pace:
+            if self.started is None:
+                self.started = time.perf_counter()
+            delay = self.started + self.frames_read / self.fps - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+        ret, frame = self.cap.read()
+        if ret:
+            self.frames_read += 1
+            self.clock = time.time() if self.live else self.frames_read / self.fps
+        return ret, frame
+
+    def visits(self):
+        """Plates expected from this source, in order (for accuracy reports)."""
+        return [self.label] if self.label else []
+
+    def release(self):
+        self.cap.release()
+
+
+class ImageFolderSource:
+    """Every image in a directory, in name order, served as frames.
+
+    Consecutive images with the same plate in their name (RAB123C_*.jpg) are
+    one vehicle: they are REPLAY_FPS apart on the replay clock, and a new
+    plate starts VISIT_GAP later so trackers see a fresh car. pace=True
+    serves frames at `fps` instead of as fast as they decode; loop=True
+    starts over at the end.
+    """
+
+    def __init__(self, path, fps=REPLAY_FPS, pace=False, loop=False):
+        self.paths = sorted(os.path.join(path, name) for name in os.listdir(path)
+                            if name.lower().endswith(IMAGE_EXTENSIONS))
+        self.fps = fps
+        self.pace = pace
+        self.live = pace
+        self.loop = loop
+        self.position = 0
+        self.frames_read = 0
+        self.started = None
+        self.clock = 0.0
+        self.label = None
+
+    def isOpened(self):
+        return bool(self.paths)
+
+    def read(self):
+        while True:
+            if self.position >= len(self.paths):
+                if not self.loop or not self.paths:
+                    return False, None
+                self.position = 0
+            path = self.paths[self.position]
+            self.position += 1
+            frame = cv2.imread(path)
+            if frame is not None:
+                break
+            print(f"[SOURCE] Skipping unreadable image {path}")
+
+        if self.pace:
+            if self.started is None:
+                self.started = time.perf_counter()
+            delay = self.started + self.frames_read / self.fps - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+        label = plate_label(path)
+        gap = VISIT_GAP if self.frames_read and (label != self.label or label is None) else 1 / self.fps
+        self.label = label
+        self.frames_read += 1
+        self.clock = time.time() if self.live else self.clock + gap
+        return True, frame
+
+    def visits(self):
+        """Plates expected from this folder, one per run of same-plate images."""
+        visits = []
+        previous = object()
+        for path in self.paths:
+            label = plate_label(path)
+            if label and label != previous:
+                visits.append(label)
+            previous = label
+        return visits
+
+    def release(self):
+        self.position = len(self.paths)
+        self.loop = False
+
+
+def open_source(source, pace=False, loop=False, fps=REPLAY_FPS):
+    """Frame source for a camera index, image directory, rtsp://-style URL or video file.
+
+    Everything returned has read() -> (ret, frame), isOpened(), release(),
+    live (frames should be dropped rather than queued when the pipeline
+    falls behind), clock (capture time of the last frame, in seconds),
+    frames_read and visits(). An already opened source is returned as is.
+    """
+    if hasattr(source, 'read'):
+        return source
+    if isinstance(source, int) or (isinstance(source, str) and source.isdigit()):
+        return CaptureSource(int(source), live=True)
+    if os.path.isdir(source):
+        return ImageFolderSource(source, fps=fps, pace=pace, loop=loop)
+    if source.lower().startswith(STREAM_PREFIXES):
+        return CaptureSource(source, live=True)
+    if not os.path.exists(source):
+        raise FileNotFoundError(f"No such video source: {source}")
+    return CaptureSource(source, live=False, pace=pace, label=plate_label(source))
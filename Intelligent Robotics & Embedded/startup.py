@@ -0,0 +1,23 @@
+import time
+
+_began = time.perf_counter()   # import time of this module: the first thing parking.py imports
+_last = _began
+_phases = []
+
+
+def phase(name):
+    """End the current startup phase, recording its duration under `name`."""
+    global _last
+    now = time.perf_counter()
+    _phases.append((name, now - _last))
+    _last = now
+
+
+def elapsed():
+    return time.perf_counter() - _began
+
+
+def report(what):
+    """Print how long startup took and where the time went, e.g. '[STARTUP] Gate ready in 912 ms (...)'."""
+    phases = ', '.join(f"{name} {seconds * 1000:.0f} ms" for name, seconds in _phases)
+    print(f"[STARTUP] {what} in {elapsed() * 1000:.0f} ms" + (f" ({phases})" if phases else ""))
@@ -0,0 +1,155 @@
+import argparse
+import json
+import os
+import time
+import numpy as np
+
+TARIFF_PATH = 'tariff.json'
+MINUTES_PER_DAY = 24 * 60
+
+# The long-standing rate: 8 units per minute (500 RWF per hour), all day, at least one minute
+DEFAULT_BANDS = [("00:00", 8)]
+DAILY_CAP = None        # most a car pays per calendar day; None for no cap
+GRACE_MINUTES = 0       # stays shorter than this are free
+MINIMUM_MINUTES = 1     # shortest stay billed once past the grace period
+MIN_BALANCE = 0         # cards at or below this balance are turned away
+
+
+def _minute_of_day(text):
+    hours, minutes = text.split(':')
+    return int(hours) * 60 + int(minutes)
+
+
+class Tariff:
+    """A rate table compiled to a per-minute-of-day price array and its running sum.
+
+    bands: [("HH:MM", rate per minute), ...]; each band runs until the next
+    one starts and the last wraps round to the first. A stay is billed per
+    whole minute from the minute it entered. The cost of any span is then
+    two lookups in the running sum plus whole days, with daily_cap applied
+    per calendar day. charge_many() prices whole arrays of sessions at once;
+    charge() is the same computation for one stay.
+    """
+
+    def __init__(self, bands=DEFAULT_BANDS, daily_cap=DAILY_CAP, grace_minutes=GRACE_MINUTES,
+                 minimum_minutes=MINIMUM_MINUTES, min_balance=MIN_BALANCE):
+        if not bands:
+            raise ValueError("A tariff needs at least one rate band")
+        self.bands = sorted((start, float(rate)) for start, rate in bands)
+        self.daily_cap = daily_cap
+        self.grace_minutes = grace_minutes
+        self.minimum_minutes = minimum_minutes
+        self.min_balance = min_balance
+
+        starts = [_minute_of_day(start) for start, _ in self.bands]
+        self.rate_by_minute = np.empty(MINUTES_PER_DAY)
+        self.rate_by_minute[:] = self.bands[-1][1]
+        for (start, (_, rate)), end in zip(zip(starts, self.bands), starts[1:] + [MINUTES_PER_DAY]):
+            self.rate_by_minute[start:end] = rate
+        # cost_before[m] = cost of minutes [0, m) of a day
+        self.cost_before = np.concatenate([[0.0], np.cumsum(self.rate_by_minute)])
+        self.day_cost = self.cost_before[-1]
+
+    @classmethod
+    def from_dict(cls, config):
+        return cls(bands=[tuple(band) for band in config.get('bands', DEFAULT_BANDS)],
+                   daily_cap=config.get('daily_cap', DAILY_CAP),
+                   grace_minutes=config.get('grace_minutes', GRACE_MINUTES),
+                   minimum_minutes=config.get('minimum_minutes', MINIMUM_MINUTES),
+                   min_balance=config.get('min_balance', MIN_BALANCE))
+
+    def to_dict(self):
+        return {'bands': [[start, rate] for start, rate in self.bands], 'daily_cap': self.daily_cap,
+                'grace_minutes': self.grace_minutes, 'minimum_minutes': self.minimum_minutes,
+                'min_balance': self.min_balance}
+
+    def accepts(self, balance):
+        return balance > self.min_balance
+
+    def billed_minutes(self, minutes):
+        """Whole minutes charged for stays of `minutes` (array): 0 inside the grace period, else at least the minimum."""
+        minutes = np.asarray(minutes, dtype=np.int64)
+        return np.where(minutes < self.grace_minutes, 0, np.maximum(minutes, self.minimum_minutes))
+
+    def _span_cost(self, start, end):
+        """Cost of the minute spans [start, end), as minutes since the epoch (int64 arrays)."""
+        start_day, start_minute = np.divmod(start, MINUTES_PER_DAY)
+        end_day, end_minute = np.divmod(end, MINUTES_PER_DAY)
+        head = self.cost_before[start_minute]
+        tail = self.cost_before[end_minute]
+        if self.daily_cap is None:
+            return (end_day - start_day) * self.day_cost + tail - head
+
+        cap = self.daily_cap
+        same_day = np.minimum(tail - head, cap)
+        first = np.minimum(self.day_cost - head, cap)
+        middle = np.maximum(end_day - start_day - 1, 0) * min(self.day_cost, cap)
+        last = np.minimum(tail, cap)
+        return np.where(start_day == end_day, same_day, first + middle + last)
+
+    def charge_many(self, entries, exits):
+        """Amounts due for many stays at once: entries/exits are datetime64 arrays (or anything numpy converts)."""
+        entries = np.asarray(entries, dtype='datetime64[s]')
+        exits = np.asarray(exits, dtype='datetime64[s]')
+        stay = (exits - entries).astype(np.int64) // 60
+        start = entries.astype('datetime64[m]').astype(np.int64)
+        billed = self.billed_minutes(np.maximum(stay, 0))
+        return np.rint(self._span_cost(start, start + billed)).astype(np.int64)
+
+    def charge(self, entry_time, exit_time):
+        """Amount due for one stay between two datetimes."""
+        return int(self.charge_many([np.datetime64(entry_time, 's')], [np.datetime64(exit_time, 's')])[0])
+
+
+def load_tariff(path=TARIFF_PATH):
+    """The tariff in `path` (JSON, as written by Tariff.to_dict) if it exists, else the default one."""
+    if path and os.path.exists(path):
+        with open(path) as f:
+            return Tariff.from_dict(json.load(f))
+    return Tariff()
+
+
+def _synthetic_sessions(count, seed=0):
+    rng = np.random.default_rng(seed)
+    entries = np.datetime64('2025-01-01T00:00:00') + rng.integers(0, 365 * 86400, count).astype('timedelta64[s]')
+    stays = rng.gamma(1.5, 90 * 60, count).astype('timedelta64[s]')
+    return entries, entries + stays
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Price historical sessions under one or more tariffs.")
+    parser.add_argument('tariffs', nargs='*', help="tariff JSON files to compare (default: the current tariff)")
+    parser.add_argument('--since', help="first entry date to include, e.g. 2025-05-01")
+    parser.add_argument('--until', help="entry date to stop before")
+    parser.add_argument('--synthetic', type=int, help="price this many random sessions instead of plates_log")
+    args = parser.parse_args()
+
+    tariffs = {path: load_tariff(path) for path in args.tariffs} or {'current': load_tariff()}
+    totals = {name: 0 for name in tariffs}
+    sessions, charged, pricing = 0, 0, 0.0
+
+    if args.synthetic:
+        chunks = [_synthetic_sessions(args.synthetic) + (None,)]
+    else:
+        import db_operations
+        chunks = db_operations.iter_paid_sessions(args.since, args.until)
+
+    for entries, exits, amounts in chunks:
+        sessions += len(entries)
+        if amounts is not None:
+            charged += int(np.nansum(np.array(amounts, dtype=float)))
+        began = time.perf_counter()
+        for name, tariff in tariffs.items():
+            totals[name] += int(tariff.charge_many(entries, exits).sum())
+        pricing += time.perf_counter() - began
+
+    print(f"[TARIFF] {sessions:,} sessions priced under {len(tariffs)} tariff(s) in {pricing:.2f}s "
+          f"({sessions * len(tariffs) / max(pricing, 1e-9):,.0f} sessions/s)")
+    if not args.synthetic:
+        print(f"  {'charged':<24} {charged:>14,}")
+    for name, total in totals.items():
+        print(f"  {name:<24} {total:>14,}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,49 @@
+import os
+import pytest
+
+# A scratch Postgres, e.g. "dbname=pms_test user=postgres host=localhost"
+DSN = os.environ.get('PMS_TEST_DSN')
+
+pytestmark = pytest.mark.skipif(not DSN, reason="set PMS_TEST_DSN to a scratch Postgres to run the pool checks")
+
+
+@pytest.fixture
+def db(monkeypatch):
+    extensions = pytest.importorskip('psycopg2.extensions')
+    import db_operations
+    monkeypatch.setattr(db_operations, 'DB_PARAMS', extensions.parse_dsn(DSN))
+    db_operations.close_pool()
+    yield db_operations
+    db_operations.close_pool()
+
+
+def test_stats_count_checked_out_and_idle_connections(db):
+    first, second = db.connect_to_db(), db.connect_to_db()
+    assert first is not None and second is not None
+    stats = db.get_pool_stats()
+    assert (stats['in_use'], stats['open']) == (2, 2)
+
+    db.release_connection(first)
+    db.release_connection(second)
+    # The pool keeps POOL_MIN_CONN connections open and closes the rest
+    stats = db.get_pool_stats()
+    assert (stats['in_use'], stats['open']) == (0, db.POOL_MIN_CONN)
+
+
+def test_connection_from_a_closed_pool_is_closed_on_release(db):
+    stale = db.connect_to_db()
+    db.close_pool()
+    fresh = db.connect_to_db()
+    assert fresh is not None
+
+    db.release_connection(stale)
+    assert stale.closed
+    assert db.get_pool_stats()['in_use'] == 1
+    db.release_connection(fresh)
+    assert not fresh.closed
+
+    # Every checkout slot came back
+    held = [db.connect_to_db() for _ in range(db.POOL_MAX_CONN)]
+    assert None not in held
+    for conn in held:
+        db.release_connection(conn)
@@ -0,0 +1,27 @@
+import os
+import pytest
+
+# A scratch Postgres the check may migrate and seed, e.g. "dbname=pms_test user=postgres host=localhost"
+DSN = os.environ.get('PMS_TEST_DSN')
+ROWS = int(os.environ.get('PMS_TEST_ROWS', 10_000_000))
+
+pytestmark = pytest.mark.skipif(not DSN, reason="set PMS_TEST_DSN to a scratch Postgres to run the EXPLAIN checks")
+
+
+@pytest.fixture
+def scratch_db(monkeypatch):
+    extensions = pytest.importorskip('psycopg2.extensions')
+    import db_operations
+    monkeypatch.setattr(db_operations, 'DB_PARAMS', extensions.parse_dsn(DSN))
+    db_operations.close_pool()
+    yield db_operations
+    db_operations.close_pool()
+
+
+def test_gate_queries_use_indexes_inside_the_window(scratch_db):
+    import check_gate_indexes
+    results = check_gate_indexes.run(ROWS)
+    assert results is not None, "could not reach PMS_TEST_DSN"
+    assert [name for name, *_ in results] == list(scratch_db.GATE_QUERIES)
+    failed = {name: problems for name, ok, _, _, problems in results if not ok}
+    assert not failed
@@ -0,0 +1,129 @@
+import asyncio
+import time
+from datetime import datetime, timedelta
+import pytest
+
+pytest.importorskip('pty')
+pytest.importorskip('serial')
+pytest.importorskip('psycopg2')
+import db_operations
+import kiosk
+from fake_arduino import FakePaymentArduino
+
+PLATE = 'RAB123C'
+SESSION_ID = '0f8fad5b-d9cb-469f-a165-70867728950e'
+PARKED = timedelta(minutes=30)
+
+
+class FakeDb:
+    """Stands in for the two db_operations calls a kiosk makes."""
+
+    def __init__(self, result=('2026-01-01 10:00:00', None)):
+        self.result = result
+        self.paid = []
+
+    def fetch_unpaid_session(self, plate):
+        return {'id': SESSION_ID, 'entry_timestamp': datetime.now() - PARKED}
+
+    def update_payment_status(self, plate, entry_timestamp, amount, entry_id=None):
+        self.paid.append((plate, amount, entry_id))
+        return self.result
+
+
+class FakeJournal:
+    def __init__(self):
+        self.payments = []
+
+    def payment(self, plate, amount=None, entry_id=None):
+        self.payments.append((plate, amount, entry_id))
+
+
+@pytest.fixture
+def db(monkeypatch):
+    fake = FakeDb()
+    monkeypatch.setattr(db_operations, 'fetch_unpaid_session', fake.fetch_unpaid_session)
+    monkeypatch.setattr(db_operations, 'update_payment_status', fake.update_payment_status)
+    return fake
+
+
+def tap(balance, journal=None, timeout=5, **arduino):
+    """Tap one card on a fake reader served by a Kiosk; returns (kiosk transaction, fake Arduino)."""
+    fake = FakePaymentArduino(silent=True, **arduino).start()
+
+    async def serve():
+        link = await kiosk.open_link(fake.port, reset_delay=0)
+        reader = kiosk.Kiosk(link, name='test', journal=journal)
+        task = asyncio.create_task(reader.run())
+        fake.tap(PLATE, balance)
+        deadline = time.monotonic() + timeout
+        while not reader.counts[kiosk.DONE] + reader.counts[kiosk.FAILED] and time.monotonic() < deadline:
+            await asyncio.sleep(0.02)
+        task.cancel()
+        await asyncio.gather(task, return_exceptions=True)
+        link.close()
+        return reader
+
+    try:
+        reader = asyncio.run(serve())
+        assert reader.transactions, "the kiosk never saw the card"
+        return reader.transactions[-1], fake
+    finally:
+        fake.stop()
+
+
+def test_payment_writes_the_new_balance_and_pays_the_session(db):
+    tx, fake = tap(5000)
+    assert tx.state == kiosk.DONE
+    assert tx.entry_id == SESSION_ID and tx.amount > 0
+    assert fake.balances[PLATE] == 5000 - tx.amount
+    assert db.paid == [(PLATE, tx.amount, SESSION_ID)]
+
+
+def test_insufficient_balance_is_refused_on_the_card(db):
+    tx, fake = tap(1)
+    assert tx.state == kiosk.FAILED
+    assert tx.reason.startswith("insufficient balance")
+    assert PLATE not in fake.balances
+    assert db.paid == []
+
+
+def test_ready_timeout(db, monkeypatch):
+    monkeypatch.setattr(kiosk, 'READY_TIMEOUT', 0.2)
+    tx, fake = tap(5000, ready_delay=0.6)
+    assert tx.state == kiosk.FAILED
+    assert tx.reason == "timeout waiting for READY"
+    assert PLATE not in fake.balances
+    assert db.paid == []
+
+
+def test_done_timeout(db, monkeypatch):
+    monkeypatch.setattr(kiosk, 'DONE_TIMEOUT', 0.2)
+    tx, fake = tap(5000, done_delay=0.6)
+    assert tx.state == kiosk.FAILED
+    assert tx.reason == "timeout waiting for DONE"
+    assert db.paid == []
+
+
+def test_payment_is_journaled_with_its_session_when_the_database_is_down(db):
+    db.result = (None, db_operations.PAYMENT_DB_DOWN)
+    journal = FakeJournal()
+    tx, _ = tap(5000, journal=journal)
+    assert tx.state == kiosk.DONE
+    assert journal.payments == [(PLATE, tx.amount, SESSION_ID)]
+
+
+def test_payment_of_an_already_paid_session_is_not_journaled(db):
+    db.result = (None, db_operations.PAYMENT_ALREADY_PAID)
+    journal = FakeJournal()
+    tx, _ = tap(5000, journal=journal)
+    assert tx.state == kiosk.DONE
+    assert journal.payments == []
+
+
+def test_transaction_rejects_skipped_states():
+    tx = kiosk.PaymentTransaction(PLATE, 5000)
+    tx.advance(kiosk.QUOTED)
+    with pytest.raises(RuntimeError):
+        tx.advance(kiosk.BALANCE_SENT)
+    tx.fail("test")
+    assert tx.state == kiosk.FAILED and tx.finished is not None